@@ -0,0 +1,73 @@
+import os
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+from .models import ProfileArtifact
+
+
+@admin.register(ProfileArtifact)
+class ProfileArtifactAdmin(admin.ModelAdmin):
+    list_display = (
+        'created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms',
+        'query_count', 'query_ms', 'trigger', 'user', 'download_link',
+    )
+    list_filter = ('trigger', 'profiler', 'view_name', 'created_at')
+    search_fields = ('path', 'view_name', 'user__username')
+    date_hierarchy = 'created_at'
+    list_select_related = ('user',)
+    exclude = ('queries', 'summary', 'profile_file')
+    readonly_fields = (
+        'user', 'method', 'path', 'view_name', 'status_code', 'trigger', 'profiler', 'duration_ms',
+        'query_count', 'query_ms', 'created_at', 'download_link', 'summary_display', 'queries_display',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_queryset(self, request, queryset):
+        # Uno por uno para borrar también los archivos
+        for artifact in queryset:
+            artifact.delete()
+
+    def get_urls(self):
+        custom = [
+            path('<int:artifact_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='administration_profileartifact_download'),
+        ]
+        return custom + super().get_urls()
+
+    def download_view(self, request, artifact_id):
+        artifact = get_object_or_404(ProfileArtifact, pk=artifact_id)
+        if not artifact.profile_file:
+            raise Http404("El perfil no tiene archivo")
+        try:
+            file = artifact.profile_file.open('rb')
+        except FileNotFoundError:
+            raise Http404("El archivo del perfil ya no existe")
+        return FileResponse(file, as_attachment=True, filename=os.path.basename(artifact.profile_file.name))
+
+    @admin.display(description='Archivo')
+    def download_link(self, obj):
+        if not obj.profile_file:
+            return '-'
+        url = reverse('admin:administration_profileartifact_download', args=[obj.pk])
+        return format_html('<a href="{}">Descargar .{}</a>', url, obj.profile_file.name.rsplit('.', 1)[-1])
+
+    @admin.display(description='Resumen')
+    def summary_display(self, obj):
+        return format_html('<pre style="max-height:40em;overflow:auto">{}</pre>', obj.summary)
+
+    @admin.display(description='Consultas SQL')
+    def queries_display(self, obj):
+        if not obj.queries:
+            return '-'
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((index, query.get('ms'), query.get('sql')) for index, query in enumerate(obj.queries, 1)),
+        )
+        return format_html('<table><tr><th>#</th><th>ms</th><th>SQL</th></tr>{}</table>', rows)
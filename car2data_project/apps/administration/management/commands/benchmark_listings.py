@@ -0,0 +1,225 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from apps.documents.models import Document
+from apps.forms_generation.models import GeneratedForm
+from benchmarks.fixtures import check_benchmark_database, manual_timestamps
+
+BENCH_USER_PREFIX = 'bench_listings_'
+
+# Distribución aproximada de estados en producción
+STATUS_WEIGHTS = (('completed', 90), ('pending', 4), ('processing', 3), ('error', 3))
+
+
+class Command(BaseCommand):
+    help = (
+        'Siembra documentos y formularios sintéticos y mide las consultas del dashboard '
+        'y de los historiales, opcionalmente con y sin los índices compuestos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=1_000_000, help='Documentos sintéticos en total')
+        parser.add_argument('--forms', type=int, default=200_000, help='Formularios generados sintéticos en total')
+        parser.add_argument('--users', type=int, default=100, help='Usuarios entre los que se reparten los datos')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Filas por bulk_create')
+        parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta (se reporta la mediana)')
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Mide primero sin los índices de Meta.indexes y luego con ellos'
+        )
+        parser.add_argument('--explain', action='store_true', help='Muestra el plan de cada consulta')
+        parser.add_argument('--cleanup', action='store_true', help='Elimina los datos sintéticos y termina')
+        parser.add_argument(
+            '--i-know',
+            action='store_true',
+            help='Confirma que la base (sin DEBUG ni "bench" en el nombre) puede recibir datos sintéticos'
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+            self.stdout.write(self.style.SUCCESS(f'Eliminados {deleted} objetos sintéticos'))
+            return
+
+        check_benchmark_database(options['i_know'])
+        users = self._seed(options)
+        target = users[0]
+        self.stdout.write(
+            f"Usuario medido: {target.username} "
+            f"({Document.objects.filter(user=target).count()} documentos, "
+            f"{GeneratedForm.objects.filter(user=target).count()} formularios)"
+        )
+
+        queries = self._queries(target)
+        if options['explain']:
+            for name, build in queries:
+                self.stdout.write(f'\n{name}:\n{build().explain()}')
+
+        if not options['compare']:
+            self._report({'con índices': self._measure(queries, options['repeat'])})
+            return
+
+        with self._without_indexes():
+            before = self._measure(queries, options['repeat'])
+        after = self._measure(queries, options['repeat'])
+        self._report({'sin índices': before, 'con índices': after})
+
+    # ------------------------------------------------------------------
+    # Datos sintéticos
+    # ------------------------------------------------------------------
+
+    def _seed(self, options):
+        users = []
+        for index in range(max(1, options['users'])):
+            user, _ = User.objects.get_or_create(username=f'{BENCH_USER_PREFIX}{index}')
+            users.append(user)
+        user_ids = [user.id for user in users]
+
+        existing = Document.objects.filter(user_id__in=user_ids).count()
+        missing = options['documents'] - existing
+        if missing > 0:
+            self.stdout.write(f'Sembrando {missing} documentos...')
+            self._seed_documents(user_ids, missing, options['batch_size'])
+
+        existing = GeneratedForm.objects.filter(user_id__in=user_ids).count()
+        missing = options['forms'] - existing
+        if missing > 0:
+            self.stdout.write(f'Sembrando {missing} formularios generados...')
+            self._seed_forms(user_ids, missing, options['batch_size'])
+        return users
+
+    def _seed_documents(self, user_ids, total, batch_size):
+        rng = random.Random(18)
+        statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+        now = timezone.now()
+        uploaded_at = Document._meta.get_field('uploaded_at')
+        started = time.perf_counter()
+        with manual_timestamps(uploaded_at):
+            for offset in range(0, total, batch_size):
+                Document.objects.bulk_create([
+                    Document(
+                        user_id=rng.choice(user_ids),
+                        name=f'bench_{offset + index}.pdf',
+                        document_type='ownership',
+                        status=rng.choice(statuses),
+                        uploaded_at=now - timedelta(minutes=rng.randrange(365 * 24 * 60)),
+                    )
+                    for index in range(min(batch_size, total - offset))
+                ], batch_size=batch_size)
+        self.stdout.write(f'  {total} documentos en {time.perf_counter() - started:.1f}s')
+
+    def _seed_forms(self, user_ids, total, batch_size):
+        rng = random.Random(7)
+        now = timezone.now()
+        form_types = [choice for choice, _ in GeneratedForm.FORM_TYPE_CHOICES]
+        document_ids = {
+            user_id: list(Document.objects.filter(user_id=user_id).values_list('id', flat=True)[:500])
+            for user_id in user_ids
+        }
+        user_ids = [user_id for user_id in user_ids if document_ids[user_id]]
+        fields = [GeneratedForm._meta.get_field(name) for name in ('created_at', 'updated_at')]
+        started = time.perf_counter()
+        with manual_timestamps(*fields):
+            for offset in range(0, total, batch_size):
+                batch = []
+                for _ in range(min(batch_size, total - offset)):
+                    user_id = rng.choice(user_ids)
+                    created_at = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+                    batch.append(GeneratedForm(
+                        user_id=user_id,
+                        document_id=rng.choice(document_ids[user_id]),
+                        form_type=rng.choice(form_types),
+                        status='completed',
+                        created_at=created_at,
+                        updated_at=created_at,
+                    ))
+                GeneratedForm.objects.bulk_create(batch, batch_size=batch_size)
+        self.stdout.write(f'  {total} formularios en {time.perf_counter() - started:.1f}s')
+
+    # ------------------------------------------------------------------
+    # Consultas medidas (las mismas que arman las vistas)
+    # ------------------------------------------------------------------
+
+    def _queries(self, user):
+        documents = Document.objects.filter(user=user)
+        list_fields = ('extracted_data_json', 'extraction_error')
+        thirty_days_ago = timezone.now() - timedelta(days=30)
+        return [
+            ('dashboard: contadores', lambda: documents.values('user').annotate(
+                total=Count('id'),
+                processed=Count('id', filter=Q(status='completed')),
+                processing=Count('id', filter=Q(status__in=['pending', 'processing'])),
+            )),
+            ('dashboard: recientes', lambda: documents.defer(*list_fields).order_by('-uploaded_at')[:5]),
+            ('historial documentos p.1', lambda: documents.defer(*list_fields).order_by('-uploaded_at')[:10]),
+            ('historial documentos p.50', lambda: documents.defer(*list_fields).order_by('-uploaded_at')[490:500]),
+            ('documentos en proceso', lambda: documents.filter(
+                status__in=['pending', 'processing']
+            ).defer(*list_fields).order_by('uploaded_at')[:50]),
+            ('historial formularios p.1', lambda: GeneratedForm.objects.filter(
+                user=user, created_at__gte=thirty_days_ago
+            ).exclude(status='error').select_related('document').defer(
+                'document__extracted_data_json', 'document__extraction_error'
+            ).order_by('-created_at')[:10]),
+        ]
+
+    def _measure(self, queries, repeat):
+        results = {}
+        for name, build in queries:
+            list(build())  # calentar caché de páginas
+            timings = []
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+        return results
+
+    @contextmanager
+    def _without_indexes(self):
+        """
+        Quita temporalmente los índices de Meta.indexes. En PostgreSQL el DDL es
+        transaccional: se quitan dentro de una transacción que se revierte al salir,
+        así una interrupción nunca deja la base sin índices. En otros motores se recrean.
+        """
+        indexes = [(model, index) for model in (Document, GeneratedForm) for index in model._meta.indexes]
+        if connection.vendor == 'postgresql':
+            with transaction.atomic():
+                with connection.schema_editor() as editor:
+                    for model, index in indexes:
+                        editor.remove_index(model, index)
+                try:
+                    yield
+                finally:
+                    transaction.set_rollback(True)
+            return
+
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        try:
+            yield
+        finally:
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+
+    def _report(self, runs):
+        labels = list(runs)
+        names = list(runs[labels[0]])
+        width = max(len(name) for name in names) + 2
+        header = ''.join(f'{label:>14}' for label in labels)
+        self.stdout.write(f"\n{'consulta':<{width}}{header}   (mediana, ms)")
+        for name in names:
+            row = ''.join(f'{runs[label][name]:>14.2f}' for label in labels)
+            if len(labels) == 2 and runs[labels[1]][name]:
+                row += f'   x{runs[labels[0]][name] / runs[labels[1]][name]:.1f}'
+            self.stdout.write(f'{name:<{width}}{row}')
@@ -0,0 +1,149 @@
+import os
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from apps.documents.models import Document, StatusFeedVersion
+from services.async_extraction import AsyncExtractionEngine
+from services.document_processor import DocumentProcessor, ExtractionUnavailableError
+from services.extraction_queue import ExtractionQueue
+from services.status_feed import notify_status_change
+
+
+class Command(BaseCommand):
+    help = 'Extrae en lote tarjetas de propiedad de un directorio o de una lista de documentos usando Gemini asíncrono'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument(
+            '--dir',
+            type=str,
+            help='Directorio con PDFs a procesar (se recorre recursivamente)'
+        )
+        source.add_argument(
+            '--ids',
+            type=int,
+            nargs='+',
+            help='IDs de documentos existentes a procesar'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'GEMINI_ASYNC_CONCURRENCY', 8),
+            help='Máximo de llamadas simultáneas a Gemini'
+        )
+        parser.add_argument(
+            '--rpm',
+            type=int,
+            default=getattr(settings, 'GEMINI_REQUESTS_PER_MINUTE', 60),
+            help='Solicitudes por minuto permitidas por la cuota'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Archivo JSON donde guardar los resultados (solo con --dir)'
+        )
+
+    def handle(self, *args, **options):
+        engine = AsyncExtractionEngine(
+            concurrency=options['concurrency'],
+            requests_per_minute=options['rpm'],
+        )
+
+        if options['dir']:
+            stats = self._extract_directory(engine, options['dir'], options.get('output'))
+        else:
+            stats = self._extract_documents(engine, options['ids'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Procesados {stats.total} PDFs en {stats.elapsed:.1f}s "
+            f"({stats.throughput:.2f} docs/s)"
+        ))
+        self.stdout.write(
+            f"  Exitosos: {stats.succeeded} | Fallidos: {stats.failed} | "
+            f"Desde caché: {stats.cache_hits} | Reintentos por 429: {stats.rate_limited_retries}"
+        )
+        if stats.original_bytes:
+            self.stdout.write(
+                f"  Payload enviado a Gemini: {stats.payload_bytes} bytes "
+                f"(PDFs originales: {stats.original_bytes} bytes)"
+            )
+
+    def _extract_directory(self, engine, directory, output):
+        if not os.path.isdir(directory):
+            raise CommandError(f'No existe el directorio: {directory}')
+
+        pdf_paths = sorted(
+            os.path.join(root, name)
+            for root, _, files in os.walk(directory)
+            for name in files
+            if name.lower().endswith('.pdf')
+        )
+        if not pdf_paths:
+            raise CommandError(f'No se encontraron PDFs en {directory}')
+
+        self.stdout.write(f'Extrayendo {len(pdf_paths)} PDFs de {directory}...')
+        stats = engine.run(pdf_paths)
+
+        for outcome in stats.outcomes:
+            if not outcome.ok:
+                self.stdout.write(self.style.WARNING(f'  ✗ {outcome.pdf_path}: {outcome.error}'))
+
+        if output:
+            results = {
+                outcome.pdf_path: outcome.data if outcome.ok else {'error': outcome.error}
+                for outcome in stats.outcomes
+            }
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Resultados guardados en {output}')
+        return stats
+
+    def _extract_documents(self, engine, ids):
+        documents = list(Document.objects.filter(id__in=ids).select_related('user'))
+        missing = set(ids) - {document.id for document in documents}
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Documentos no encontrados: {sorted(missing)}'))
+
+        processor = DocumentProcessor()
+        by_path = {}
+        for document in documents:
+            if not document.file or not os.path.exists(document.file.path):
+                processor.mark_failed(document, FileNotFoundError(document.file.name if document.file else 'No especificado'))
+                continue
+            by_path.setdefault(document.file.path, []).append(document)
+
+        if not by_path:
+            raise CommandError('No hay documentos con archivo disponible para procesar')
+
+        by_user = {}
+        for docs in by_path.values():
+            for document in docs:
+                by_user.setdefault(document.user_id, []).append(document.id)
+        for user_id, document_ids in by_user.items():
+            with transaction.atomic():
+                Document.objects.filter(id__in=document_ids).update(
+                    status='processing',
+                    updated_at=timezone.now(),
+                    status_version=StatusFeedVersion.next_for(user_id),
+                )
+            notify_status_change(user_id)
+        self.stdout.write(f'Extrayendo {len(by_path)} documentos...')
+        stats = engine.run(list(by_path))
+
+        queue = ExtractionQueue()
+        for outcome in stats.outcomes:
+            for document in by_path[outcome.pdf_path]:
+                if outcome.ok:
+                    processor.apply_result(document, outcome.data)
+                elif outcome.transient:
+                    # Fallos temporales de Gemini: la cola los reintenta con backoff
+                    document.status = 'pending'
+                    document.save(update_fields=['status'])
+                    queue.enqueue(document)
+                    self.stdout.write(self.style.WARNING(f'  ↻ Documento {document.id} encolado: {outcome.error}'))
+                else:
+                    processor.mark_failed(document, ExtractionUnavailableError(outcome.error))
+                    self.stdout.write(self.style.WARNING(f'  ✗ Documento {document.id}: {outcome.error}'))
+        return stats
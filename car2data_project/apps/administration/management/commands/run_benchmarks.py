@@ -0,0 +1,181 @@
+import os
+import logging
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks import SUITES
+from benchmarks.bench_views import GROUP as VIEWS_GROUP, cleanup
+from benchmarks.fixtures import check_benchmark_database
+from benchmarks.runner import build_report, compare, load_report, measure, save_report
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta la suite de rendimiento (formularios, extracción y vistas), emite los '
+        'resultados en JSON y los compara con una línea base guardada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            default=[],
+            help='Grupos (formularios, extraccion, vistas) o fragmentos del nombre de los casos a ejecutar'
+        )
+        parser.add_argument('--list', action='store_true', help='Lista los casos disponibles y termina')
+        parser.add_argument('--output', type=str, help='Archivo JSON donde guardar los resultados')
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=DEFAULT_BASELINE,
+            help='Resultados de referencia contra los que se compara'
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Guarda estos resultados como línea base')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.10,
+            help='Variación tolerada antes de marcar regresión (fracción, 0.10 = 10%%)'
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Termina con error si algún caso empeora más que el umbral'
+        )
+        parser.add_argument('--min-time', type=float, default=1.0, help='Segundos mínimos de medición por caso')
+        parser.add_argument('--min-iterations', type=int, default=5, help='Iteraciones mínimas por caso')
+        parser.add_argument('--documents', type=int, default=100_000, help='Documentos sembrados para las vistas')
+        parser.add_argument('--users', type=int, default=20, help='Usuarios entre los que se reparten los documentos')
+        parser.add_argument(
+            '--stub-latency',
+            type=float,
+            default=0.0,
+            help='Segundos que tarda en responder el servidor Gemini local'
+        )
+        parser.add_argument('--cleanup', action='store_true', help='Elimina los datos sembrados y termina')
+        parser.add_argument(
+            '--i-know',
+            action='store_true',
+            help='Confirma que la base (sin DEBUG ni "bench" en el nombre) puede recibir los datos de las vistas'
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.stdout.write(self.style.SUCCESS(f'Eliminados {cleanup()} objetos sintéticos'))
+            return
+
+        benchmarks = self._collect(options)
+        if options['list']:
+            for benchmark in benchmarks:
+                self.stdout.write(f'{benchmark.group:<12} {benchmark.name}')
+            return
+        if not benchmarks:
+            raise CommandError('Ningún caso coincide con --only')
+        if any(benchmark.group == VIEWS_GROUP for benchmark in benchmarks):
+            # Los casos de vistas siembran documentos en la base configurada
+            check_benchmark_database(options['i_know'])
+
+        # Los casos repiten miles de veces rutas que registran en INFO
+        logging.disable(logging.WARNING)
+        try:
+            results, failures = self._run(benchmarks, options)
+        finally:
+            logging.disable(logging.NOTSET)
+
+        report = build_report(results)
+        if failures:
+            report['failures'] = failures
+        comparison = self._compare(results, options)
+        if comparison is not None:
+            report['comparison'] = comparison
+
+        self._report(results, comparison)
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"Resultados guardados en {options['output']}")
+        if options['save_baseline']:
+            save_report(report, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Línea base actualizada: {options['baseline']}"))
+
+        if failures:
+            raise CommandError(f'{len(failures)} casos fallaron: {", ".join(failures)}')
+        regressions = [name for name, item in (comparison or {}).items() if item['regressions']]
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Regresiones en {len(regressions)} casos: {", ".join(regressions)}')
+
+    def _collect(self, options):
+        suite_options = {
+            'documents': options['documents'],
+            'users': options['users'],
+            'stub_latency': options['stub_latency'],
+            'stdout': self.stdout,
+        }
+        benchmarks = []
+        for module_path in SUITES:
+            benchmarks += import_module(module_path).collect(suite_options)
+
+        filters = [value.lower() for value in options['only']]
+        if filters:
+            groups = {benchmark.group for benchmark in benchmarks}
+            # Un nombre de grupo selecciona el grupo completo; lo demás filtra por nombre del caso
+            benchmarks = [
+                benchmark for benchmark in benchmarks
+                if any(
+                    value == benchmark.group if value in groups else value in benchmark.name.lower()
+                    for value in filters
+                )
+            ]
+        return benchmarks
+
+    def _run(self, benchmarks, options):
+        results, failures = {}, {}
+        for benchmark in benchmarks:
+            self.stdout.write(f'[{benchmark.group}] {benchmark.name}...', ending='')
+            self.stdout.flush()
+            try:
+                results[benchmark.name] = measure(
+                    benchmark, min_time=options['min_time'], min_iterations=options['min_iterations']
+                )
+            except Exception as e:
+                failures[benchmark.name] = str(e)
+                self.stdout.write(self.style.ERROR(f' error: {str(e)}'))
+                continue
+            self.stdout.write(f" {results[benchmark.name]['iterations']} iteraciones")
+        return results, failures
+
+    def _compare(self, results, options):
+        baseline_path = options['baseline']
+        if options['save_baseline'] or not os.path.exists(baseline_path):
+            return None
+        baseline = load_report(baseline_path)
+        return compare(results, baseline.get('results', {}), options['threshold'])
+
+    def _report(self, results, comparison):
+        width = max((len(name) for name in results), default=10) + 2
+        self.stdout.write(
+            f"\n{'caso':<{width}}{'ops/s':>12}{'p95 ms':>12}{'memoria KiB':>14}"
+            + ('   vs. línea base' if comparison is not None else '')
+        )
+        for name, result in results.items():
+            row = (
+                f"{name:<{width}}{result['ops_per_sec']:>12.1f}{result['p95_ms']:>12.2f}"
+                f"{result['peak_memory_bytes'] / 1024:>14.1f}"
+            )
+            item = (comparison or {}).get(name)
+            if item:
+                changes = item['changes']
+                row += '   ' + '  '.join(
+                    f'{label} {self._percent(changes[key])}'
+                    for label, key in (('ops/s', 'ops_per_sec'), ('p95', 'p95_ms'), ('mem', 'peak_memory_bytes'))
+                )
+                if item['regressions']:
+                    row = self.style.ERROR(row + '  REGRESIÓN')
+            elif comparison is not None:
+                row += '   (sin línea base)'
+            self.stdout.write(row)
+
+    @staticmethod
+    def _percent(ratio):
+        return 'n/d' if ratio is None else f'{(ratio - 1) * 100:+.0f}%'
@@ -0,0 +1,55 @@
+import signal
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from services.extraction_queue import ExtractionWorkerPool
+from services.pdf_extractor import reload_extractors, warm_up
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta workers dedicados que consumen la cola de extracción de documentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'EXTRACTION_WORKER_CONCURRENCY', 2),
+            help='Número máximo de documentos procesados en paralelo'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'EXTRACTION_POLL_INTERVAL', 2),
+            help='Segundos de espera cuando la cola está vacía'
+        )
+
+    def handle(self, *args, **options):
+        pool = ExtractionWorkerPool(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+        )
+
+        def shutdown(signum, frame):
+            self.stdout.write(self.style.WARNING('Deteniendo workers, esperando trabajos en curso...'))
+            pool.request_stop()
+
+        def reload(signum, frame):
+            self.stdout.write('Recargando extractores de Gemini (GEMINI_MODEL)...')
+            try:
+                from dotenv import load_dotenv
+                load_dotenv(settings.BASE_DIR / '.env', override=True)
+            except ImportError:
+                pass
+            reload_extractors()
+            warm_up()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, reload)
+
+        pool.start()
+        self.stdout.write(
+            self.style.SUCCESS(f"Workers de extracción iniciados ({options['concurrency']} en paralelo)")
+        )
+        pool.wait()
+        self.stdout.write(self.style.SUCCESS('Workers detenidos'))
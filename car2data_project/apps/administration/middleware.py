@@ -0,0 +1,84 @@
+import time
+import random
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.backends.signals import connection_created
+from services.metrics import get_metrics, install_query_counter, query_counter
+from services.profiling import ProfileSession
+
+
+class RequestMetricsMiddleware:
+    """
+    Mide cada petición: latencia por nombre de vista y cantidad/tiempo de consultas
+    a la BD. Solo lee contadores acumulados por hilo; no crea objetos por petición.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.metrics = get_metrics()
+        connection_created.connect(install_query_counter, dispatch_uid='car2data_query_counter')
+
+    def __call__(self, request):
+        # La conexión del hilo pudo abrirse antes de conectar la señal
+        install_query_counter(connection=connection)
+        counter = query_counter()
+        queries, db_seconds = counter.count, counter.seconds
+        started = time.perf_counter()
+
+        response = self.get_response(request)
+
+        match = request.resolver_match
+        self.metrics.observe_request(
+            match.view_name if match else 'unresolved',
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            counter.count - queries,
+            counter.seconds - db_seconds,
+        )
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Perfila peticiones bajo demanda: las de usuarios staff que envían la cabecera
+    X-Profile y una fracción muestreada (PROFILING_SAMPLE_RATE) de las vistas en
+    PROFILING_VIEWS. Con PROFILING_ENABLED=False Django la descarta al arrancar.
+    """
+
+    HEADER = 'X-Profile'
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.views = frozenset(getattr(settings, 'PROFILING_VIEWS', ()))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        session = getattr(request, '_profile_session', None)
+        if session is not None:
+            session.stop()
+            artifact = session.save(request, response)
+            if artifact is not None and session.trigger == 'header':
+                response['X-Profile-Id'] = str(artifact.pk)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trigger = self._trigger(request)
+        if trigger is not None:
+            # Se arranca aquí, ya resuelta la URL: el perfil cubre la vista y la respuesta
+            session = ProfileSession(trigger)
+            session.start()
+            request._profile_session = session
+        return None
+
+    def _trigger(self, request):
+        if request.headers.get(self.HEADER) and request.user.is_staff:
+            return 'header'
+        if (self.sample_rate > 0 and request.resolver_match.view_name in self.views
+                and random.random() < self.sample_rate):
+            return 'sample'
+        return None
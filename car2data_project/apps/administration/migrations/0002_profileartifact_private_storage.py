@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:59
+
+import os
+import shutil
+import apps.administration.models
+from django.conf import settings
+from django.db import migrations, models
+
+OLD_PREFIX = 'profiles/'
+
+
+def move_profiles_out_of_media(apps, schema_editor):
+    """Mueve los perfiles ya guardados en MEDIA_ROOT/profiles/ a PROFILING_ROOT"""
+    ProfileArtifact = apps.get_model('administration', 'ProfileArtifact')
+    profiling_root = str(getattr(settings, 'PROFILING_ROOT', settings.BASE_DIR / 'profiles'))
+    for artifact in ProfileArtifact.objects.filter(profile_file__startswith=OLD_PREFIX).iterator():
+        new_name = artifact.profile_file.name[len(OLD_PREFIX):]
+        source = os.path.join(settings.MEDIA_ROOT, artifact.profile_file.name)
+        if os.path.exists(source):
+            target = os.path.join(profiling_root, new_name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(source, target)
+        ProfileArtifact.objects.filter(pk=artifact.pk).update(profile_file=new_name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profileartifact',
+            name='profile_file',
+            field=models.FileField(storage=apps.administration.models.ProfileStorage(), upload_to='%Y/%m/'),
+        ),
+        migrations.RunPython(move_profiles_out_of_media, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+import os
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.contrib.auth.models import User
+
+
+class ProfileStorage(FileSystemStorage):
+    """
+    Perfiles guardados en PROFILING_ROOT, fuera de MEDIA_ROOT: no tienen URL
+    pública y solo se descargan desde la vista de staff del admin.
+    """
+
+    @property
+    def base_location(self):
+        return str(getattr(settings, 'PROFILING_ROOT', settings.BASE_DIR / 'profiles'))
+
+    @property
+    def location(self):
+        return os.path.abspath(self.base_location)
+
+    def url(self, name):
+        raise ValueError("Los perfiles no tienen URL pública")
+
+
+class ProfileArtifact(models.Model):
+    """Perfil de una petición capturado en producción (cProfile o pyinstrument) con sus consultas SQL"""
+
+    TRIGGER_CHOICES = [
+        ('header', 'Cabecera de staff'),
+        ('sample', 'Muestreo'),
+    ]
+
+    PROFILER_CHOICES = [
+        ('cprofile', 'cProfile'),
+        ('pyinstrument', 'pyinstrument'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='profile_artifacts')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    profiler = models.CharField(max_length=20, choices=PROFILER_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    # [{'sql': ..., 'ms': ...}] en orden de ejecución (recortado a PROFILING_MAX_QUERIES)
+    queries = models.JSONField(default=list, blank=True)
+    # Resumen legible en el admin; el archivo completo se descarga aparte
+    summary = models.TextField(blank=True)
+    profile_file = models.FileField(upload_to='%Y/%m/', storage=ProfileStorage())
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Perfil de petición'
+        verbose_name_plural = 'Perfiles de peticiones'
+        indexes = [
+            models.Index(fields=['view_name', '-created_at'], name='profile_view_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    def delete(self, *args, **kwargs):
+        # El archivo del perfil no se borra solo con la fila
+        if self.profile_file:
+            self.profile_file.delete(save=False)
+        return super().delete(*args, **kwargs)
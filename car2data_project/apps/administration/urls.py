@@ -4,6 +4,6 @@ from . import views
 app_name = 'administration'
 
 urlpatterns = [
-    # Placeholder for administration-related URLs
-    # Add your administration URLs here when you create the views
+    # Scrape de Prometheus (sin barra final, la ruta por defecto de los scrapers)
+    path('metrics', views.metrics, name='metrics'),
 ]
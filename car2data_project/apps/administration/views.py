@@ -1,6 +1,23 @@
+import hmac
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseForbidden
+from services.metrics import get_metrics
 
 # Placeholder views for administration app
 def index(request):
     return HttpResponse("Administration app - Coming soon!")
+
+
+def metrics(request):
+    """Métricas en formato Prometheus; exige METRICS_TOKEN como Bearer salvo en DEBUG sin token"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(provided.encode(), token.encode()):
+            return HttpResponseForbidden('Token de métricas inválido')
+    elif not settings.DEBUG:
+        return HttpResponseForbidden('Configure METRICS_TOKEN para exponer las métricas')
+
+    content, content_type = get_metrics().render()
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,52 @@
+from .models import UserSubscription
+
+PLAN_FEATURES = {
+    'starter': ['3 documentos/mes', 'Autodiligenciado básico'],
+    'pro': ['100 documentos/mes', 'Contratos y formularios oficiales', 'Soporte prioritario'],
+    'enterprise': ['Documentos ilimitados', 'SLA y soporte dedicado', 'Integraciones a medida'],
+}
+
+# Valores cuando el usuario aún no tiene suscripción (plan Starter)
+DEFAULT_SUBSCRIPTION_CONTEXT = {
+    'subscription': None,
+    'plan_name': 'Starter',
+    'documents_used': 0,
+    'documents_limit': 3,
+    'documents_remaining': 3,
+    'can_upload': True,
+    'plan_features': PLAN_FEATURES['starter'],
+    # No hay campo de renovación; None oculta la fecha en las plantillas
+    'renewal_date': None,
+}
+
+
+def get_subscription_context(request):
+    """Datos del plan del usuario, calculados una vez por petición"""
+    context = getattr(request, '_subscription_context', None)
+    if context is not None:
+        return context
+
+    subscription = UserSubscription.get_cached(request.user.id)
+    if subscription is None:
+        context = dict(DEFAULT_SUBSCRIPTION_CONTEXT)
+    else:
+        context = {
+            'subscription': subscription,
+            'plan_name': subscription.get_plan_display(),
+            'documents_used': subscription.documents_used,
+            'documents_limit': subscription.get_documents_limit(),
+            'documents_remaining': subscription.get_remaining_documents(),
+            'can_upload': subscription.can_generate_document(),
+            'plan_features': PLAN_FEATURES.get(subscription.plan, []),
+            'renewal_date': None,
+        }
+    request._subscription_context = context
+    return context
+
+
+def subscription(request):
+    """Context processor: expone el plan y el cupo del usuario autenticado a todas las plantillas"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return get_subscription_context(request)
@@ -1,4 +1,8 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.contrib.auth.models import User
 from django.utils import timezone
 import random
@@ -33,6 +37,37 @@ class UserSubscription(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.get_plan_display()}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidate_cache()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+    
+    @staticmethod
+    def cache_key(user_id):
+        return f'subscription:user:{user_id}'
+    
+    @classmethod
+    def get_cached(cls, user_id):
+        """Suscripción del usuario desde la caché (None si no tiene); se invalida al guardar"""
+        key = cls.cache_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            # False distingue "sin suscripción" de "no está en caché"
+            cached = cls.objects.filter(user_id=user_id).first() or False
+            cache.set(key, cached, getattr(settings, 'SUBSCRIPTION_CACHE_TIMEOUT', 300))
+        return cached or None
+    
+    def invalidate_cache(self):
+        key = self.cache_key(self.user_id)
+        cache.delete(key)
+        # Dentro de una transacción otra petición puede volver a cachear la fila antigua
+        # antes del commit: se invalida de nuevo al confirmar
+        transaction.on_commit(lambda: cache.delete(key))
+    
     def get_plan_price(self):
         """Retorna el precio del plan"""
         prices = {
@@ -60,9 +95,44 @@ class UserSubscription(models.Model):
         return self.documents_used < self.get_documents_limit()
     
     def increment_documents(self):
-        """Incrementa el contador de documentos usados"""
-        self.documents_used += 1
-        self.save()
+        """Incrementa el contador de documentos usados (un solo UPDATE, sin límite)"""
+        UserSubscription.objects.filter(pk=self.pk).update(documents_used=F('documents_used') + 1)
+        self.refresh_from_db(fields=['documents_used'])
+        self.invalidate_cache()
+    
+    def reserve_documents(self, count=1, partial=False):
+        """
+        Reserva cupo para `count` documentos con un UPDATE condicional, sin
+        exceder el límite aunque haya cargas concurrentes. Con partial=True
+        reserva lo que quede disponible. Retorna cuántos se reservaron.
+        """
+        limit = self.get_documents_limit()
+        wanted = count
+        while wanted > 0:
+            reserved = UserSubscription.objects.filter(
+                pk=self.pk, documents_used__lte=limit - wanted
+            ).update(documents_used=F('documents_used') + wanted)
+            if reserved:
+                self.refresh_from_db(fields=['documents_used'])
+                self.invalidate_cache()
+                return wanted
+            if not partial:
+                break
+            # Otra carga tomó cupo: reintentar con lo que quede
+            used = UserSubscription.objects.filter(pk=self.pk).values_list('documents_used', flat=True).first()
+            if used is None:
+                break
+            wanted = min(wanted, limit - used)
+        self.refresh_from_db(fields=['documents_used'])
+        return 0
+    
+    def release_documents(self, count=1):
+        """Devuelve cupo reservado (p. ej. si la extracción falla)"""
+        UserSubscription.objects.filter(pk=self.pk).update(
+            documents_used=Greatest(F('documents_used') - count, 0)
+        )
+        self.refresh_from_db(fields=['documents_used'])
+        self.invalidate_cache()
     
     def get_remaining_documents(self):
         """Retorna documentos restantes"""
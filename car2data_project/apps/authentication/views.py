@@ -157,50 +157,8 @@ class UserProfileView(LoginRequiredMixin, TemplateView):
 
     def get(self, request, *args, **kwargs):
         form = UserProfileForm(instance=request.user)
+        # El plan y el cupo los agrega el context processor de suscripción
         context = {'form': form}
-        # Plan/subscription context
-        try:
-            subscription = request.user.subscription
-            # Features por plan
-            features_map = {
-                'starter': [
-                    '3 documentos/mes',
-                    'Autodiligenciado básico',
-                ],
-                'pro': [
-                    '100 documentos/mes',
-                    'Contratos y formularios oficiales',
-                    'Soporte prioritario',
-                ],
-                'enterprise': [
-                    'Documentos ilimitados',
-                    'SLA y soporte dedicado',
-                    'Integraciones a medida',
-                ],
-            }
-            plan_key = subscription.plan
-            context.update({
-                'subscription': subscription,
-                'plan_name': subscription.get_plan_display(),
-                'documents_used': subscription.documents_used,
-                'documents_limit': subscription.get_documents_limit(),
-                'documents_remaining': subscription.get_remaining_documents(),
-                'can_upload': subscription.can_generate_document(),
-                'plan_features': features_map.get(plan_key, []),
-                # Fecha de renovación (si aplica). No hay campo explícito; mostrar None para ocultar en template.
-                'renewal_date': None,
-            })
-        except Exception:
-            context.update({
-                'subscription': None,
-                'plan_name': 'Starter',
-                'documents_used': 0,
-                'documents_limit': 3,
-                'documents_remaining': 3,
-                'can_upload': True,
-                'plan_features': ['3 documentos/mes', 'Autodiligenciado básico'],
-                'renewal_date': None,
-            })
         return self.render_to_response(context)
 
     def post(self, request, *args, **kwargs):
@@ -210,27 +168,7 @@ class UserProfileView(LoginRequiredMixin, TemplateView):
             messages.success(request, 'Tu perfil ha sido actualizado exitosamente.')
             return redirect('authentication:profile')
         messages.error(request, 'Por favor corrige los errores en el formulario.')
-        # Include subscription context on error as well
         context = {'form': form}
-        try:
-            subscription = request.user.subscription
-            context.update({
-                'subscription': subscription,
-                'plan_name': subscription.get_plan_display(),
-                'documents_used': subscription.documents_used,
-                'documents_limit': subscription.get_documents_limit(),
-                'documents_remaining': subscription.get_remaining_documents(),
-                'can_upload': subscription.can_generate_document(),
-            })
-        except Exception:
-            context.update({
-                'subscription': None,
-                'plan_name': 'Starter',
-                'documents_used': 0,
-                'documents_limit': 3,
-                'documents_remaining': 3,
-                'can_upload': True,
-            })
         return self.render_to_response(context)
 
 class UserSettingsView(LoginRequiredMixin, PasswordChangeView):
@@ -241,39 +179,6 @@ class UserSettingsView(LoginRequiredMixin, PasswordChangeView):
         messages.success(self.request, 'Tu contraseña ha sido cambiada exitosamente.')
         return super().form_valid(form)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        try:
-            subscription = self.request.user.subscription
-            features_map = {
-                'starter': ['3 documentos/mes', 'Autodiligenciado básico'],
-                'pro': ['100 documentos/mes', 'Contratos y formularios oficiales', 'Soporte prioritario'],
-                'enterprise': ['Documentos ilimitados', 'SLA y soporte dedicado', 'Integraciones a medida'],
-            }
-            plan_key = subscription.plan
-            context.update({
-                'subscription': subscription,
-                'plan_name': subscription.get_plan_display(),
-                'documents_used': subscription.documents_used,
-                'documents_limit': subscription.get_documents_limit(),
-                'documents_remaining': subscription.get_remaining_documents(),
-                'can_upload': subscription.can_generate_document(),
-                'plan_features': features_map.get(plan_key, []),
-                'renewal_date': None,
-            })
-        except Exception:
-            context.update({
-                'subscription': None,
-                'plan_name': 'Starter',
-                'documents_used': 0,
-                'documents_limit': 3,
-                'documents_remaining': 3,
-                'can_upload': True,
-                'plan_features': ['3 documentos/mes', 'Autodiligenciado básico'],
-                'renewal_date': None,
-            })
-        return context
-
 class VerifyEmailPromptView(TemplateView):
     template_name = 'authentication/verify_email_prompt.html'
     
@@ -603,28 +508,19 @@ class CheckoutView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Obtener la suscripción del usuario
-        try:
-            subscription = UserSubscription.objects.get(user=self.request.user)
-            context['subscription'] = subscription
-            context['current_plan'] = subscription.get_plan_display()
-            context['plan_name'] = 'Pro'  # Siempre upgrade a Pro
-            context['plan_price'] = 19
-            context['documents_used'] = subscription.documents_used
-            context['documents_limit'] = subscription.get_documents_limit()
-        except UserSubscription.DoesNotExist:
+        # Obtener la suscripción del usuario (el cupo lo agrega el context processor)
+        subscription = UserSubscription.get_cached(self.request.user.id)
+        if subscription is None:
             # Si no tiene suscripción, crear una por defecto
             subscription = UserSubscription.objects.create(
                 user=self.request.user,
                 plan='starter',
                 documents_used=0
             )
-            context['subscription'] = subscription
-            context['current_plan'] = 'Starter'
-            context['plan_name'] = 'Pro'
-            context['plan_price'] = 19
-            context['documents_used'] = 0
-            context['documents_limit'] = 3
+        context['subscription'] = subscription
+        context['current_plan'] = subscription.get_plan_display()
+        context['plan_name'] = 'Pro'  # Siempre upgrade a Pro
+        context['plan_price'] = 19
         
         return context
     
@@ -0,0 +1,86 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+from django.contrib import admin
+from django.http import HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from services.metrics import get_metrics
+from .models import ProcessingSpan
+
+# Ventanas disponibles en la vista de percentiles (horas)
+PERCENTILE_WINDOWS = (1, 6, 24, 168, 720)
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@admin.register(ProcessingSpan)
+class ProcessingSpanAdmin(admin.ModelAdmin):
+    list_display = ('document', 'stage', 'duration_ms', 'payload_bytes', 'model_name', 'outcome', 'started_at')
+    list_filter = ('stage', 'outcome', 'model_name')
+    search_fields = ('document__name', 'document__placa')
+    date_hierarchy = 'started_at'
+    raw_id_fields = ('document',)
+    list_select_related = ('document',)
+
+    def get_urls(self):
+        custom = [
+            path('percentiles/', self.admin_site.admin_view(self.percentiles_view),
+                 name='documents_processingspan_percentiles'),
+            path('prometheus/', self.admin_site.admin_view(self.prometheus_view),
+                 name='documents_processingspan_prometheus'),
+        ]
+        return custom + super().get_urls()
+
+    def percentiles_view(self, request):
+        """p50/p95/p99 de cada etapa en la ventana elegida"""
+        try:
+            hours = int(request.GET.get('hours', 24))
+        except ValueError:
+            hours = 24
+        if hours not in PERCENTILE_WINDOWS:
+            hours = 24
+
+        since = timezone.now() - timedelta(hours=hours)
+        durations = defaultdict(list)
+        errors = defaultdict(int)
+        spans = ProcessingSpan.objects.filter(started_at__gte=since).values_list('stage', 'duration_ms', 'outcome')
+        for stage, duration_ms, outcome in spans.iterator():
+            durations[stage].append(duration_ms)
+            if outcome == 'error':
+                errors[stage] += 1
+
+        rows = []
+        for stage in sorted(durations):
+            values = sorted(durations[stage])
+            rows.append({
+                'stage': stage,
+                'count': len(values),
+                'errors': errors[stage],
+                'p50': percentile(values, 0.50),
+                'p95': percentile(values, 0.95),
+                'p99': percentile(values, 0.99),
+                'max': values[-1],
+            })
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Percentiles por etapa',
+            'rows': rows,
+            'hours': hours,
+            'windows': PERCENTILE_WINDOWS,
+        }
+        return TemplateResponse(request, 'admin/documents/processingspan/percentiles.html', context)
+
+    def prometheus_view(self, request):
+        """Histogramas acumulados en este proceso, en formato de texto de Prometheus"""
+        content, content_type = get_metrics().render()
+        return HttpResponse(content, content_type=content_type)
@@ -9,4 +9,32 @@ class DocumentUploadForm(forms.ModelForm):
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'document_type': forms.Select(attrs={'class': 'form-control'}),
             'file': forms.FileInput(attrs={'class': 'form-control', 'accept': '.pdf'}),
-        }
\ No newline at end of file
+        }
+
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleFileField(forms.FileField):
+    """Campo de archivo que acepta varios archivos en una sola petición"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_file_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_file_clean(item, initial) for item in data]
+        return [single_file_clean(data, initial)]
+
+
+class BulkUploadForm(forms.Form):
+    document_type = forms.ChoiceField(
+        choices=Document.DOCUMENT_TYPES,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    files = MultipleFileField(
+        widget=MultipleFileInput(attrs={'class': 'form-control', 'accept': '.pdf,.zip', 'multiple': True})
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_extractioncacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='upload_batch',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+    ]
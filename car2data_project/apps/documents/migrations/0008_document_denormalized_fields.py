@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:17
+
+import json
+
+from django.db import migrations, models
+
+# campo del modelo: (sección del JSON extraído, clave, longitud máxima)
+DENORMALIZED_FIELDS = {
+    'placa': ('informacion_vehiculo', 'placa', 20),
+    'marca': ('informacion_vehiculo', 'marca', 100),
+    'linea': ('informacion_vehiculo', 'linea', 100),
+    'modelo': ('informacion_vehiculo', 'modelo', 10),
+    'propietario_identificacion': ('informacion_propietario', 'identificacion', 30),
+}
+
+
+def backfill_denormalized_fields(apps, schema_editor):
+    """Llena los campos denormalizados de los documentos ya extraídos"""
+    Document = apps.get_model('documents', 'Document')
+    updated = []
+    for document in Document.objects.exclude(extracted_data_json__isnull=True).exclude(extracted_data_json='').iterator():
+        try:
+            data = json.loads(document.extracted_data_json)
+        except (ValueError, TypeError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        for field_name, (section, key, max_length) in DENORMALIZED_FIELDS.items():
+            value = str(((data.get(section) or {}).get(key)) or '').strip()
+            if value == 'No disponible':
+                value = ''
+            setattr(document, field_name, value[:max_length])
+        updated.append(document)
+    Document.objects.bulk_update(updated, list(DENORMALIZED_FIELDS), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_upload_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='linea',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='marca',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='modelo',
+            field=models.CharField(blank=True, db_index=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='placa',
+            field=models.CharField(blank=True, db_index=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='propietario_identificacion',
+            field=models.CharField(blank=True, db_index=True, max_length=30),
+        ),
+        migrations.RunPython(backfill_denormalized_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:21
+
+from django.db import migrations, models
+
+
+def mark_counted_documents(apps, schema_editor):
+    """Los documentos completados ya descontaron cupo al terminar la extracción"""
+    Document = apps.get_model('documents', 'Document')
+    Document.objects.filter(status='completed').update(quota_reserved=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_document_document_user_uploaded_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='quota_reserved',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_counted_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_document_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=50)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duration_ms', models.FloatField()),
+                ('payload_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('model_name', models.CharField(blank=True, max_length=100)),
+                ('outcome', models.CharField(choices=[('ok', 'Correcto'), ('error', 'Error')], default='ok', max_length=10)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_spans', to='documents.document')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['stage', 'started_at'], name='span_stage_started_idx'), models.Index(fields=['started_at'], name='span_started_idx')],
+            },
+        ),
+    ]
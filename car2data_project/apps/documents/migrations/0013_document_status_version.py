@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0012_processingspan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusFeedVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='document',
+            name='document_user_updated_idx',
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='status_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['user', 'status_version'], name='document_user_version_idx'),
+        ),
+        migrations.AddField(
+            model_name='statusfeedversion',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='status_feed_version', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.core.files.storage import default_storage
+from django.utils import timezone
 import json
 
 
@@ -23,14 +25,70 @@ class Document(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Versión del usuario (StatusFeedVersion) en el último cambio de estado; cursor del feed de estados
+    status_version = models.BigIntegerField(default=0)
+    upload_batch = models.CharField(max_length=32, blank=True, db_index=True)
+    # True mientras el documento ocupa una unidad del cupo de la suscripción
+    quota_reserved = models.BooleanField(default=False)
 
     # Campos para información extraída por Gemini
     extracted_data_json = models.TextField(blank=True, null=True)
     extraction_error = models.TextField(blank=True, null=True)
 
+    # Copia indexada de los campos más consultados, para listar y buscar sin parsear el JSON
+    placa = models.CharField(max_length=20, blank=True, db_index=True)
+    marca = models.CharField(max_length=100, blank=True, db_index=True)
+    linea = models.CharField(max_length=100, blank=True, db_index=True)
+    modelo = models.CharField(max_length=10, blank=True, db_index=True)
+    propietario_identificacion = models.CharField(max_length=30, blank=True, db_index=True)
+
+    # campo del modelo: (sección, clave) en get_structured_data()
+    DENORMALIZED_FIELDS = {
+        'placa': ('vehiculo', 'placa'),
+        'marca': ('vehiculo', 'marca'),
+        'linea': ('vehiculo', 'linea'),
+        'modelo': ('vehiculo', 'modelo'),
+        'propietario_identificacion': ('propietario', 'identificacion'),
+    }
+
+    class Meta:
+        indexes = [
+            # Dashboard e historial: documentos del usuario, más recientes primero
+            models.Index(fields=['user', '-uploaded_at'], name='document_user_uploaded_idx'),
+            # Contadores y filtros por estado
+            models.Index(fields=['user', 'status'], name='document_user_status_idx'),
+            # Parcial: solo los documentos en cola o en proceso (PostgreSQL/SQLite)
+            models.Index(
+                fields=['user', 'uploaded_at'],
+                condition=models.Q(status__in=['pending', 'processing']),
+                name='document_user_active_idx',
+            ),
+            # Feed de estados: cambios del usuario desde el último cursor
+            models.Index(fields=['user', 'status_version'], name='document_user_version_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.user.username}"
 
+    def save(self, *args, **kwargs):
+        # auto_now solo se aplica si updated_at está en update_fields
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['updated_at']
+        if update_fields is not None and 'status' not in update_fields:
+            super().save(*args, **kwargs)
+            return
+
+        if update_fields is not None:
+            kwargs['update_fields'] = list(kwargs['update_fields']) + ['status_version']
+        # La versión se toma en la misma transacción que el cambio para que el cursor no salte cambios
+        with transaction.atomic(using=kwargs.get('using')):
+            self.status_version = StatusFeedVersion.next_for(self.user_id)
+            super().save(*args, **kwargs)
+        from services.status_feed import notify_status_change
+        notify_status_change(self.user_id)
+
     @property
     def safe_file_size(self):
         """Devuelve el tamaño del archivo en bytes o None si el archivo no existe."""
@@ -53,17 +111,37 @@ class Document(models.Model):
     def set_extracted_data(self, data_dict):
         """Guarda los datos extraídos como JSON"""
         self.extracted_data_json = json.dumps(data_dict, ensure_ascii=False, indent=2)
+        self.sync_extracted_fields()
         self.save()
 
+    def sync_extracted_fields(self):
+        """Copia los campos denormalizados desde los datos extraídos (vacíos si no hay)"""
+        structured_data = self.get_structured_data()
+        for field_name, (section, key) in self.DENORMALIZED_FIELDS.items():
+            value = str((structured_data.get(section) or {}).get(key) or '').strip()
+            max_length = self._meta.get_field(field_name).max_length
+            setattr(self, field_name, value[:max_length])
+
     def get_structured_data(self):
         """
-        Retorna los datos extraídos en un formato estructurado para autodiligenciado
+        Retorna los datos extraídos en un formato estructurado para autodiligenciado.
+        Se memoriza por instancia mientras extracted_data_json no cambie; el
+        diccionario es compartido, no modificarlo.
         """
-        if not self.extracted_data_json:
+        source = self.extracted_data_json
+        cached = self.__dict__.get('_structured_data_cache')
+        if cached is not None and cached[0] is source:
+            return cached[1]
+        structured = self._build_structured_data(source)
+        self._structured_data_cache = (source, structured)
+        return structured
+
+    def _build_structured_data(self, source):
+        if not source:
             return {}
 
         try:
-            data = json.loads(self.extracted_data_json)
+            data = json.loads(source)
 
             # Crear diccionario de información del vehículo
             info_vehiculo = {
@@ -208,12 +286,138 @@ class Document(models.Model):
             pass
         return None
 
+    def claim_quota(self):
+        """Marca el cupo como tomado por este documento; False si ya lo estaba"""
+        claimed = Document.objects.filter(pk=self.pk, quota_reserved=False).update(quota_reserved=True)
+        self.quota_reserved = True
+        return bool(claimed)
+
+    def release_quota(self):
+        """Devuelve el cupo de este documento a la suscripción, una sola vez"""
+        released = Document.objects.filter(pk=self.pk, quota_reserved=True).update(quota_reserved=False)
+        self.quota_reserved = False
+        if released:
+            from apps.authentication.models import UserSubscription
+            subscription = UserSubscription.objects.filter(user_id=self.user_id).first()
+            if subscription:
+                subscription.release_documents()
+        return bool(released)
+
     def get_absolute_url(self):
         """URL para redirección después de crear/actualizar"""
         from django.urls import reverse
         return reverse('documents:data_preview', kwargs={'pk': self.pk})
 
 
+class StatusFeedVersion(models.Model):
+    """Contador por usuario de los cambios de estado de sus documentos (cursor monótono del feed)"""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='status_feed_version')
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Feed de {self.user_id}: versión {self.version}"
+
+    @classmethod
+    def next_for(cls, user_id):
+        """
+        Incrementa y retorna la versión del usuario. Debe llamarse dentro de la transacción
+        que guarda el cambio: el UPDATE bloquea la fila hasta el commit, así las versiones
+        se hacen visibles en orden y un cursor nunca deja atrás un cambio sin confirmar.
+        """
+        if not cls.objects.filter(user_id=user_id).update(version=F('version') + 1):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=user_id, version=1)
+                return 1
+            except IntegrityError:
+                # Otro proceso creó la fila a la vez
+                cls.objects.filter(user_id=user_id).update(version=F('version') + 1)
+        return cls.objects.filter(user_id=user_id).values_list('version', flat=True).get()
+
+    @classmethod
+    def current(cls, user_id):
+        """Versión actual del usuario (0 si aún no cambió ningún estado)"""
+        return cls.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+
+class ExtractionJob(models.Model):
+    """Trabajo persistente de extracción con IA para un documento"""
+
+    STATUS_CHOICES = [
+        ('queued', 'En cola'),
+        ('running', 'En ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+    ]
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='extraction_jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='extraction_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='extractionjob_status_run_idx'),
+        ]
+
+    def __str__(self):
+        return f"Extracción {self.id} - {self.document_id} ({self.status})"
+
+
+class ExtractionCacheEntry(models.Model):
+    """Resultado de extracción reutilizable para un mismo PDF, modelo y versión de prompt"""
+
+    key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    model_name = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=64)
+    extracted_data_json = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Caché {self.content_hash[:12]} - {self.model_name}"
+
+
+
+class ProcessingSpan(models.Model):
+    """Duración de una etapa del procesamiento de un documento (subida, cola, Gemini, guardado...)"""
+
+    OUTCOME_CHOICES = [
+        ('ok', 'Correcto'),
+        ('error', 'Error'),
+    ]
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='processing_spans')
+    stage = models.CharField(max_length=50)
+    started_at = models.DateTimeField(default=timezone.now)
+    duration_ms = models.FloatField()
+    payload_bytes = models.BigIntegerField(null=True, blank=True)
+    model_name = models.CharField(max_length=100, blank=True)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, default='ok')
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            # Percentiles por etapa en una ventana de tiempo
+            models.Index(fields=['stage', 'started_at'], name='span_stage_started_idx'),
+            models.Index(fields=['started_at'], name='span_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} - documento {self.document_id} ({self.duration_ms:.0f} ms)"
+
 class ExtractedData(models.Model):
     document = models.OneToOneField(Document, on_delete=models.CASCADE)
 
@@ -6,9 +6,13 @@ app_name = 'documents'
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
     path('upload/', views.DocumentUploadView.as_view(), name='upload'),
+    path('upload/bulk/', views.BulkUploadView.as_view(), name='bulk_upload'),
+    path('batch/<str:batch_id>/', views.BatchDetailView.as_view(), name='batch_detail'),
+    path('batch/<str:batch_id>/status/', views.batch_status, name='batch_status'),
     path('preview/<int:pk>/', views.DataPreviewView.as_view(), name='data_preview'),
     path('history/', views.DocumentHistoryView.as_view(), name='history'),
     path('process/<int:pk>/', views.ProcessDocumentView.as_view(), name='process'),
     path('reprocess/<int:pk>/', views.reprocess_document, name='reprocess'),
     path('status/<int:pk>/', views.document_status, name='status'),
+    path('status/feed/', views.status_feed, name='status_feed'),
 ]
\ No newline at end of file
@@ -1,19 +1,23 @@
-import os
-import threading
-import traceback
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import TemplateView, CreateView, ListView
+from django.views.generic import TemplateView, CreateView, ListView, FormView
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.utils import timezone
-from django.http import JsonResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import JsonResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
-from .models import Document, ExtractedData
-from .forms import DocumentUploadForm
-from services.pdf_extractor import PDFExtractor
+from .models import Document, ExtractedData, StatusFeedVersion
+from .forms import DocumentUploadForm, BulkUploadForm
+from services.extraction_queue import ExtractionQueue, ensure_embedded_workers
+from services.gemini_health import get_gemini_status
+from services.status_feed import get_status_broker
+from services.metrics import record_stage
+from services.bulk_upload import BulkUploadService, BulkUploadError
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -24,32 +28,25 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         user_documents = Document.objects.filter(user=self.request.user)
         
-        # Documentos recientes (últimos 5)
-        context['recent_documents'] = user_documents.order_by('-uploaded_at')[:5]
-        
-        # Contadores
-        context['total_documents'] = user_documents.count()
-        context['processed_documents'] = user_documents.filter(status='completed').count()
-        context['processing_documents'] = user_documents.filter(status__in=['pending', 'processing']).count()
+        # Documentos recientes (últimos 5); el JSON extraído no se usa en la lista
+        context['recent_documents'] = list(
+            user_documents.defer('extracted_data_json', 'extraction_error').order_by('-uploaded_at')[:5]
+        )
         
-        # INFORMACIÓN DE SUSCRIPCIÓN
-        try:
-            subscription = self.request.user.subscription
-            context['subscription'] = subscription
-            context['documents_used'] = subscription.documents_used
-            context['documents_limit'] = subscription.get_documents_limit()
-            context['documents_remaining'] = subscription.get_remaining_documents()
-            context['can_upload'] = subscription.can_generate_document()
-            context['plan_name'] = subscription.get_plan_display()
-        except:
-            # Si no tiene suscripción, valores por defecto
-            context['subscription'] = None
-            context['documents_used'] = 0
-            context['documents_limit'] = 3
-            context['documents_remaining'] = 3
-            context['can_upload'] = True
-            context['plan_name'] = 'Starter'
+        # Contadores en una sola consulta
+        counts = user_documents.aggregate(
+            total=Count('id'),
+            processed=Count('id', filter=Q(status='completed')),
+            processing=Count('id', filter=Q(status__in=['pending', 'processing'])),
+        )
+        context['total_documents'] = counts['total']
+        context['processed_documents'] = counts['processed']
+        context['processing_documents'] = counts['processing']
+
+        # Estado del servicio de IA (circuit breaker de Gemini)
+        context['gemini_status'] = get_gemini_status()
         
+        # La información de suscripción la agrega el context processor de authentication
         return context
 
 class DocumentUploadView(LoginRequiredMixin, CreateView):
@@ -65,8 +62,8 @@ class DocumentUploadView(LoginRequiredMixin, CreateView):
             messages.error(self.request, 'No se encontró tu suscripción. Por favor, contacta al soporte técnico.')
             return redirect('documents:dashboard')
         
-        # Verificar si puede generar más documentos
-        if not subscription.can_generate_document():
+        # Reservar el cupo antes de guardar: un UPDATE condicional evita superar el límite con cargas simultáneas
+        if not subscription.reserve_documents():
             messages.warning(
                 self.request,
                 f'Has alcanzado tu límite de {subscription.get_documents_limit()} documentos en el plan gratuito. '
@@ -76,122 +73,79 @@ class DocumentUploadView(LoginRequiredMixin, CreateView):
         
         # Proceder con el guardado
         form.instance.user = self.request.user
-        response = super().form_valid(form)
+        form.instance.quota_reserved = True
+        started = time.perf_counter()
+        try:
+            response = super().form_valid(form)
+        except Exception:
+            subscription.release_documents()
+            raise
+        record_stage('upload', time.perf_counter() - started, document=self.object,
+                     payload_bytes=self.object.file.size if self.object.file else None)
         
-        # Iniciar procesamiento en segundo plano
+        # Encolar la extracción; los workers la procesan fuera de la petición
         if self.object.file:
-            logger.info(f"Iniciando procesamiento para documento {self.object.id}")
-            thread = threading.Thread(
-                target=self.process_document_background,
-                args=(self.object.id,)
-            )
-            thread.daemon = True
-            thread.start()
+            ExtractionQueue().enqueue(self.object)
         
-        remaining = subscription.get_remaining_documents() - 1  # -1 porque estamos procesando uno ahora
+        remaining = subscription.get_remaining_documents()
         messages.success(
             self.request, 
             f'Documento subido correctamente. Te quedan {remaining} documentos disponibles en tu plan actual.'
         )
         return response
-    
-    def process_document_background(self, document_id):
-        """Procesa el documento en segundo plano"""
-        document = None
+
+class BulkUploadView(LoginRequiredMixin, FormView):
+    """Carga de varias tarjetas de propiedad a la vez (ZIP o varios PDFs)"""
+    form_class = BulkUploadForm
+    template_name = 'documents/bulk_upload.html'
+
+    def form_valid(self, form):
         try:
-            logger.info(f"Iniciando procesamiento en segundo plano para documento {document_id}")
-            
-            document = Document.objects.get(id=document_id)
-            document.status = 'processing'
-            document.save()
-            
-            logger.info(f"Documento marcado como 'processing': {document.name}")
-            
-            # Verificar que el archivo existe
-            if not document.file or not os.path.exists(document.file.path):
-                raise FileNotFoundError(f"No se pudo encontrar el archivo: {document.file.path if document.file else 'No especificado'}")
-            
-            # Obtener la ruta del archivo
-            pdf_path = document.file.path
-            logger.info(f"Ruta del PDF: {pdf_path}")
-            
-            # Crear extractor y probar conexión
-            extractor = PDFExtractor()
-            
-            # Probar conexión antes de procesar
-            if not extractor.test_connection():
-                # Manejo controlado cuando no hay cuota/conectividad/modelo inválido
-                logger.warning("Gemini no disponible o modelo inválido. Documento marcado como error amigable.")
-                document.status = 'error'
-                document.error_message = (
-                    "El servicio de IA no está disponible en este momento (cuota, conectividad o modelo no soportado). "
-                    "Inténtalo de nuevo más tarde o verifica la configuración."
-                )
-                document.save()
-                return
-
-            logger.info("Conexión con Gemini establecida correctamente")
-            
-            # Extraer información usando Gemini con timeout
-            try:
-                extracted_data = extractor.extract_vehicle_info(pdf_path)
-                logger.info(f"Datos extraídos: {extracted_data}")
-                
-                # Guardar los datos extraídos
-                document.set_extracted_data(extracted_data)
-                
-                # Actualizar el tipo de documento si se identificó
-                if extracted_data.get('tipo_documento') and extracted_data.get('tipo_documento') != 'No identificado':
-                    doc_type = extracted_data.get('tipo_documento', '').lower()
-                    doc_type_mapping = {
-                        'matrícula': 'registration',
-                        'matricula': 'registration',
-                        'registro': 'registration',
-                        'propiedad': 'ownership',
-                        'tarjeta': 'ownership'
-                    }
-                    
-                    for key, value in doc_type_mapping.items():
-                        if key in doc_type:
-                            document.document_type = value
-                            break
-                
-                document.status = 'completed'
-                document.processed_at = timezone.now()
-                document.error_message = ''
-                logger.info(f"Documento procesado exitosamente: {document.name}")
-                
-                # INCREMENTAR CONTADOR DE DOCUMENTOS USADOS
-                try:
-                    subscription = document.user.subscription
-                    subscription.increment_documents()
-                    logger.info(f"Contador incrementado. Documentos usados: {subscription.documents_used}/{subscription.get_documents_limit()}")
-                except Exception as e:
-                    logger.error(f"Error al actualizar el contador de documentos: {str(e)}")
-                
-            except Exception as e:
-                logger.error(f"Error durante el procesamiento del documento: {str(e)}")
-                logger.error(traceback.format_exc())
-                document.status = 'error'
-                document.error_message = f"Error al procesar el documento: {str(e)}"
-            
-            document.save()
-            
-        except FileNotFoundError as e:
-            logger.error(f"Error: Archivo no encontrado - {str(e)}")
-            if document:
-                document.status = 'error'
-                document.error_message = f"No se pudo encontrar el archivo: {str(e)}"
-                document.save()
-        except Exception as e:
-            logger.error(f"Error al procesar el documento: {str(e)}")
-            logger.error(traceback.format_exc())
-            
-            if document:
-                document.status = 'error'
-                document.error_message = f"Ocurrió un error inesperado: {str(e)}"
-                document.save()
-                logger.info(f"Documento {document_id} marcado como error")
+            subscription = self.request.user.subscription
+        except:
+            messages.error(self.request, 'No se encontró tu suscripción. Por favor, contacta al soporte técnico.')
+            return redirect('documents:dashboard')
+
+        remaining = subscription.get_remaining_documents()
+        if remaining <= 0:
+            messages.warning(
+                self.request,
+                f'Has alcanzado tu límite de {subscription.get_documents_limit()} documentos. '
+                f'¡Actualiza a Pro para obtener hasta 100 documentos por mes!'
+            )
+            return redirect('authentication:checkout')
+
+        service = BulkUploadService(
+            self.request.user,
+            document_type=form.cleaned_data['document_type'],
+            max_documents=remaining,
+            subscription=subscription,
+        )
+        try:
+            result = service.ingest(form.cleaned_data['files'])
+        except BulkUploadError as e:
+            form.add_error('files', str(e))
+            return self.form_invalid(form)
+
+        messages.success(self.request, f'{len(result.documents)} documentos subidos y en cola de procesamiento.')
+        for name, reason in result.skipped:
+            messages.warning(self.request, f'{name}: {reason}')
+        return redirect('documents:batch_detail', batch_id=result.batch_id)
+
+
+class BatchDetailView(LoginRequiredMixin, TemplateView):
+    """Progreso de un lote de carga masiva"""
+    template_name = 'documents/bulk_upload.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        documents = Document.objects.filter(user=self.request.user, upload_batch=kwargs['batch_id']).order_by('id')
+        if not documents.exists():
+            raise Http404('Lote no encontrado')
+        context['batch_id'] = kwargs['batch_id']
+        context['documents'] = documents
+        return context
+
 
 class DataPreviewView(LoginRequiredMixin, TemplateView):
     template_name = 'documents/data_preview.html'
@@ -217,7 +171,7 @@ class DocumentHistoryView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         return Document.objects.filter(
             user=self.request.user
-        ).order_by('-uploaded_at')
+        ).defer('extracted_data_json', 'extraction_error').order_by('-uploaded_at')
 
 class ProcessDocumentView(LoginRequiredMixin, TemplateView):
     template_name = 'documents/process.html'
@@ -236,25 +190,35 @@ class ProcessDocumentView(LoginRequiredMixin, TemplateView):
 def reprocess_document(request, pk):
     """Reprocesa un documento"""
     try:
-        document = get_object_or_404(Document, id=pk, user=request.user)
-        
-        logger.info(f"Reprocessing document {pk}")
-        
-        # Reiniciar estado
-        document.status = 'processing'
-        document.extraction_error = None
-        document.extracted_data_json = None
-        document.save()
-        
-        # Procesar en segundo plano
-        upload_view = DocumentUploadView()
-        thread = threading.Thread(
-            target=upload_view.process_document_background,
-            args=(document.id,)
-        )
-        thread.daemon = True
-        thread.start()
-        
+        with transaction.atomic():
+            # El bloqueo del documento serializa reprocesos simultáneos (doble clic)
+            document = get_object_or_404(Document.objects.select_for_update(), id=pk, user=request.user)
+
+            # Ya hay una extracción pendiente: se reutiliza en lugar de encolar otra
+            active_job = document.extraction_jobs.filter(status__in=['queued', 'running']).first()
+            if active_job:
+                logger.info(f"Document {pk} already queued (job {active_job.id}); reprocess skipped")
+                return JsonResponse({'status': 'success', 'message': 'El documento ya está en proceso de extracción'})
+
+            logger.info(f"Reprocessing document {pk}")
+
+            # Si la extracción anterior falló, el cupo se había liberado: reservarlo de nuevo
+            if not document.quota_reserved:
+                subscription = getattr(request.user, 'subscription', None)
+                if subscription and not subscription.reserve_documents():
+                    return JsonResponse({'status': 'error', 'message': 'Has alcanzado el límite de documentos de tu plan'})
+                document.quota_reserved = subscription is not None
+
+            # Reiniciar estado
+            document.status = 'processing'
+            document.extraction_error = None
+            document.extracted_data_json = None
+            document.sync_extracted_fields()
+            document.save()
+
+            # Encolar nuevamente la extracción
+            ExtractionQueue().enqueue(document)
+
         return JsonResponse({'status': 'success', 'message': 'Reprocesamiento iniciado'})
     except Exception as e:
         logger.error(f"Error en reprocess_document: {str(e)}")
@@ -265,6 +229,9 @@ def document_status(request, pk):
     """Obtiene el estado actual de un documento"""
     try:
         document = get_object_or_404(Document, id=pk, user=request.user)
+        # Garantiza que haya workers consumiendo la cola tras un reinicio del proceso
+        if document.status in ('pending', 'processing'):
+            ensure_embedded_workers()
         return JsonResponse({
             'status': document.status,
             'processed_at': document.processed_at.isoformat() if document.processed_at else None,
@@ -272,4 +239,122 @@ def document_status(request, pk):
         })
     except Exception as e:
         logger.error(f"Error en document_status: {str(e)}")
-        return JsonResponse({'status': 'error', 'message': str(e)})
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': str(e)})
+
+FEED_FIELDS = ('id', 'name', 'status', 'processed_at', 'extraction_error', 'status_version')
+
+
+def _feed_changes(user, since):
+    """Documentos del usuario con cambios de estado posteriores al cursor (o en proceso, sin cursor)"""
+    documents = Document.objects.filter(user=user)
+    if since is None:
+        documents = documents.filter(status__in=['pending', 'processing'])
+    else:
+        documents = documents.filter(status_version__gt=since)
+    return list(documents.order_by('status_version').values(*FEED_FIELDS))
+
+
+@login_required
+def status_feed(request):
+    """
+    Long-poll con los cambios de estado de todos los documentos del usuario.
+    Responde en cuanto hay cambios posteriores a `since` (versión devuelta en
+    `cursor`), o con una lista vacía al vencer STATUS_FEED_TIMEOUT. Con
+    STATUS_FEED_TIMEOUT=0 responde de inmediato (polling corto). Reemplaza el
+    polling por documento.
+    """
+    since = request.GET.get('since') or None
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Cursor inválido'}, status=400)
+    timeout = getattr(settings, 'STATUS_FEED_TIMEOUT', 25)
+    db_interval = getattr(settings, 'STATUS_FEED_DB_INTERVAL', 10)
+    broker = get_status_broker()
+
+    # La versión se lee antes que los documentos: un cambio posterior queda después del cursor
+    current = StatusFeedVersion.current(request.user.id)
+    token = broker.token(request.user.id)
+    changes = _feed_changes(request.user, since)
+
+    if not changes and since is not None:
+        if timeout <= 0:
+            return JsonResponse({'cursor': since, 'documents': [], 'retry_after': broker.check_interval * 2})
+        if broker.acquire_slot():
+            try:
+                deadline = time.monotonic() + timeout
+                while not changes:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    # Despierta con el aviso del broker; la BD solo se revisa cada db_interval por si acaso
+                    broker.wait(request.user.id, token, min(remaining, db_interval))
+                    token = broker.token(request.user.id)
+                    changes = _feed_changes(request.user, since)
+            finally:
+                broker.release_slot()
+        else:
+            # Demasiadas conexiones retenidas: el cliente reintenta en breve
+            return JsonResponse({'cursor': since, 'documents': [], 'retry_after': broker.check_interval * 2})
+
+    # Sin cursor se parte de la versión actual; sin cambios se conserva el recibido
+    if since is None:
+        cursor = current
+    elif changes:
+        cursor = max(change['status_version'] for change in changes)
+    else:
+        cursor = since
+    if any(change['status'] in ('pending', 'processing') for change in changes):
+        # Garantiza que haya workers consumiendo la cola tras un reinicio del proceso
+        ensure_embedded_workers()
+
+    return JsonResponse({
+        'cursor': cursor,
+        'documents': [
+            {
+                'id': change['id'],
+                'name': change['name'],
+                'status': change['status'],
+                'processed_at': change['processed_at'].isoformat() if change['processed_at'] else None,
+                'error': change['extraction_error'],
+            }
+            for change in changes
+        ],
+    })
+
+@login_required
+def batch_status(request, batch_id):
+    """Estado de cada documento de un lote de carga masiva"""
+    # Cursor para continuar con el feed de estados desde esta consulta
+    cursor = StatusFeedVersion.current(request.user.id)
+    documents = list(
+        Document.objects.filter(user=request.user, upload_batch=batch_id)
+        .order_by('id')
+        .values('id', 'name', 'status', 'extraction_error')
+    )
+    if not documents:
+        return JsonResponse({'status': 'error', 'message': 'Lote no encontrado'}, status=404)
+
+    counts = {}
+    for document in documents:
+        counts[document['status']] = counts.get(document['status'], 0) + 1
+    if counts.get('pending') or counts.get('processing'):
+        ensure_embedded_workers()
+
+    return JsonResponse({
+        'batch_id': batch_id,
+        'cursor': cursor,
+        'total': len(documents),
+        'counts': counts,
+        'finished': not (counts.get('pending') or counts.get('processing')),
+        'documents': [
+            {
+                'id': document['id'],
+                'name': document['name'],
+                'status': document['status'],
+                'error': document['extraction_error'],
+            }
+            for document in documents
+        ],
+    })
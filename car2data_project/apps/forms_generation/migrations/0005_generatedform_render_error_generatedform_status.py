@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forms_generation', '0004_formulariotramite_reg_numero_chasis_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedform',
+            name='render_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='generatedform',
+            name='status',
+            field=models.CharField(choices=[('processing', 'Generando'), ('completed', 'Completado'), ('error', 'Error')], default='completed', max_length=20),
+        ),
+    ]
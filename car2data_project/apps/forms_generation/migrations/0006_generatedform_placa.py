@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:16
+
+import json
+import re
+
+from django.db import migrations, models
+
+
+def backfill_placa(apps, schema_editor):
+    """Guarda la placa de los formularios existentes a partir del JSON extraído"""
+    GeneratedForm = apps.get_model('forms_generation', 'GeneratedForm')
+    forms = GeneratedForm.objects.filter(placa='').select_related('document')
+    updated = []
+    for generated_form in forms.iterator():
+        try:
+            data = json.loads(generated_form.document.extracted_data_json or '{}')
+            raw_placa = str((data.get('informacion_vehiculo') or {}).get('placa') or '')
+        except (ValueError, TypeError, AttributeError):
+            continue
+        if raw_placa.strip() == 'No disponible':
+            continue
+        placa = re.sub(r'[^A-Za-z0-9]', '', raw_placa).upper()[:20]
+        if placa:
+            generated_form.placa = placa
+            updated.append(generated_form)
+    GeneratedForm.objects.bulk_update(updated, ['placa'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forms_generation', '0005_generatedform_render_error_generatedform_status'),
+        ('documents', '0007_document_upload_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedform',
+            name='placa',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(backfill_placa, migrations.RunPython.noop),
+    ]
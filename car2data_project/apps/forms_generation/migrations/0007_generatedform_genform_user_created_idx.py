@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forms_generation', '0006_generatedform_placa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatedform',
+            index=models.Index(fields=['user', '-created_at'], name='genform_user_created_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
+import re
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.text import slugify
 from apps.vehicles.models import Vehiculo, Persona
 from apps.documents.models import Document
 
@@ -11,11 +13,22 @@ class GeneratedForm(models.Model):
         ('formulario_tramite', 'Formulario de Trámite'),
     ]
     
+    STATUS_CHOICES = [
+        ('processing', 'Generando'),
+        ('completed', 'Completado'),
+        ('error', 'Error'),
+    ]
+    
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     document = models.ForeignKey(Document, on_delete=models.CASCADE)
     form_type = models.CharField(max_length=50, choices=FORM_TYPE_CHOICES)
     generated_file = models.FileField(upload_to='generated_forms/', null=True, blank=True)
+    # El PDF se renderiza en el pool de procesos; 'processing' mientras no termina
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
+    render_error = models.TextField(blank=True)
+    # Placa normalizada al generar, para nombrar la descarga sin releer el JSON extraído
+    placa = models.CharField(max_length=20, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -23,25 +36,35 @@ class GeneratedForm(models.Model):
         db_table = 'generated_form'
         verbose_name = 'Formulario Generado'
         verbose_name_plural = 'Formularios Generados'
+        indexes = [
+            # Historial: formularios del usuario en los últimos días, más recientes primero
+            models.Index(fields=['user', '-created_at'], name='genform_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Formulario {self.id} - {self.get_form_type_display()}"
 
+    @staticmethod
+    def placa_from_data(structured_data):
+        """Placa de los datos estructurados: solo letras/números, mayúsculas"""
+        veh = (structured_data or {}).get('vehiculo', {}) or {}
+        return re.sub(r'[^A-Za-z0-9]', '', (veh.get('placa') or '').strip()).upper()[:20]
+
+    def get_download_filename(self):
+        """Nombre de descarga: tipodedocumento_placa.pdf"""
+        tipo_doc = slugify(self.get_form_type_display()) or 'documento'
+        return f"{tipo_doc}_{self.placa or 'sin_placa'}.pdf"
+
     def get_vehicle_display(self):
-        try:
-            data = self.document.get_structured_data()
-            veh = data.get('vehiculo', {}) or {}
-            placa = (veh.get('placa') or '').strip()
-            marca = (veh.get('marca') or '').strip()
-            linea = (veh.get('linea') or '').strip()
-            if placa:
-                return placa
-            label = f"{marca} {linea}".strip()
-            if label:
-                return label
-        except Exception:
-            pass
-        return self.document.name
+        # Usa los campos denormalizados del documento: sin parsear el JSON por fila
+        document = self.document
+        placa = (document.placa or '').strip()
+        if placa:
+            return placa
+        label = f"{document.marca} {document.linea}".strip()
+        if label:
+            return label
+        return document.name
 
 class ContratoCompraventa(models.Model):
     id_contrato = models.AutoField(primary_key=True)
@@ -12,9 +12,15 @@ urlpatterns = [
     # Vista para generar formularios específicos
     path('generate/', views.GenerateFormView.as_view(), name='generate'),
     
+    # API de generación en lote (ZIP o PDF combinado)
+    path('generate/batch/', views.BatchGenerateFormsView.as_view(), name='generate_batch'),
+    
     # Vista de descarga de formularios generados
     path('download/<int:form_id>/', views.DownloadFormView.as_view(), name='download'),
     
+    # Estado del renderizado (la página de descarga lo consulta mientras se genera)
+    path('status/<int:form_id>/', views.GeneratedFormStatusView.as_view(), name='form_status'),
+    
     # Vista para descargar PDF directamente
     path('download-pdf/<int:form_id>/', views.DownloadPDFView.as_view(), name='download_pdf'),
     
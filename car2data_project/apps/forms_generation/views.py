@@ -13,13 +13,15 @@ from django.http import JsonResponse, HttpResponse, Http404
 from django.contrib import messages
 from django.conf import settings
 from django.utils import timezone
-from django.utils.text import slugify
 from .models import GeneratedForm, ContratoMandato, ContratoCompraventa, FormularioTramite
 from .forms import (ContratoMandatoForm, ContratoCompraventaForm, FormularioTramiteForm, 
                    DocumentSelectionForm)
 from apps.documents.models import Document
 from apps.vehicles.models import Vehiculo, Persona
-from services.DocumentGenerator import DocumentGenerator
+from services.file_serving import serve_file
+from services.form_rendering import (BatchFormGenerator, BatchGenerationError, build_payload,
+                                     formulario_tramite_base, get_render_pool, render_generated_form,
+                                     sweep_stale_forms)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -52,6 +54,9 @@ class GenerateFormView(LoginRequiredMixin, TemplateView):
         document_id = self.request.GET.get('document_id')
         form_type = self.request.GET.get('form_type')
         
+        # Mientras el usuario llena el formulario se arrancan los procesos de renderizado
+        get_render_pool().warm_up()
+        
         if not document_id or not form_type:
             messages.error(self.request, 'Parámetros faltantes.')
             return redirect('forms_generation:forms')
@@ -433,70 +438,7 @@ class GenerateFormView(LoginRequiredMixin, TemplateView):
         if form.is_valid():
             try:
                 # 1. Cargar datos extraídos originalmente como base
-                extracted_data = document.get_structured_data()
-                # Preferir 'informacion_vehiculo' (como en data_preview), con fallback a 'vehiculo'
-                extracted_vehiculo = extracted_data.get('informacion_vehiculo') or extracted_data.get('vehiculo', {})
-                extracted_propietario = extracted_data.get('propietario', {})
-                extracted_registro = extracted_data.get('registro', {})
-
-                # Helper para separar nombre completo en apellidos y nombres
-                def split_apellidos_nombres(fullname: str):
-                    try:
-                        if not fullname:
-                            return '', '', ''
-                        parts = str(fullname).strip().split()
-                        if len(parts) >= 3:
-                            return parts[0], parts[1], ' '.join(parts[2:])
-                        if len(parts) == 2:
-                            return parts[0], '', parts[1]
-                        return parts[0], '', ''
-                    except Exception:
-                        return '', '', ''
-
-                ap1, ap2, nombres = split_apellidos_nombres(extracted_propietario.get('nombre'))
-
-                # Normalizador reutilizable
-                def _normalize_value(v):
-                    try:
-                        if v is None:
-                            return ''
-                        s = str(v).strip()
-                        if s.lower() in ['no disponible', 'n/a', 'na', 'none', 'null', 'sin dato']:
-                            return ''
-                        return s
-                    except Exception:
-                        return ''
-
-                base_data = {
-                    'placa': extracted_vehiculo.get('placa'),
-                    'marca': _normalize_value(extracted_vehiculo.get('marca')),
-                    'linea': _normalize_value(extracted_vehiculo.get('linea')),
-                    'color': _normalize_value(extracted_vehiculo.get('color')),
-                    'modelo': _normalize_value(extracted_vehiculo.get('modelo')),
-                    'cilindrada': _normalize_value(extracted_vehiculo.get('cilindrada_cc')),
-                    'capacidad': _normalize_value(extracted_vehiculo.get('capacidad_kg_psj')),
-                    'potencia': _normalize_value(extracted_vehiculo.get('potencia_hp')),
-                    'carroceria': _normalize_value(extracted_vehiculo.get('tipo_carroceria')),
-                    'numero_motor': _normalize_value(extracted_vehiculo.get('numero_motor')),
-                    'reg_numero_motor': _normalize_value(extracted_vehiculo.get('reg_numero_motor')),
-                    'numero_chasis': _normalize_value(extracted_vehiculo.get('numero_chasis')),
-                    'reg_numero_chasis': _normalize_value(extracted_vehiculo.get('reg_numero_chasis')),
-                    'numero_serie': _normalize_value(extracted_vehiculo.get('numero_serie')),
-                    'reg_numero_serie': _normalize_value(extracted_vehiculo.get('reg_numero_serie')),
-                    'numero_vin': _normalize_value(extracted_vehiculo.get('vin')),
-                    'tipo_servicio': _normalize_value(extracted_vehiculo.get('servicio')),
-                    'clase_vehiculo': _normalize_value(extracted_vehiculo.get('clase_vehiculo')),
-                    'combustible': _normalize_value(extracted_vehiculo.get('combustible')),
-                    # Propietario (separado automáticamente)
-                    'propietario_primer_apellido': ap1,
-                    'propietario_segundo_apellido': ap2,
-                    'propietario_nombres': nombres,
-                    'propietario_documento': _normalize_value(extracted_propietario.get('identificacion')),
-
-                    # Datos de importación
-                    'declaracion_importacion': _normalize_value(extracted_registro.get('declaracion_importacion')),
-                    'fecha_importacion': _normalize_value(extracted_registro.get('fecha_importacion')),
-                }
+                base_data = formulario_tramite_base(document.get_structured_data())
 
                 # 2. Combinar con datos del formulario (los datos del form tienen prioridad)
                 # Se filtran los valores None de cleaned_data para no sobreescribir datos existentes con "nada"
@@ -564,79 +506,44 @@ class GenerateFormView(LoginRequiredMixin, TemplateView):
         })
     
     def _generate_pdf_document(self, document, form_type, additional_data=None):
-        """Genera el documento PDF usando el servicio DocumentGenerator"""
+        """
+        Envía el PDF al pool de renderizado y espera hasta PDF_RENDER_TIMEOUT.
+        Retorna el id del GeneratedForm (puede seguir en 'processing') o None si falló.
+        """
         try:
             # Crear directorio si no existe
             os.makedirs(os.path.join(settings.MEDIA_ROOT, 'generated_forms'), exist_ok=True)
             
-            generator = DocumentGenerator()
-            extracted_data = document.get_structured_data()
+            additional_data = additional_data or {}
+            structured_data = document.get_structured_data()
+            if form_type == 'formulario_tramite':
+                # Los datos completos vienen del formulario en additional_data
+                payload = additional_data
+            else:
+                # Los datos adicionales tienen prioridad sobre los extraídos
+                payload = build_payload(form_type, structured_data, additional_data)
             
             # Generar nombre único para el archivo
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"{form_type}_{document.id}_{timestamp}.pdf"
-            file_path = os.path.join(settings.MEDIA_ROOT, 'generated_forms', filename)
             
-            success = False
+            generated_form = GeneratedForm.objects.create(
+                user=document.user,
+                document=document,
+                form_type=form_type,
+                generated_file=f'generated_forms/{filename}',
+                placa=GeneratedForm.placa_from_data(structured_data),
+                status='processing',
+            )
+            status = render_generated_form(generated_form, form_type, payload)
             
-            logger.info(f"Datos extraídos del documento: {extracted_data}")
-            
-            if form_type == 'contrato_mandato':
-                # Combinar los datos extraídos con los datos adicionales del formulario
-                # Los datos adicionales tienen prioridad sobre los extraídos
-                form_data = extracted_data.copy()
-                form_data.update(additional_data)
-                
-                success = generator.generate_contrato_mandato(
-                    form_data,  # Pasar todos los datos combinados
-                    additional_data.get('mandante', {}),
-                    additional_data.get('mandatario', {}),
-                    file_path
-                )
-            elif form_type == 'contrato_compraventa':
-                # Construir payload completo y llamar directamente al PDFFormFiller
-                from services.PdfFormFiller import PDFFormFiller
-                vehiculo = extracted_data.get('vehiculo', {})
-                vendedor = additional_data.get('vendedor', {})
-                comprador = additional_data.get('comprador', {})
-                valor_venta = additional_data.get('valor_venta')
-                forma_pago = additional_data.get('forma_pago')
-                ciudad_contrato = additional_data.get('ciudad_contrato')
-                fecha_contrato = additional_data.get('fecha_contrato')
-                organismo_transito = additional_data.get('organismo_transito') or extracted_data.get('registro', {}).get('organismo_transito')
-
-                form_data = {
-                    'vehiculo': vehiculo,
-                    'vendedor': vendedor,
-                    'comprador': comprador,
-                    'valor_venta': valor_venta,
-                    'forma_pago': forma_pago,
-                    'ciudad_contrato': ciudad_contrato,
-                    'fecha_contrato': fecha_contrato,
-                    'organismo_transito': organismo_transito,
-                }
-
-                filler = PDFFormFiller()
-                success = filler.fill_pdf_form('contrato_compraventa', form_data, file_path)
-            elif form_type == 'formulario_tramite':
-                # Los datos completos vienen del formulario en additional_data
-                logger.info(f"Datos del formulario para PDF: {additional_data}")
-                success = generator.generate_formulario_tramite(additional_data, file_path)
-            
-            if success:
-                # Crear registro del formulario generado
-                generated_form = GeneratedForm.objects.create(
-                    user=document.user,
-                    document=document,
-                    form_type=form_type,
-                    generated_file=f'generated_forms/{filename}'
-                )
-                
-                logger.info(f"Documento PDF generado exitosamente: {file_path}")
-                return generated_form.id
-            else:
-                logger.error(f"Fallo en la generación del PDF: {form_type}")
+            if status == 'error':
+                logger.error(f"Fallo en la generación del PDF: {form_type} ({generated_form.render_error})")
+                generated_form.delete()
                 return None
+            
+            logger.info(f"Documento PDF {form_type} {'generado' if status == 'completed' else 'en proceso'}: {filename}")
+            return generated_form.id
                 
         except Exception as e:
             logger.error(f"Error generando documento PDF: {str(e)}")
@@ -653,7 +560,10 @@ class DownloadFormView(LoginRequiredMixin, TemplateView):
         try:
             generated_form = GeneratedForm.objects.get(id=form_id, user=self.request.user)
             context['generated_form'] = generated_form
-            context['download_url'] = generated_form.generated_file.url if generated_form.generated_file else None
+            context['download_url'] = (
+                generated_form.generated_file.url
+                if generated_form.generated_file and generated_form.status == 'completed' else None
+            )
         except GeneratedForm.DoesNotExist:
             messages.error(self.request, 'Formulario no encontrado.')
             return redirect('forms_generation:forms')
@@ -667,7 +577,7 @@ class DownloadPDFView(LoginRequiredMixin, TemplateView):
         try:
             generated_form = GeneratedForm.objects.get(id=form_id, user=request.user)
             
-            if not generated_form.generated_file:
+            if not generated_form.generated_file or generated_form.status != 'completed':
                 raise Http404("Archivo no encontrado")
             
             file_path = generated_form.generated_file.path
@@ -675,36 +585,13 @@ class DownloadPDFView(LoginRequiredMixin, TemplateView):
             if not os.path.exists(file_path):
                 raise Http404("Archivo no encontrado en el sistema")
             
-            with open(file_path, 'rb') as pdf_file:
-                response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-                # Construir nombre: tipodedocumento_placa.pdf
-                try:
-                    # Tipo de documento legible
-                    tipo_doc = slugify(generated_form.get_form_type_display()) or 'documento'
-                except Exception:
-                    tipo_doc = 'documento'
-
-                # Extraer placa desde los datos estructurados del documento
-                placa = 'sin_placa'
-                try:
-                    data = generated_form.document.get_structured_data()
-                    veh = (data or {}).get('vehiculo', {}) or {}
-                    raw_placa = (veh.get('placa') or '').strip()
-                    if raw_placa:
-                        # Normalizar placa: solo letras/números, mayúsculas
-                        import re
-                        placa_clean = re.sub(r'[^A-Za-z0-9]', '', raw_placa).upper()
-                        if placa_clean:
-                            placa = placa_clean
-                except Exception:
-                    pass
-
-                filename = f"{tipo_doc}_{placa}.pdf"
-                response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                return response
+            # Se entrega en streaming desde disco, con ETag/Range y nombre tipodedocumento_placa.pdf
+            return serve_file(request, file_path, generated_form.get_download_filename(), 'application/pdf')
                 
         except GeneratedForm.DoesNotExist:
             raise Http404("Formulario no encontrado")
+        except Http404:
+            raise
         except Exception as e:
             logger.error(f"Error descargando PDF: {str(e)}")
             messages.error(request, 'Error al descargar el archivo.')
@@ -719,32 +606,18 @@ class FormHistoryView(LoginRequiredMixin, ListView):
     def get_queryset(self):
         # Obtener los últimos 30 días de formularios generados
         thirty_days_ago = timezone.now() - timedelta(days=30)
+        # El documento se trae en el mismo JOIN (sin su JSON) para get_vehicle_display
         return GeneratedForm.objects.filter(
             user=self.request.user,
             created_at__gte=thirty_days_ago
+        ).exclude(status='error').select_related('document').defer(
+            'document__extracted_data_json', 'document__extraction_error'
         ).order_by('-created_at')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['active_tab'] = 'history'
-        
-        # ✅ AGREGAR INFORMACIÓN DE SUSCRIPCIÓN PARA BLOQUEO
-        try:
-            subscription = self.request.user.subscription
-            context['subscription'] = subscription
-            context['documents_used'] = subscription.documents_used
-            context['documents_limit'] = subscription.get_documents_limit()
-            context['documents_remaining'] = subscription.get_remaining_documents()
-            context['can_upload'] = subscription.can_generate_document()
-            context['plan_name'] = subscription.get_plan_display()
-        except:
-            context['subscription'] = None
-            context['documents_used'] = 0
-            context['documents_limit'] = 3
-            context['documents_remaining'] = 3
-            context['can_upload'] = True
-            context['plan_name'] = 'Starter'
-        
+        # La suscripción (para bloquear acciones) la agrega el context processor de authentication
         return context
 
 class DeleteGeneratedFormView(LoginRequiredMixin, View):
@@ -772,6 +645,53 @@ class DeleteGeneratedFormView(LoginRequiredMixin, View):
 
         return redirect('forms_generation:history')
 
+class GeneratedFormStatusView(LoginRequiredMixin, View):
+    """Estado del renderizado de un formulario, consultado desde la página de descarga"""
+
+    def get(self, request, form_id):
+        sweep_stale_forms(GeneratedForm.objects.filter(id=form_id, user=request.user))
+        generated_form = get_object_or_404(GeneratedForm, id=form_id, user=request.user)
+        return JsonResponse({
+            'status': generated_form.status,
+            'error': generated_form.render_error,
+        })
+
+
+class BatchGenerateFormsView(LoginRequiredMixin, View):
+    """
+    API de generación en lote. Recibe JSON:
+    {"output": "zip" | "pdf", "jobs": [{"document_id": 1, "form_type": "contrato_mandato", "data": {...}}]}
+    y responde con un ZIP o un PDF combinado con todos los formularios generados.
+    """
+
+    def post(self, request):
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
+        if not isinstance(body, dict):
+            return JsonResponse({'error': 'El cuerpo debe ser un objeto JSON'}, status=400)
+
+        jobs = body.get('jobs')
+        if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+            return JsonResponse({'error': 'Se requiere una lista de formularios en "jobs"'}, status=400)
+
+        try:
+            result = BatchFormGenerator(request.user).generate(jobs, output=body.get('output', 'zip'))
+        except BatchGenerationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"Error generando lote de formularios: {str(e)}")
+            logger.exception("Detalles del error:")
+            return JsonResponse({'error': 'Error interno del servidor'}, status=500)
+
+        response = HttpResponse(result.content, content_type=result.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{result.filename}"'
+        response['X-Generated-Forms'] = ','.join(str(form.id) for form in result.forms)
+        if result.failed:
+            response['X-Failed-Forms'] = json.dumps(result.failed, ensure_ascii=True)
+        return response
+
 # Vista API para obtener datos de vista previa
 class PreviewDataView(LoginRequiredMixin, TemplateView):
     """Vista para obtener datos de vista previa via AJAX"""
@@ -0,0 +1,10 @@
+"""
+Suite de rendimiento de Car2Data. Se ejecuta con `python manage.py run_benchmarks`;
+cada módulo bench_* expone GROUP y collect(options) -> [Benchmark].
+"""
+
+SUITES = (
+    'benchmarks.bench_forms',
+    'benchmarks.bench_extraction',
+    'benchmarks.bench_views',
+)
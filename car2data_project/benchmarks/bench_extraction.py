@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from django.test.utils import override_settings
+from apps.documents.models import Document
+from .fixtures import EXTRACTED_DATA, StubGeminiServer, gemini_response_text, sample_pdf
+from .runner import Benchmark
+
+GROUP = 'extraccion'
+
+STUB_API_KEY = 'bench-stub-key'
+
+
+def _document_setup():
+    # Mismo formato que guarda Document.set_extracted_data
+    return Document(extracted_data_json=json.dumps(EXTRACTED_DATA, ensure_ascii=False, indent=2))
+
+
+def _structured_cold(document):
+    document.__dict__.pop('_structured_data_cache', None)
+    document.get_structured_data()
+
+
+def _structured_memoized(document):
+    document.get_structured_data()
+
+
+def _bare_extractor():
+    """PDFExtractor sin configurar Gemini: clean_and_parse_json no usa el modelo"""
+    from services.pdf_extractor import PDFExtractor
+
+    return PDFExtractor.__new__(PDFExtractor)
+
+
+def _parse_case(name, text):
+    def setup():
+        return _bare_extractor()
+
+    def run(extractor):
+        extractor.clean_and_parse_json(text)
+
+    return Benchmark(name, run, GROUP, setup)
+
+
+def _stub_setup(latency):
+    def setup():
+        import google.generativeai as genai
+        from services import pdf_extractor
+
+        stub = StubGeminiServer(latency=latency).start()
+        overrides = override_settings(GEMINI_API_KEY=STUB_API_KEY)
+        overrides.enable()
+        try:
+            extractor = pdf_extractor.PDFExtractor()
+            # El constructor configura el SDK con la API real; se redirige al servidor local
+            genai.configure(api_key=STUB_API_KEY, transport='rest', client_options={'api_endpoint': stub.endpoint})
+            extractor.model = genai.GenerativeModel(extractor.model_name)
+            handle, pdf_path = tempfile.mkstemp(prefix='bench_extractor_', suffix='.pdf')
+            with os.fdopen(handle, 'wb') as file:
+                file.write(sample_pdf())
+            data = extractor._analyze_with_vision(pdf_path)
+            if 'error' in data or stub.requests == 0:
+                raise RuntimeError(f'El extractor no llegó al servidor local: {data.get("error", "")}')
+        except Exception:
+            overrides.disable()
+            stub.stop()
+            raise
+        return {'stub': stub, 'overrides': overrides, 'extractor': extractor, 'pdf_path': pdf_path}
+    return setup
+
+
+def _stub_teardown(state):
+    from services import pdf_extractor
+
+    state['stub'].stop()
+    state['overrides'].disable()
+    os.remove(state['pdf_path'])
+    # La próxima instancia real vuelve a configurar el SDK con su API key
+    pdf_extractor._configured_api_key = None
+
+
+def _analyze(state):
+    state['extractor']._analyze_with_vision(state['pdf_path'])
+
+
+def collect(options):
+    latency = options.get('stub_latency', 0.0)
+    return [
+        Benchmark('Document.get_structured_data (sin memo)', _structured_cold, GROUP, _document_setup),
+        Benchmark('Document.get_structured_data (memo)', _structured_memoized, GROUP, _document_setup),
+        _parse_case('clean_and_parse_json (JSON)', gemini_response_text()),
+        _parse_case('clean_and_parse_json (markdown)', gemini_response_text(noise=True)),
+        Benchmark(
+            'PDFExtractor._analyze_with_vision (Gemini local)', _analyze, GROUP,
+            _stub_setup(latency), _stub_teardown,
+        ),
+    ]
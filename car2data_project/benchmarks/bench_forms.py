@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+from apps.documents.models import Document
+from services.form_rendering import build_payload
+from .fixtures import EXTRACTED_DATA, FORM_DATA, FORM_TYPES
+from .runner import Benchmark
+
+GROUP = 'formularios'
+
+# Valores de venta representativos (de motos usadas a vehículos de gama alta)
+SALE_VALUES = [1_250_000 + index * 1_987_345 for index in range(100)]
+
+
+def structured_data():
+    return Document(extracted_data_json=json.dumps(EXTRACTED_DATA, ensure_ascii=False)).get_structured_data()
+
+
+def payloads():
+    extracted = structured_data()
+    return {form_type: build_payload(form_type, extracted, FORM_DATA[form_type]) for form_type in FORM_TYPES}
+
+
+def _fill_case(form_type):
+    def setup():
+        from services.PdfFormFiller import PDFFormFiller
+
+        directory = tempfile.mkdtemp(prefix='bench_forms_')
+        state = {
+            'filler': PDFFormFiller(),
+            'payload': payloads()[form_type],
+            'output': os.path.join(directory, f'{form_type}.pdf'),
+            'directory': directory,
+        }
+        if not state['filler'].fill_pdf_form(form_type, state['payload'], state['output']):
+            raise RuntimeError(f'No se pudo rellenar {form_type}; revise la plantilla en static/pdf_templates')
+        return state
+
+    def run(state):
+        state['filler'].fill_pdf_form(form_type, state['payload'], state['output'])
+
+    return Benchmark(f'fill_pdf_form[{form_type}]', run, GROUP, setup, _remove_directory)
+
+
+def _fallback_case(form_type):
+    def setup():
+        from services.DocumentGenerator import DocumentGenerator
+
+        directory = tempfile.mkdtemp(prefix='bench_fallback_')
+        return {
+            'generator': DocumentGenerator(),
+            'payload': payloads()[form_type],
+            'extracted': structured_data(),
+            'output': os.path.join(directory, f'{form_type}.pdf'),
+            'directory': directory,
+        }
+
+    def run(state):
+        generator, payload, output = state['generator'], state['payload'], state['output']
+        data = FORM_DATA[form_type]
+        if form_type == 'contrato_mandato':
+            ok = generator._generate_contrato_mandato_fallback(
+                payload, payload['mandante'], payload['mandatario'], output
+            )
+        elif form_type == 'contrato_compraventa':
+            ok = generator._generate_contrato_compraventa_fallback(
+                state['extracted'], data['vendedor'], data['comprador'], data['valor_venta'], output
+            )
+        else:
+            ok = generator._generate_formulario_tramite_fallback(payload, output)
+        if not ok:
+            raise RuntimeError(f'La generación de respaldo de {form_type} falló')
+
+    return Benchmark(f'DocumentGenerator fallback[{form_type}]', run, GROUP, setup, _remove_directory)
+
+
+def _remove_directory(state):
+    if state:
+        shutil.rmtree(state['directory'], ignore_errors=True)
+
+
+def _number_to_words_setup():
+    from services.PdfFormFiller import PDFFormFiller
+
+    return PDFFormFiller()
+
+
+def _number_to_words(filler):
+    for value in SALE_VALUES:
+        filler._number_to_words_basic(value)
+
+
+def collect(options):
+    benchmarks = [_fill_case(form_type) for form_type in FORM_TYPES]
+    benchmarks += [_fallback_case(form_type) for form_type in FORM_TYPES]
+    benchmarks.append(Benchmark(
+        f'_number_to_words_basic (x{len(SALE_VALUES)})', _number_to_words, GROUP, _number_to_words_setup,
+    ))
+    return benchmarks
@@ -0,0 +1,135 @@
+import json
+import random
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.test import Client
+from django.utils import timezone
+from apps.documents.models import Document
+from apps.forms_generation.models import GeneratedForm
+from .fixtures import EXTRACTED_DATA, FORM_TYPES, manual_timestamps
+from .runner import Benchmark
+
+GROUP = 'vistas'
+
+BENCH_USER_PREFIX = 'bench_suite_'
+
+# Distribución aproximada de estados en producción
+STATUS_WEIGHTS = (('completed', 90), ('pending', 4), ('processing', 3), ('error', 3))
+
+VIEWS = (
+    ('dashboard', '/dashboard/'),
+    ('historial de documentos', '/dashboard/history/'),
+    ('historial de documentos p.20', '/dashboard/history/?page=20'),
+    ('historial de formularios', '/forms/history/'),
+)
+
+
+def seed(documents=100_000, users=20, forms=2_000, batch_size=5_000, stdout=None):
+    """
+    Siembra (una sola vez) `documents` documentos repartidos entre `users` usuarios.
+    Solo los del usuario medido llevan el JSON extraído completo, que es lo que leen las vistas.
+    """
+    accounts = [
+        User.objects.get_or_create(username=f'{BENCH_USER_PREFIX}{index}')[0]
+        for index in range(max(1, users))
+    ]
+    target = accounts[0]
+    user_ids = [user.id for user in accounts]
+
+    missing = documents - Document.objects.filter(user_id__in=user_ids).count()
+    if missing > 0:
+        if stdout:
+            stdout.write(f'Sembrando {missing} documentos...')
+        _seed_documents(target.id, user_ids, missing, batch_size)
+
+    missing = forms - GeneratedForm.objects.filter(user=target).count()
+    if missing > 0:
+        if stdout:
+            stdout.write(f'Sembrando {missing} formularios generados...')
+        _seed_forms(target, missing, batch_size)
+    return target
+
+
+def _seed_documents(target_id, user_ids, total, batch_size):
+    rng = random.Random(25)
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    payload = json.dumps(EXTRACTED_DATA, ensure_ascii=False, indent=2)
+    vehicle = EXTRACTED_DATA['informacion_vehiculo']
+    now = timezone.now()
+    fields = [Document._meta.get_field(name) for name in ('uploaded_at', 'updated_at')]
+    with manual_timestamps(*fields):
+        for offset in range(0, total, batch_size):
+            batch = []
+            for index in range(min(batch_size, total - offset)):
+                user_id = rng.choice(user_ids)
+                status = rng.choice(statuses)
+                completed = status == 'completed'
+                uploaded_at = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+                batch.append(Document(
+                    user_id=user_id,
+                    name=f'bench_{offset + index}.pdf',
+                    document_type='ownership',
+                    status=status,
+                    uploaded_at=uploaded_at,
+                    updated_at=uploaded_at,
+                    extracted_data_json=payload if completed and user_id == target_id else None,
+                    placa=vehicle['placa'] if completed else '',
+                    marca=vehicle['marca'] if completed else '',
+                    linea=vehicle['linea'] if completed else '',
+                    modelo=vehicle['modelo'] if completed else '',
+                ))
+            Document.objects.bulk_create(batch, batch_size=batch_size)
+
+
+def _seed_forms(user, total, batch_size):
+    rng = random.Random(7)
+    now = timezone.now()
+    document_ids = list(
+        Document.objects.filter(user=user, status='completed').values_list('id', flat=True)[:500]
+    )
+    fields = [GeneratedForm._meta.get_field(name) for name in ('created_at', 'updated_at')]
+    with manual_timestamps(*fields):
+        for offset in range(0, total, batch_size):
+            batch = []
+            for _ in range(min(batch_size, total - offset)):
+                # Dentro de los 30 días que muestra el historial
+                created_at = now - timedelta(minutes=rng.randrange(30 * 24 * 60))
+                batch.append(GeneratedForm(
+                    user=user,
+                    document_id=rng.choice(document_ids),
+                    form_type=rng.choice(FORM_TYPES),
+                    status='completed',
+                    placa=EXTRACTED_DATA['informacion_vehiculo']['placa'],
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            GeneratedForm.objects.bulk_create(batch, batch_size=batch_size)
+
+
+def cleanup():
+    deleted, _ = User.objects.filter(username__startswith=BENCH_USER_PREFIX).delete()
+    return deleted
+
+
+def _view_case(name, url, options):
+    def setup():
+        target = seed(
+            documents=options.get('documents', 100_000),
+            users=options.get('users', 20),
+            stdout=options.get('stdout'),
+        )
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(target)
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url} respondió {response.status_code}')
+        return client
+
+    def run(client):
+        client.get(url)
+
+    return Benchmark(f'vista: {name}', run, GROUP, setup)
+
+
+def collect(options):
+    return [_view_case(name, url, options) for name, url in VIEWS]
@@ -0,0 +1,216 @@
+import io
+import os
+import re
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Respuesta típica de Gemini para una tarjeta de propiedad (formato de extracted_data_json)
+EXTRACTED_DATA = {
+    'tipo_documento': 'Tarjeta de Propiedad',
+    'informacion_vehiculo': {
+        'placa': 'KLM482',
+        'marca': 'CHEVROLET',
+        'linea': 'SAIL LT',
+        'modelo': '2019',
+        'cilindrada_cc': '1399',
+        'color': 'BLANCO GALAXIA',
+        'clase_vehiculo': 'AUTOMOVIL',
+        'tipo_carroceria': 'SEDAN',
+        'numero_motor': 'LCU180920451',
+        'reg_numero_motor': 'N',
+        'servicio': 'PARTICULAR',
+        'combustible': 'GASOLINA',
+        'capacidad_kg_psj': '5',
+        'vin': '9GASA58M1KB012345',
+        'numero_serie': '9GASA58M1KB012345',
+        'reg_numero_serie': 'N',
+        'numero_chasis': '9GASA58M1KB012345',
+        'reg_numero_chasis': 'N',
+        'potencia_hp': '102',
+        'puertas': '4',
+    },
+    'informacion_propietario': {
+        'nombre': 'RODRIGUEZ GOMEZ CARLOS ANDRES',
+        'identificacion': '1.020.345.678',
+        'direccion': 'CALLE 45 # 12-34 APTO 502',
+        'telefono': '3104567890',
+        'ciudad': 'BOGOTA D.C.',
+    },
+    'detalles_registro': {
+        'licencia_transito_numero': '10012345678',
+        'declaracion_importacion': '482019000123456',
+        'fecha_importacion': '15/03/2019',
+        'fecha_matricula': '02/05/2019',
+        'fecha_expedicion_licencia': '02/05/2019',
+        'organismo_transito': 'SECRETARIA DISTRITAL DE MOVILIDAD BOGOTA',
+    },
+    'restricciones_limitaciones': {
+        'restriccion_movilidad': 'No disponible',
+        'blindaje': 'NO',
+        'limitacion_propiedad': 'PRENDA BANCO DE BOGOTA',
+    },
+}
+
+PERSONA_VENDEDOR = {
+    'nombre': 'CARLOS ANDRES RODRIGUEZ GOMEZ',
+    'documento': '1020345678',
+    'ciudad': 'BOGOTA',
+    'direccion': 'CALLE 45 # 12-34',
+    'telefono': '3104567890',
+}
+
+PERSONA_COMPRADOR = {
+    'nombre': 'MARIA FERNANDA LOPEZ DIAZ',
+    'documento': '52987654',
+    'ciudad': 'MEDELLIN',
+    'direccion': 'CARRERA 70 # 44-21',
+    'telefono': '3001234567',
+}
+
+# Datos que el usuario completa en cada formulario
+FORM_DATA = {
+    'contrato_compraventa': {
+        'vendedor': PERSONA_VENDEDOR,
+        'comprador': PERSONA_COMPRADOR,
+        'valor_venta': 48_750_000,
+        'forma_pago': 'Transferencia bancaria',
+        'ciudad_contrato': 'BOGOTA',
+        'fecha_contrato': '2024-06-14',
+    },
+    'contrato_mandato': {
+        'mandante': PERSONA_VENDEDOR,
+        'mandatario': PERSONA_COMPRADOR,
+        'tramites_autorizados': 'Traspaso de propiedad y levantamiento de prenda',
+        'ciudad_contrato': 'BOGOTA',
+        'fecha_contrato': '2024-06-14',
+    },
+    'formulario_tramite': {
+        'tramite': 'traspaso',
+        'comprador_primer_apellido': 'LOPEZ',
+        'comprador_segundo_apellido': 'DIAZ',
+        'comprador_nombres': 'MARIA FERNANDA',
+        'comprador_documento': '52987654',
+    },
+}
+
+FORM_TYPES = ('contrato_compraventa', 'contrato_mandato', 'formulario_tramite')
+
+
+def gemini_response_text(data=EXTRACTED_DATA, noise=False):
+    """Texto de respuesta; con noise imita las respuestas en markdown que limpia clean_and_parse_json"""
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    if noise:
+        return f"Claro, aquí está la información extraída:\n```json\n{text}\n```\nAvísame si necesitas algo más."
+    return text
+
+
+def sample_pdf():
+    """PDF de una página con el texto de una tarjeta de propiedad"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=letter)
+    pdf.setFont('Helvetica-Bold', 14)
+    pdf.drawString(72, 740, 'LICENCIA DE TRÁNSITO - TARJETA DE PROPIEDAD')
+    pdf.setFont('Helvetica', 10)
+    y = 710
+    for section in ('informacion_vehiculo', 'informacion_propietario', 'detalles_registro'):
+        for key, value in EXTRACTED_DATA[section].items():
+            pdf.drawString(72, y, f"{key.replace('_', ' ').upper()}: {value}")
+            y -= 14
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+class StubGeminiServer:
+    """
+    Servidor HTTP local que responde como generateContent de Gemini (transporte REST),
+    para medir el extractor con la serialización y el HTTP reales sin usar la API.
+    """
+
+    def __init__(self, response_text=None, latency=0.0):
+        self.response_text = response_text or gemini_response_text()
+        self.latency = latency
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def start(self):
+        stub = self
+        body = json.dumps({
+            'candidates': [{
+                'content': {'parts': [{'text': self.response_text}], 'role': 'model'},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+            'usageMetadata': {'promptTokenCount': 1290, 'candidatesTokenCount': 610, 'totalTokenCount': 1900},
+        }).encode('utf-8')
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.requests += 1
+                if stub.latency:
+                    threading.Event().wait(stub.latency)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+@contextmanager
+def manual_timestamps(*fields):
+    """Permite asignar fechas en bulk_create a campos con auto_now_add/auto_now"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def check_benchmark_database(confirmed=False, connection=None):
+    """
+    Los benchmarks siembran cientos de miles de filas (y benchmark_listings quita índices):
+    solo se permiten con DEBUG, en una base cuyo nombre indique que es de pruebas o con
+    confirmación explícita (--i-know). Lanza CommandError en otro caso.
+    """
+    from django.conf import settings
+    from django.core.management.base import CommandError
+    from django.db import connection as default_connection
+
+    name = str((connection or default_connection).settings_dict.get('NAME') or '')
+    if confirmed or settings.DEBUG or re.search(r'bench|test', os.path.basename(name), re.IGNORECASE):
+        return
+    raise CommandError(
+        f"La base '{name}' no parece de pruebas y DEBUG está desactivado. Use una base cuyo nombre "
+        "contenga 'bench' o confirme con --i-know que puede sembrar datos y modificar índices en ella."
+    )
@@ -0,0 +1,133 @@
+import gc
+import json
+import math
+import time
+import platform
+import tracemalloc
+from datetime import datetime, timezone
+
+import django
+
+RESULTS_FORMAT = 1
+
+
+class Benchmark:
+    """
+    Un caso medido. `func(state)` es la operación; `setup()` prepara el estado
+    (fuera de la medición) y `teardown(state)` lo libera.
+    """
+
+    def __init__(self, name, func, group='', setup=None, teardown=None):
+        self.name = name
+        self.func = func
+        self.group = group
+        self.setup = setup
+        self.teardown = teardown
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def measure(benchmark, min_time=1.0, min_iterations=5, max_iterations=10_000, warmup=1):
+    """
+    Ejecuta el caso hasta cumplir `min_time` segundos y `min_iterations`. La
+    memoria pico se mide aparte, en una iteración bajo tracemalloc, para no
+    inflar las latencias.
+    """
+    state = benchmark.setup() if benchmark.setup else None
+    try:
+        for _ in range(warmup):
+            benchmark.func(state)
+
+        timings = []
+        gc.collect()
+        deadline = time.perf_counter() + min_time
+        while len(timings) < max_iterations and (len(timings) < min_iterations or time.perf_counter() < deadline):
+            started = time.perf_counter()
+            benchmark.func(state)
+            timings.append(time.perf_counter() - started)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            benchmark.func(state)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if benchmark.teardown:
+            benchmark.teardown(state)
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        'group': benchmark.group,
+        'iterations': len(timings),
+        'ops_per_sec': len(timings) / total if total else 0.0,
+        'mean_ms': total / len(timings) * 1000,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'peak_memory_bytes': peak,
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
+
+
+def build_report(results):
+    return {
+        'format': RESULTS_FORMAT,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'results': results,
+    }
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+        file.write('\n')
+
+
+def compare(results, baseline_results, threshold=0.10):
+    """
+    Compara contra la línea base. Es regresión si ops/s baja, o p95 o la memoria
+    pico suben, más que `threshold` (fracción). Retorna {nombre: comparación}.
+    """
+    comparison = {}
+    for name, current in results.items():
+        base = baseline_results.get(name)
+        if not base:
+            continue
+        changes = {
+            'ops_per_sec': _ratio(current['ops_per_sec'], base['ops_per_sec']),
+            'p95_ms': _ratio(current['p95_ms'], base['p95_ms']),
+            'peak_memory_bytes': _ratio(current['peak_memory_bytes'], base['peak_memory_bytes']),
+        }
+        regressions = []
+        if changes['ops_per_sec'] is not None and changes['ops_per_sec'] < 1 - threshold:
+            regressions.append('ops_per_sec')
+        if changes['p95_ms'] is not None and changes['p95_ms'] > 1 + threshold:
+            regressions.append('p95_ms')
+        if changes['peak_memory_bytes'] is not None and changes['peak_memory_bytes'] > 1 + threshold:
+            regressions.append('peak_memory_bytes')
+        comparison[name] = {'changes': changes, 'regressions': regressions}
+    return comparison
+
+
+def _ratio(current, base):
+    return current / base if base else None
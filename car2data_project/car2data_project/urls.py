@@ -13,6 +13,7 @@ urlpatterns = [
     path('dashboard/', include('apps.documents.urls')),
     path('vehicles/', include('apps.vehicles.urls')),
     path('forms/', include('apps.forms_generation.urls')),
+    path('', include('apps.administration.urls')),
     # Social auth routes (allauth) - MUST be before general allauth.urls
     path('accounts/', include('allauth.urls')),
 ]
@@ -0,0 +1,27 @@
+"""
+Configuración de gunicorn para producción:
+
+    gunicorn -c gunicorn.conf.py car2data_project.wsgi:application
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', '3'))
+
+# El feed de estados (long-poll) retiene la petición hasta STATUS_FEED_TIMEOUT: con workers
+# síncronos cada espera bloquearía un proceso completo. Con gthread solo ocupa un hilo y
+# STATUS_FEED_MAX_WAITERS debe quedar por debajo de GUNICORN_THREADS.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+
+
+def child_exit(server, worker):
+    """Descarta los valores de Prometheus del worker que terminó (modo multiproceso)"""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
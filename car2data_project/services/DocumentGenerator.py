@@ -14,6 +14,7 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.units import inch
 from .PdfFormFiller import PDFFormFiller  # Nota: El nombre del archivo es case-sensitive
+from .form_rendering import contrato_mandato_payload
 import logging
 
 logger = logging.getLogger(__name__)
@@ -90,37 +91,7 @@ class DocumentGenerator:
 
         try:
             # Preparar datos para el relleno del formulario
-            form_data = {
-                'vehiculo': extracted_data.get('vehiculo', {}),
-                'mandante': {
-                    'nombre': mandante_data.get('nombre', ''),
-                    'documento': mandante_data.get('documento', ''),
-                    'ciudad': mandante_data.get('ciudad', ''),
-                    'direccion': mandante_data.get('direccion', ''),
-                    'telefono': mandante_data.get('telefono', '')
-                },
-                'mandatario': {
-                    'nombre': mandatario_data.get('nombre', ''),
-                    'documento': mandatario_data.get('documento', ''),
-                    'ciudad': mandatario_data.get('ciudad', ''),
-                    'direccion': mandatario_data.get('direccion', ''),
-                    'telefono': mandatario_data.get('telefono', '')
-                },
-                # Incluir todos los datos adicionales del formulario
-                'tramites_autorizados': extracted_data.get('tramites_autorizados', ''),
-                'organismo_transito': extracted_data.get('organismo_transito', ''),
-                'ciudad_contrato': extracted_data.get('ciudad_contrato', ''),
-                'fecha_contrato': extracted_data.get('fecha_contrato', '')
-            }
-            
-            # Asegurarse de que los datos del vehículo estén en el nivel superior para compatibilidad
-            if 'vehiculo' in extracted_data and extracted_data['vehiculo']:
-                form_data.update({
-                    'placa': extracted_data['vehiculo'].get('placa', ''),
-                    'marca': extracted_data['vehiculo'].get('marca', ''),
-                    'linea': extracted_data['vehiculo'].get('linea', ''),
-                    'modelo': extracted_data['vehiculo'].get('modelo', '')
-                })
+            form_data = contrato_mandato_payload(extracted_data, mandante_data, mandatario_data)
             
             # Intentar usar plantilla PDF oficial primero
             success = self.pdf_form_filler.fill_pdf_form('contrato_mandato', form_data, document_path)
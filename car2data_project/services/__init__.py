@@ -4,8 +4,9 @@
 Módulo de servicios para Car2Data
 Contiene servicios auxiliares como:
 - PDFExtractor: Extracción de datos de PDFs usando Gemini AI
+- get_extractor: Extractor compartido por proceso para cada modelo de Gemini
 """
 
-from .pdf_extractor import PDFExtractor
+from .pdf_extractor import PDFExtractor, get_extractor, reload_extractors
 
-__all__ = ['PDFExtractor']
\ No newline at end of file
+__all__ = ['PDFExtractor', 'get_extractor', 'reload_extractors']
\ No newline at end of file
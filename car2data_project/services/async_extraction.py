@@ -0,0 +1,240 @@
+import time
+import random
+import asyncio
+import logging
+from django.conf import settings
+from .metrics import get_metrics
+from .pdf_extractor import get_extractor, subset_schema
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Limitador de tasa tipo token bucket para respetar la cuota de Gemini"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, int(rate_per_minute / 60.0 * 10))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Espera hasta que haya un token disponible y lo consume"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ExtractionOutcome:
+    """Resultado de extraer un PDF dentro de un lote"""
+
+    def __init__(self, pdf_path, data=None, from_cache=False):
+        self.pdf_path = pdf_path
+        self.data = data
+        self.from_cache = from_cache
+        self.error = ''
+        self.retries = 0
+        self.transient = False
+        self.original_bytes = 0
+        self.payload_bytes = 0
+
+    @property
+    def ok(self):
+        return self.data is not None and not self.error
+
+
+class BatchStats:
+    """Totales de un lote de extracción"""
+
+    def __init__(self, total=0):
+        self.total = total
+        self.succeeded = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.rate_limited_retries = 0
+        self.original_bytes = 0
+        self.payload_bytes = 0
+        self.elapsed = 0.0
+        self.outcomes = []
+
+    @property
+    def throughput(self):
+        """Documentos por segundo"""
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+
+class AsyncExtractionEngine:
+    """
+    Motor de extracción por lotes sobre la API asíncrona de Gemini.
+    Limita las llamadas simultáneas con un semáforo, reparte la cuota con un
+    token bucket y reintenta los 429 con backoff exponencial.
+    La caché de extracción se consulta y actualiza fuera del event loop.
+    """
+
+    def __init__(self, concurrency=None, requests_per_minute=None, max_retries=None, extractor=None):
+        self.concurrency = concurrency or getattr(settings, 'GEMINI_ASYNC_CONCURRENCY', 8)
+        self.requests_per_minute = requests_per_minute or getattr(settings, 'GEMINI_REQUESTS_PER_MINUTE', 60)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'GEMINI_MAX_RETRIES', 5)
+        self.retry_base_seconds = getattr(settings, 'GEMINI_RETRY_BASE_SECONDS', 2)
+        self.extractor = extractor or get_extractor()
+
+    def run(self, pdf_paths):
+        """Extrae todos los PDFs y retorna las estadísticas del lote (con un resultado por ruta)"""
+        started = time.monotonic()
+        stats = BatchStats(total=len(pdf_paths))
+        outcomes = {}
+        pending = []
+
+        plans = {}
+        cache_keys = {}
+        for pdf_path in pdf_paths:
+            # Cada PDF se hashea una sola vez: la misma clave sirve para consultar y guardar
+            cache_keys[pdf_path] = self.extractor.cache_key_for(pdf_path)
+            cached = self.extractor.get_cached_result(pdf_path, cache_keys[pdf_path])
+            if cached is not None:
+                outcomes[pdf_path] = ExtractionOutcome(pdf_path, data=cached, from_cache=True)
+                continue
+            # Pasada local: Gemini solo recibe los campos que falten
+            local, requested = self.extractor.plan_extraction(pdf_path)
+            plans[pdf_path] = local
+            if requested is None:
+                outcomes[pdf_path] = ExtractionOutcome(pdf_path, data=self.extractor.merge_results(local))
+                self._store_in_cache(outcomes[pdf_path], cache_keys[pdf_path])
+            else:
+                pending.append((pdf_path, requested))
+
+        if pending:
+            for outcome in asyncio.run(self._extract_all(pending)):
+                outcomes[outcome.pdf_path] = outcome
+                if outcome.ok:
+                    outcome.data = self.extractor.merge_results(plans[outcome.pdf_path], outcome.data)
+                    self._store_in_cache(outcome, cache_keys[outcome.pdf_path])
+
+        stats.outcomes = [outcomes[pdf_path] for pdf_path in pdf_paths]
+        for outcome in stats.outcomes:
+            stats.succeeded += outcome.ok
+            stats.failed += not outcome.ok
+            stats.cache_hits += outcome.from_cache
+            stats.rate_limited_retries += outcome.retries
+            stats.original_bytes += outcome.original_bytes
+            stats.payload_bytes += outcome.payload_bytes
+        stats.elapsed = time.monotonic() - started
+        return stats
+
+    async def _extract_all(self, pending):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.requests_per_minute)
+        return await asyncio.gather(
+            *(self._extract_one(pdf_path, requested, semaphore, bucket) for pdf_path, requested in pending)
+        )
+
+    async def _extract_one(self, pdf_path, requested, semaphore, bucket):
+        outcome = ExtractionOutcome(pdf_path)
+        breaker = self.extractor.breaker
+
+        # El archivo se lee dentro del semáforo: como máximo `concurrency` PDFs en memoria
+        async with semaphore:
+            try:
+                # Lectura y rasterización usan E/S y CPU: se hacen fuera del event loop
+                prepared = await asyncio.to_thread(self.extractor.prepare_content, pdf_path, requested)
+            except OSError as e:
+                outcome.error = f"No se pudo leer el archivo: {str(e)}"
+                return outcome
+            except Exception as e:
+                # p. ej. fallo al subir con la File API
+                outcome.error = f"No se pudo preparar el contenido: {str(e)}"
+                outcome.transient = True
+                return outcome
+            outcome.original_bytes = prepared.original_bytes
+            outcome.payload_bytes = prepared.payload_bytes
+            try:
+                config = self.extractor.generation_config_for(requested)
+                response = await self._generate(prepared.content, outcome, breaker, bucket, config)
+                if response is None:
+                    return outcome
+                if not (response and response.text):
+                    outcome.error = "Sin respuesta de Vision"
+                    return outcome
+                data = self.extractor.parse_response(response.text)
+                await self._reask_invalid(data, requested, prepared, outcome, breaker, bucket)
+            finally:
+                await asyncio.to_thread(self.extractor.release_content, prepared)
+
+        if not data:
+            outcome.error = "No se encontró JSON válido en la respuesta"
+            return outcome
+        outcome.data = self.extractor.sanitize(data, requested)
+        return outcome
+
+    async def _reask_invalid(self, data, requested, prepared, outcome, breaker, bucket):
+        """Vuelve a pedir solo los campos faltantes o inválidos reutilizando el payload ya preparado"""
+        for _ in range(self.extractor.reask_attempts):
+            invalid = self.extractor.find_invalid_fields(data, requested)
+            if not invalid:
+                return
+            subset = subset_schema(requested, invalid)
+            retry = await self._generate(
+                [self.extractor.prompt_for(subset), prepared.content[1]],
+                outcome, breaker, bucket, self.extractor.generation_config_for(subset),
+            )
+            if retry is None:
+                # La re-consulta es opcional: se conserva la primera respuesta
+                outcome.error = ''
+                outcome.transient = False
+                return
+            if retry.text:
+                self.extractor.merge_response(data, self.extractor.parse_response(retry.text), invalid)
+
+    async def _generate(self, content, outcome, breaker, bucket, generation_config=None):
+        """Llama a Gemini con reintentos ante 429; retorna None si no hay respuesta"""
+        while True:
+            if not breaker.allow_request():
+                outcome.error = "Circuit breaker de Gemini abierto"
+                outcome.transient = True
+                return None
+
+            await bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = await self.extractor.model.generate_content_async(
+                    content, generation_config=generation_config
+                )
+            except Exception as e:
+                rate_limited = self.extractor._is_rate_limited(e)
+                get_metrics().observe_gemini(
+                    self.extractor.model_name, time.perf_counter() - started,
+                    'rate_limited' if rate_limited else 'error',
+                )
+                breaker.record_failure(rate_limited=rate_limited)
+                if rate_limited and outcome.retries < self.max_retries:
+                    delay = self.retry_base_seconds * (2 ** outcome.retries)
+                    delay += random.uniform(0, delay * 0.1)
+                    outcome.retries += 1
+                    logger.warning(f"429 de Gemini para {outcome.pdf_path}; reintento {outcome.retries} en {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+                outcome.error = f"Error en Vision: {str(e)}"
+                outcome.transient = True
+                return None
+
+            get_metrics().observe_gemini(self.extractor.model_name, time.perf_counter() - started)
+            breaker.record_success()
+            return response
+
+    def _store_in_cache(self, outcome, cache_key):
+        content_hash, key = cache_key
+        if not key:
+            return
+        try:
+            self.extractor.cache.set(
+                key, content_hash, self.extractor.model_name, self.extractor.PROMPT_VERSION, outcome.data
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en la caché de extracción: {str(e)}")
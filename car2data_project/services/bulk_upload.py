@@ -0,0 +1,154 @@
+import os
+import zlib
+import uuid
+import shutil
+import logging
+import zipfile
+import tempfile
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .extraction_queue import ExtractionQueue
+
+logger = logging.getLogger(__name__)
+
+
+class BulkUploadError(Exception):
+    """El lote no se puede procesar (archivo inválido o sin PDFs)"""
+
+
+class BulkUploadResult:
+    """Documentos creados y archivos descartados de un lote"""
+
+    def __init__(self, batch_id):
+        self.batch_id = batch_id
+        self.documents = []
+        self.skipped = []
+
+
+class BulkUploadService:
+    """
+    Ingesta de varias tarjetas de propiedad en una sola petición (ZIP o varios PDFs).
+    Cada PDF se copia a la storage por bloques, sin cargar el ZIP completo en memoria;
+    luego se crean los Document con bulk_create y se encolan en una sola transacción.
+    Los miembros de un ZIP se descomprimen primero a un archivo temporal para verificar
+    su CRC: un miembro dañado se descarta sin dejar archivos a medias en la storage.
+    """
+
+    UPLOAD_DIR = 'uploads/pdfs/'
+    # Los miembros más pequeños se verifican en memoria; los demás, en disco
+    SPOOL_MAX_MEMORY = 1024 * 1024
+
+    def __init__(self, user, document_type='ownership', max_documents=None, subscription=None):
+        self.user = user
+        # Si se indica, cada documento creado reserva cupo de la suscripción
+        self.subscription = subscription
+        self.document_type = document_type
+        self.max_files = getattr(settings, 'BULK_UPLOAD_MAX_FILES', 50)
+        self.max_file_size = getattr(settings, 'BULK_UPLOAD_MAX_FILE_SIZE', 10 * 1024 * 1024)
+        self.max_documents = self.max_files if max_documents is None else min(max_documents, self.max_files)
+
+    def ingest(self, uploaded_files):
+        """Guarda los PDFs recibidos, crea los documentos y los encola para extracción"""
+        from apps.documents.models import Document
+
+        result = BulkUploadResult(uuid.uuid4().hex)
+        stored = []
+
+        for name, stream, size in self._iter_pdfs(uploaded_files, result):
+            if len(stored) >= self.max_documents:
+                result.skipped.append((name, 'Límite de documentos del plan alcanzado'))
+                continue
+            if size > self.max_file_size:
+                result.skipped.append((name, 'El archivo supera el tamaño máximo permitido'))
+                continue
+            path = default_storage.save(self.UPLOAD_DIR + os.path.basename(name), File(stream, name=name))
+            stored.append((name, path))
+
+        if not stored:
+            raise BulkUploadError('No se encontró ningún PDF válido para procesar')
+
+        reserved = 0
+        if self.subscription is not None:
+            reserved = self.subscription.reserve_documents(len(stored), partial=True)
+            # Otra carga simultánea pudo tomar parte del cupo
+            for name, path in stored[reserved:]:
+                default_storage.delete(path)
+                result.skipped.append((name, 'Límite de documentos del plan alcanzado'))
+            stored = stored[:reserved]
+            if not stored:
+                raise BulkUploadError('Has alcanzado el límite de documentos de tu plan')
+
+        documents = [
+            Document(
+                user=self.user,
+                name=os.path.splitext(os.path.basename(name))[0][:255],
+                document_type=self.document_type,
+                file=path,
+                upload_batch=result.batch_id,
+                quota_reserved=reserved > 0,
+            )
+            for name, path in stored
+        ]
+        try:
+            with transaction.atomic():
+                result.documents = Document.objects.bulk_create(documents)
+                ExtractionQueue().enqueue_many(result.documents)
+        except Exception:
+            # Sin filas que los referencien, los archivos guardados quedarían huérfanos
+            for _, path in stored:
+                default_storage.delete(path)
+            if reserved:
+                self.subscription.release_documents(reserved)
+            raise
+
+        logger.info(
+            f"Lote {result.batch_id}: {len(result.documents)} documentos creados, "
+            f"{len(result.skipped)} descartados (usuario {self.user.id})"
+        )
+        return result
+
+    def _iter_pdfs(self, uploaded_files, result):
+        """Genera (nombre, stream, tamaño) por cada PDF, abriendo los ZIP miembro a miembro"""
+        for uploaded in uploaded_files:
+            lower_name = uploaded.name.lower()
+            if lower_name.endswith('.pdf'):
+                yield uploaded.name, uploaded, uploaded.size
+            elif lower_name.endswith('.zip'):
+                yield from self._iter_zip(uploaded, result)
+            else:
+                result.skipped.append((uploaded.name, 'Solo se aceptan archivos PDF o ZIP'))
+
+    def _iter_zip(self, uploaded, result):
+        try:
+            archive = zipfile.ZipFile(uploaded)
+        except zipfile.BadZipFile:
+            result.skipped.append((uploaded.name, 'El archivo ZIP está dañado'))
+            return
+
+        with archive:
+            for info in archive.infolist():
+                name = info.filename
+                base_name = os.path.basename(name)
+                if info.is_dir() or name.startswith('__MACOSX/') or base_name.startswith('.'):
+                    continue
+                if not base_name.lower().endswith('.pdf'):
+                    result.skipped.append((name, 'Solo se aceptan archivos PDF'))
+                    continue
+                # file_size es el tamaño descomprimido declarado; protege contra ZIP bombs
+                if info.file_size > self.max_file_size:
+                    result.skipped.append((name, 'El archivo supera el tamaño máximo permitido'))
+                    continue
+                spool = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_MEMORY)
+                try:
+                    with archive.open(info) as member:
+                        shutil.copyfileobj(member, spool)
+                except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                    spool.close()
+                    logger.warning(f"Miembro dañado en {uploaded.name}: {name} ({str(e)})")
+                    result.skipped.append((name, 'El archivo está dañado dentro del ZIP'))
+                    continue
+                with spool:
+                    spool.seek(0)
+                    yield base_name, spool, info.file_size
@@ -0,0 +1,144 @@
+import os
+import logging
+from django.utils import timezone
+from .metrics import stage, trace_document
+from .pdf_extractor import get_extractor
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionUnavailableError(Exception):
+    """El servicio de IA no está disponible en este momento; el trabajo puede reintentarse"""
+
+
+class CircuitOpenError(ExtractionUnavailableError):
+    """El circuit breaker rechazó la llamada sin consultar a Gemini; no cuenta como intento"""
+
+    def __init__(self, message, retry_after=0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DocumentProcessor:
+    """
+    Ejecuta la extracción de datos de un documento ya guardado.
+    Es invocado por los workers de la cola de extracción.
+    """
+
+    UNAVAILABLE_MESSAGE = (
+        "El servicio de IA no está disponible en este momento (cuota, conectividad o modelo no soportado). "
+        "Inténtalo de nuevo más tarde o verifica la configuración."
+    )
+
+    DOC_TYPE_MAPPING = {
+        'matrícula': 'registration',
+        'matricula': 'registration',
+        'registro': 'registration',
+        'propiedad': 'ownership',
+        'tarjeta': 'ownership'
+    }
+
+    def process(self, document):
+        """
+        Procesa el documento. Lanza ExtractionUnavailableError o cualquier otra
+        excepción para que la cola decida si reintentar; FileNotFoundError es definitivo.
+        """
+        with trace_document(document), stage('process'):
+            self._process(document)
+
+    def _process(self, document):
+        logger.info(f"Iniciando procesamiento del documento {document.id}")
+
+        document.status = 'processing'
+        document.save(update_fields=['status'])
+
+        # Verificar que el archivo existe
+        if not document.file or not os.path.exists(document.file.path):
+            raise FileNotFoundError(f"No se pudo encontrar el archivo: {document.file.path if document.file else 'No especificado'}")
+
+        pdf_path = document.file.path
+        logger.info(f"Ruta del PDF: {pdf_path}")
+
+        extractor = get_extractor()
+
+        # Un PDF ya analizado se resuelve desde la caché sin llamar a Gemini
+        with stage('cache_lookup', extractor.model_name, os.path.getsize(pdf_path)):
+            cache_key = extractor.cache_key_for(pdf_path)
+            extracted_data = extractor.get_cached_result(pdf_path, cache_key)
+        if extracted_data is not None:
+            logger.info(f"Documento {document.id} resuelto desde la caché de extracción")
+        else:
+            # El circuit breaker evita llamar a Gemini mientras esté fallando
+            if not extractor.breaker.allow_request():
+                logger.warning("Circuit breaker de Gemini abierto. Se reintentará el documento más tarde.")
+                raise CircuitOpenError(self.UNAVAILABLE_MESSAGE, extractor.breaker.retry_after())
+
+            try:
+                with stage('extract', extractor.model_name):
+                    # La caché ya se consultó: se reutiliza la clave sin volver a leer el PDF
+                    extracted_data = extractor.extract_vehicle_info(pdf_path, cache_key=cache_key)
+            finally:
+                # Si se resolvió sin Gemini (caché o pasada local) la prueba half-open queda libre
+                extractor.breaker.release_probe()
+            if extractor.last_call_failed:
+                logger.warning("La llamada a Gemini falló. Se reintentará el documento más tarde.")
+                raise ExtractionUnavailableError(self.UNAVAILABLE_MESSAGE)
+        logger.info(f"Datos extraídos: {extracted_data}")
+        self.apply_result(document, extracted_data)
+
+    def apply_result(self, document, extracted_data):
+        """Guarda el resultado de la extracción, completa el documento y descuenta la cuota"""
+        with trace_document(document):
+            with stage('save_result'):
+                self._save_result(document, extracted_data)
+            with stage('quota_update'):
+                self._update_quota(document)
+
+    def _save_result(self, document, extracted_data):
+        # Guardar los datos extraídos
+        document.set_extracted_data(extracted_data)
+
+        # Actualizar el tipo de documento si se identificó
+        doc_type = (extracted_data.get('tipo_documento') or '').lower()
+        if doc_type and doc_type != 'no identificado':
+            for key, value in self.DOC_TYPE_MAPPING.items():
+                if key in doc_type:
+                    document.document_type = value
+                    break
+
+        document.status = 'completed'
+        document.processed_at = timezone.now()
+        document.extraction_error = None
+        document.save()
+        logger.info(f"Documento procesado exitosamente: {document.name}")
+
+    def _update_quota(self, document):
+        # Los documentos subidos ya reservaron cupo; los anteriores a la reserva lo descuentan aquí
+        try:
+            if document.claim_quota():
+                subscription = document.user.subscription
+                subscription.increment_documents()
+                logger.info(f"Contador incrementado. Documentos usados: {subscription.documents_used}/{subscription.get_documents_limit()}")
+        except Exception as e:
+            logger.error(f"Error al actualizar el contador de documentos: {str(e)}")
+
+    def mark_failed(self, document, error):
+        """Marca el documento como error definitivo con un mensaje legible"""
+        if isinstance(error, FileNotFoundError):
+            message = f"No se pudo encontrar el archivo: {str(error)}"
+        elif isinstance(error, ExtractionUnavailableError):
+            message = str(error)
+        else:
+            message = f"Error al procesar el documento: {str(error)}"
+
+        document.status = 'error'
+        document.extraction_error = message
+        document.save(update_fields=['status', 'extraction_error'])
+        logger.info(f"Documento {document.id} marcado como error")
+
+        # El documento no se pudo extraer: se devuelve el cupo reservado al subirlo
+        try:
+            if document.release_quota():
+                logger.info(f"Cupo del documento {document.id} liberado")
+        except Exception as e:
+            logger.error(f"Error al liberar el cupo del documento: {str(e)}")
@@ -0,0 +1,107 @@
+import json
+import hashlib
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionCache:
+    """
+    Caché de resultados de extracción indexada por el SHA-256 del PDF,
+    el modelo de Gemini y la versión del prompt.
+    Las entradas expiran tras EXTRACTION_CACHE_TTL segundos y, al superar
+    EXTRACTION_CACHE_MAX_ENTRIES, se descartan las menos usadas recientemente.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'EXTRACTION_CACHE_ENABLED', True)
+        self.ttl = getattr(settings, 'EXTRACTION_CACHE_TTL', 30 * 24 * 3600)
+        self.max_entries = getattr(settings, 'EXTRACTION_CACHE_MAX_ENTRIES', 10000)
+
+    @classmethod
+    def hash_file(cls, pdf_path):
+        """SHA-256 del archivo leído por bloques para no cargarlo completo en memoria"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(cls.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def prompt_version(prompt):
+        """Hash corto del prompt; cambiarlo invalida las entradas anteriores"""
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def make_key(content_hash, model_name, prompt_version):
+        raw = f"{content_hash}:{model_name}:{prompt_version}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Retorna los datos cacheados o None si no existen o expiraron"""
+        from apps.documents.models import ExtractionCacheEntry
+
+        if not self.enabled:
+            return None
+        try:
+            entry = ExtractionCacheEntry.objects.get(key=key)
+        except ExtractionCacheEntry.DoesNotExist:
+            return None
+
+        if self.ttl and entry.created_at < timezone.now() - timedelta(seconds=self.ttl):
+            entry.delete()
+            return None
+
+        try:
+            data = json.loads(entry.extracted_data_json)
+        except json.JSONDecodeError:
+            entry.delete()
+            return None
+
+        ExtractionCacheEntry.objects.filter(pk=entry.pk).update(
+            hits=F('hits') + 1, last_used_at=timezone.now()
+        )
+        return data
+
+    def set(self, key, content_hash, model_name, prompt_version, data):
+        """Guarda un resultado de extracción y aplica el límite de tamaño"""
+        from apps.documents.models import ExtractionCacheEntry
+
+        if not self.enabled:
+            return
+        ExtractionCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                'content_hash': content_hash,
+                'model_name': model_name,
+                'prompt_version': prompt_version,
+                'extracted_data_json': json.dumps(data, ensure_ascii=False),
+                'created_at': timezone.now(),
+                'last_used_at': timezone.now(),
+            }
+        )
+        self.evict()
+
+    def evict(self):
+        """Elimina entradas expiradas y las menos usadas si se supera el máximo"""
+        from apps.documents.models import ExtractionCacheEntry
+
+        if self.ttl:
+            limit = timezone.now() - timedelta(seconds=self.ttl)
+            ExtractionCacheEntry.objects.filter(created_at__lt=limit).delete()
+
+        if self.max_entries:
+            excess = ExtractionCacheEntry.objects.count() - self.max_entries
+            if excess > 0:
+                stale_ids = list(
+                    ExtractionCacheEntry.objects.order_by('last_used_at')
+                    .values_list('id', flat=True)[:excess]
+                )
+                ExtractionCacheEntry.objects.filter(id__in=stale_ids).delete()
+                logger.info(f"Caché de extracción: {len(stale_ids)} entradas descartadas por tamaño")
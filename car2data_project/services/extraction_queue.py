@@ -0,0 +1,356 @@
+import os
+import random
+import socket
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from .metrics import record_stage, trace_document
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionQueue:
+    """
+    Cola persistente de extracción respaldada por la base de datos.
+    Los trabajos sobreviven a reinicios del servidor y se reparten entre usuarios
+    de forma equitativa: primero se atienden los usuarios con menos trabajos en ejecución.
+    """
+
+    # Cantidad de trabajos listos que se evalúan en cada reclamo
+    CLAIM_WINDOW = 50
+
+    def __init__(self):
+        self.max_attempts = getattr(settings, 'EXTRACTION_MAX_ATTEMPTS', 3)
+        self.retry_base_seconds = getattr(settings, 'EXTRACTION_RETRY_BASE_SECONDS', 30)
+        self.retry_max_seconds = getattr(settings, 'EXTRACTION_RETRY_MAX_SECONDS', 900)
+        self.max_running_per_user = getattr(settings, 'EXTRACTION_MAX_RUNNING_PER_USER', 2)
+        self.lock_timeout = getattr(settings, 'EXTRACTION_JOB_LOCK_TIMEOUT', 120)
+
+    def enqueue(self, document):
+        """Encola un documento para extracción y devuelve el trabajo creado"""
+        from apps.documents.models import ExtractionJob
+
+        job = ExtractionJob.objects.create(
+            document=document,
+            user_id=document.user_id,
+            max_attempts=self.max_attempts,
+        )
+        logger.info(f"Documento {document.id} encolado para extracción (trabajo {job.id})")
+        transaction.on_commit(ensure_embedded_workers)
+        return job
+
+    def enqueue_many(self, documents):
+        """Encola varios documentos con un solo INSERT"""
+        from apps.documents.models import ExtractionJob
+
+        jobs = ExtractionJob.objects.bulk_create([
+            ExtractionJob(document=document, user_id=document.user_id, max_attempts=self.max_attempts)
+            for document in documents
+        ])
+        logger.info(f"{len(jobs)} documentos encolados para extracción")
+        transaction.on_commit(ensure_embedded_workers)
+        return jobs
+
+    def claim(self, worker_id):
+        """Reclama el siguiente trabajo listo respetando la equidad entre usuarios"""
+        from apps.documents.models import ExtractionJob
+
+        self.requeue_stale()
+        now = timezone.now()
+        candidates = list(
+            ExtractionJob.objects.filter(status='queued', run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values('id', 'user_id')[:self.CLAIM_WINDOW]
+        )
+        if not candidates:
+            return None
+
+        running = dict(
+            ExtractionJob.objects.filter(status='running')
+            .values('user_id')
+            .annotate(total=Count('id'))
+            .values_list('user_id', 'total')
+        )
+        # Orden estable: a igual carga se respeta el orden de llegada
+        candidates.sort(key=lambda c: running.get(c['user_id'], 0))
+
+        for candidate in candidates:
+            if running.get(candidate['user_id'], 0) >= self.max_running_per_user:
+                continue
+            job_id = self._claim_candidate(candidate, worker_id, now)
+            if job_id:
+                return ExtractionJob.objects.select_related('document', 'document__user').get(pk=job_id)
+        return None
+
+    def _claim_candidate(self, candidate, worker_id, now):
+        """
+        Toma un trabajo dentro de una transacción que bloquea al usuario y vuelve a
+        contar sus trabajos en ejecución, para que dos workers no superen el límite.
+        """
+        from django.contrib.auth.models import User
+        from apps.documents.models import ExtractionJob
+
+        with transaction.atomic():
+            # Serializa los reclamos del mismo usuario; otro worker salta a otro usuario
+            owner = User.objects.select_for_update(
+                skip_locked=True, no_key=connection.features.has_select_for_no_key_update
+            ).filter(pk=candidate['user_id'])
+            if not list(owner.values_list('pk', flat=True)):
+                return None
+            job = (
+                ExtractionJob.objects.select_for_update(skip_locked=True)
+                .filter(pk=candidate['id'], status='queued', run_after__lte=now)
+                .values_list('pk', flat=True)
+                .first()
+            )
+            if job is None:
+                return None
+            ExtractionJob.objects.filter(pk=job).update(
+                status='running',
+                locked_by=worker_id,
+                locked_at=now,
+                heartbeat_at=now,
+                attempts=F('attempts') + 1,
+            )
+            # Nuevo conteo dentro de la misma transacción, ya incluyendo este trabajo
+            running = ExtractionJob.objects.filter(user_id=candidate['user_id'], status='running').count()
+            if running > self.max_running_per_user:
+                transaction.set_rollback(True)
+                return None
+        return job
+
+    def heartbeat(self, job_ids):
+        """Renueva el latido de los trabajos que el worker sigue ejecutando"""
+        from apps.documents.models import ExtractionJob
+
+        if not job_ids:
+            return 0
+        return ExtractionJob.objects.filter(pk__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+    def complete(self, job):
+        """Marca el trabajo como terminado"""
+        job.status = 'done'
+        job.finished_at = timezone.now()
+        job.last_error = ''
+        job.save(update_fields=['status', 'finished_at', 'last_error'])
+
+    def retry_or_fail(self, job, error):
+        """
+        Reprograma el trabajo con backoff exponencial o lo marca como fallido.
+        Retorna True si el trabajo se reintentará.
+        """
+        from .document_processor import CircuitOpenError
+
+        job.last_error = str(error)
+        if isinstance(error, CircuitOpenError):
+            # No se llegó a llamar a Gemini: se devuelve el intento y se espera al enfriamiento
+            delay = max(1.0, error.retry_after) + random.uniform(0, self.retry_base_seconds * 0.1)
+            job.attempts = max(0, job.attempts - 1)
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            job.locked_by = ''
+            job.locked_at = None
+            job.heartbeat_at = None
+            job.save(update_fields=[
+                'attempts', 'status', 'run_after', 'locked_by', 'locked_at', 'heartbeat_at', 'last_error',
+            ])
+            logger.warning(f"Trabajo {job.id} pospuesto {delay:.0f}s: circuit breaker de Gemini abierto")
+            return True
+
+        if job.attempts < job.max_attempts and not isinstance(error, FileNotFoundError):
+            delay = min(self.retry_max_seconds, self.retry_base_seconds * (2 ** (job.attempts - 1)))
+            delay += random.uniform(0, delay * 0.1)
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            job.locked_by = ''
+            job.locked_at = None
+            job.heartbeat_at = None
+            job.save(update_fields=['status', 'run_after', 'locked_by', 'locked_at', 'heartbeat_at', 'last_error'])
+            logger.warning(f"Trabajo {job.id} reprogramado en {delay:.0f}s (intento {job.attempts}/{job.max_attempts}): {error}")
+            return True
+
+        job.status = 'failed'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at', 'last_error'])
+        logger.error(f"Trabajo {job.id} fallido tras {job.attempts} intentos: {error}")
+        return False
+
+    def requeue_stale(self):
+        """
+        Devuelve a la cola los trabajos cuyo worker murió (p. ej. durante un despliegue).
+        Se usa el último latido, no la hora de inicio, para no robar extracciones largas.
+        Los trabajos que ya agotaron sus intentos se marcan como fallidos y liberan el cupo.
+        """
+        from apps.documents.models import ExtractionJob
+
+        limit = timezone.now() - timedelta(seconds=self.lock_timeout)
+        stale = ExtractionJob.objects.filter(
+            Q(heartbeat_at__lt=limit) | Q(heartbeat_at__isnull=True, locked_at__lt=limit),
+            status='running',
+        )
+        self._fail_exhausted(stale.filter(attempts__gte=F('max_attempts')))
+        requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+            status='queued', locked_by='', locked_at=None, heartbeat_at=None,
+        )
+        if requeued:
+            logger.warning(f"{requeued} trabajos de extracción bloqueados se devolvieron a la cola")
+        return requeued
+
+    def _fail_exhausted(self, jobs):
+        """Marca como fallidos los trabajos bloqueados sin intentos restantes"""
+        from .document_processor import DocumentProcessor
+
+        error = RuntimeError('El proceso de extracción se interrumpió en todos los intentos')
+        processor = None
+        for job in jobs.select_related('document'):
+            # Solo un worker gana la transición; los demás ven el trabajo ya cerrado
+            failed = type(job).objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+                status='failed', finished_at=timezone.now(), locked_by='', locked_at=None,
+                heartbeat_at=None, last_error=str(error),
+            )
+            if not failed:
+                continue
+            logger.error(f"Trabajo {job.id} fallido tras {job.attempts} intentos interrumpidos")
+            processor = processor or DocumentProcessor()
+            processor.mark_failed(job.document, error)
+
+    def pending_count(self):
+        """Cantidad de trabajos en cola o en ejecución"""
+        from apps.documents.models import ExtractionJob
+
+        return ExtractionJob.objects.filter(status__in=['queued', 'running']).count()
+
+
+class ExtractionWorkerPool:
+    """
+    Pool acotado de hilos que consumen la cola de extracción.
+    Cada hilo procesa un trabajo a la vez, por lo que el número de extracciones
+    simultáneas nunca supera `concurrency`.
+    """
+
+    def __init__(self, concurrency=None, poll_interval=None, name=None):
+        self.concurrency = concurrency or getattr(settings, 'EXTRACTION_WORKER_CONCURRENCY', 2)
+        self.poll_interval = poll_interval or getattr(settings, 'EXTRACTION_POLL_INTERVAL', 2)
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.queue = ExtractionQueue()
+        self.heartbeat_interval = getattr(settings, 'EXTRACTION_HEARTBEAT_INTERVAL', 15)
+        self._stop = threading.Event()
+        self._threads = []
+        self._active_jobs = set()
+        self._active_lock = threading.Lock()
+
+    def start(self):
+        """Arranca los hilos del pool con el extractor de Gemini ya precargado"""
+        from .pdf_extractor import warm_up
+
+        warm_up()
+        for index in range(self.concurrency):
+            thread = threading.Thread(
+                target=self._run,
+                args=(f"{self.name}-{index}",),
+                name=f"extraction-worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._beat, name='extraction-heartbeat', daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info(f"Pool de extracción iniciado con {self.concurrency} workers ({self.name})")
+
+    def request_stop(self):
+        """Solicita la detención; cada hilo termina su trabajo actual antes de salir"""
+        self._stop.set()
+
+    def wait(self):
+        """Bloquea hasta que se solicite la detención y terminen los hilos"""
+        while not self._stop.wait(1):
+            pass
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self, timeout=None):
+        """Detiene el pool esperando a que terminen los trabajos en curso"""
+        self.request_stop()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def is_alive(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def _run(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                close_old_connections()
+                job = self.queue.claim(worker_id)
+            except Exception as e:
+                logger.error(f"Error reclamando trabajo de extracción: {str(e)}")
+                job = None
+
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            with self._active_lock:
+                self._active_jobs.add(job.id)
+            try:
+                self.run_job(job)
+            finally:
+                with self._active_lock:
+                    self._active_jobs.discard(job.id)
+        connection.close()
+
+    def _beat(self):
+        """Renueva periódicamente el latido de los trabajos en curso de este proceso"""
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._active_lock:
+                job_ids = list(self._active_jobs)
+            try:
+                close_old_connections()
+                self.queue.heartbeat(job_ids)
+            except Exception as e:
+                logger.error(f"Error renovando el latido de trabajos de extracción: {str(e)}")
+        connection.close()
+
+    def run_job(self, job):
+        """Ejecuta un trabajo y registra su resultado en la cola"""
+        from .document_processor import DocumentProcessor
+
+        processor = DocumentProcessor()
+        with trace_document(job.document):
+            if job.locked_at:
+                # Tiempo desde que el trabajo quedó listo hasta que un worker lo tomó
+                record_stage('queue_wait', (job.locked_at - job.run_after).total_seconds())
+            try:
+                processor.process(job.document)
+            except Exception as e:
+                logger.exception(f"Error procesando documento {job.document_id} (trabajo {job.id})")
+                if not self.queue.retry_or_fail(job, e):
+                    processor.mark_failed(job.document, e)
+            else:
+                self.queue.complete(job)
+
+
+_embedded_pool = None
+_embedded_lock = threading.Lock()
+
+
+def ensure_embedded_workers():
+    """
+    Arranca (una sola vez por proceso) el pool de workers embebido en el servidor web.
+    Con EXTRACTION_EMBEDDED_WORKERS=0 la cola solo la consumen los workers dedicados
+    (`python manage.py run_extraction_workers`).
+    """
+    global _embedded_pool
+    concurrency = getattr(settings, 'EXTRACTION_EMBEDDED_WORKERS', 2)
+    if concurrency <= 0:
+        return None
+    with _embedded_lock:
+        if _embedded_pool is None or not _embedded_pool.is_alive():
+            _embedded_pool = ExtractionWorkerPool(concurrency=concurrency)
+            _embedded_pool.start()
+    return _embedded_pool
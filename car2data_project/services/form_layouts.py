@@ -0,0 +1,617 @@
+# car2data_project/services/form_layouts.py
+
+"""
+Diseño declarativo de los formularios que rellena PDFFormFiller.
+
+Cada plantilla describe su archivo PDF, las coordenadas de cada campo y la lista
+ordenada de campos a dibujar. Un campo indica de dónde sale el valor (`source`),
+cómo se transforma, el tamaño de fuente, el ancho máximo y, para las casillas,
+las reglas que deciden cuál se marca. El diseño se compila una vez por proceso
+en un FillPlan que recorre los campos en un ciclo sin búsquedas repetidas.
+
+Tipos de campo:
+    text    texto en mayúsculas (máx. 50 caracteres) desplazado si se sale de la página
+    fit     texto que reduce la fuente (9 a 6) hasta caber en `max_width`
+    plate   placa dividida en letras y números en dos coordenadas
+    choice  casilla marcada con "X" según la primera regla que coincida
+
+Orígenes: rutas con puntos ('vehiculo.placa'). Se toma la primera con valor;
+con `present=True` se toma la primera cuya clave exista (aunque esté vacía)
+y `default` se usa si ninguna existe.
+"""
+
+import logging
+from datetime import datetime
+from functools import lru_cache
+from reportlab.pdfbase import pdfmetrics
+
+logger = logging.getLogger(__name__)
+
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
+         "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+def getv(key, *aliases):
+    """Rutas del formulario de trámite: datos planos primero, luego la sección 'vehiculo'"""
+    keys = (key,) + aliases
+    return keys + tuple(f'vehiculo.{k}' for k in keys)
+
+
+FORM_LAYOUTS = {
+    'formulario_tramite': {
+        'template': 'formulario_tramite_template.pdf',
+        # Las coordenadas son (X, Y) desde la esquina INFERIOR IZQUIERDA
+        # 1 punto = 1/72 pulgadas. Página carta = 612x792 puntos
+        'coordinates': {
+            # Placa - Campo 2 (corregido para alinearse con campos reales)
+            'placa_letras': (750, 495),    # Posición exacta del campo letras
+            'placa_numeros': (770, 495),   # Posición exacta del campo números
+
+            # Campos de vehículo (reposicionados según cuadrícula)
+            'marca': (390, 460),              # Campo 5 - posición corregida
+            'linea': (480, 460),              # Campo 6 - posición corregida
+            'color': (390, 430),              # Campo 8 - posición corregida
+            'modelo': (660, 430),             # Campo 9 - posición corregida
+            'cilindrada': (720, 430),         # Campo 10 - posición corregida
+
+            # Capacidad, Blindaje, Potencia (reajustados)
+            'capacidad': (390, 405),          # Campo 11        # Campo 13 NO
+            'potencia': (720, 405),           # Campo 14
+
+            # Tipo de combustible (fila de checkboxes) - reposicionados
+            'combustible_gasolina': (575, 453),
+            'combustible_diesel': (606, 453),
+            'combustible_gas': (626, 453),
+            'combustible_mixto': (656, 453),
+            'combustible_electrico': (686, 453),
+            'combustible_hidrogeno': (716, 453),
+            'combustible_etanol': (746, 453),
+            'combustible_biodiesel': (776, 453),
+
+            # Clase de vehículo (reposicionados según cuadrícula)
+            'clase_automovil': (30, 370),
+            'clase_bus': (90, 370),
+            'clase_buseta': (120, 370),
+            'clase_camion': (170, 370),
+            'clase_campero': (270, 370),
+            'clase_camioneta': (220, 370),
+            'clase_tractocamion': (30, 370),
+            'clase_motocicleta': (90, 350),
+            'clase_motocarro': (120, 350),
+            'clase_mototriciclo': (170, 350),
+            'clase_cuatrimoto': (220, 350),
+            'clase_volqueta': (270, 350),
+            'clase_microbus': (320, 370),
+            'clase_otro': (320, 350),
+
+            # Carrocería - Campo 15 (corregido)
+            'carroceria': (390, 345),
+
+            # Identificación del vehículo - Campo 16 (coordenadas corregidas)
+            'numero_motor': (600, 370),
+            'reg_motor_n': (780, 370),  # REG Motor = N
+            'reg_motor_s': (755, 370),  # REG Motor = S
+            'numero_chasis': (600, 350),
+            'reg_chasis_n': (780, 345),  # REG Chasis = N
+            'reg_chasis_s': (755, 345),  # REG Chasis = S
+            'numero_serie': (600, 320),
+            'reg_serie_n': (780, 320),  # REG Serie = N
+            'reg_serie_s': (755, 320),  # REG Serie = S
+            'numero_vin': (600, 290),
+
+            # Tipo de servicio - Campo 18 (coordenadas corregidas según imagen)
+            'servicio_particular': (602, 240),
+            'servicio_publico': (620, 240),
+            'servicio_diplomatico': (650, 240),
+            'servicio_oficial': (680, 240),
+            'servicio_especial': (710, 240),
+            'otros_servicio': (740, 240),
+
+            # Datos del propietario - Campo 21 (coordenadas corregidas según imagen)
+            'propietario_primer_apellido': (30, 290),
+            'propietario_segundo_apellido': (140, 290),
+            'propietario_nombres': (270, 290),
+
+            'propietario_documento': (320, 265),
+            'propietario_direccion': (30, 240),
+            'propietario_ciudad': (205, 240),
+            'propietario_telefono': (320, 240),
+
+            # Datos del comprador (traspaso) - Campo 22 (coordenadas corregidas)
+            'comprador_primer_apellido': (30, 155),
+            'comprador_segundo_apellido': (140, 155),
+            'comprador_nombres': (270, 155),
+
+            'comprador_documento': (320, 125),
+            'comprador_direccion': (30, 100),
+            'comprador_ciudad': (205, 100),
+            'comprador_telefono': (320, 100),
+
+            # Observaciones - Campo 23 (reposicionado)
+            'observaciones': (390, 130),
+
+            # Datos de importación
+            'declaracion_importacion': (390, 250),
+            'importacion_dia': (480, 250),
+            'importacion_mes': (505, 250),
+            'importacion_ano': (545, 250),
+        },
+        'fields': [
+            # Fecha actual y organismo (sin coordenadas en la plantilla actual)
+            {'field': 'fecha_dia', 'transform': 'today_day'},
+            {'field': 'fecha_mes', 'transform': 'today_month'},
+            {'field': 'fecha_año', 'transform': 'today_year'},
+            {'field': 'organismo_transito', 'default': 'RUNT'},
+
+            # PLACA - dividida en letras y números
+            {'kind': 'plate', 'fields': ('placa_letras', 'placa_numeros'), 'source': getv('placa')},
+
+            # DATOS BÁSICOS DEL VEHÍCULO
+            {'field': 'marca', 'source': getv('marca')},
+            {'field': 'linea', 'source': getv('linea')},
+            {'field': 'color', 'source': getv('color')},
+            {'field': 'modelo', 'kind': 'fit', 'source': getv('modelo'), 'max_width': 120},
+            {'field': 'cilindrada', 'source': getv('cilindrada', 'cilindrada_cc')},
+            {'field': 'capacidad', 'source': getv('capacidad', 'capacidad_kg_psj')},
+            {'field': 'potencia', 'source': getv('potencia', 'potencia_hp')},
+            {'field': 'carroceria', 'source': getv('carroceria', 'tipo_carroceria')},
+
+            # NÚMEROS DE IDENTIFICACIÓN Y REGRABACIÓN (REG = S/N)
+            {'field': 'numero_motor', 'kind': 'fit', 'source': getv('numero_motor'), 'max_width': 260},
+            {'kind': 'choice', 'source': getv('reg_numero_motor'), 'match': 'equals', 'size': 10,
+             'options': [('reg_motor_n', ('N',)), ('reg_motor_s', ('S',))]},
+            {'field': 'numero_chasis', 'kind': 'fit', 'source': getv('numero_chasis'), 'max_width': 260},
+            {'kind': 'choice', 'source': getv('reg_numero_chasis'), 'match': 'equals', 'size': 10,
+             'options': [('reg_chasis_n', ('N',)), ('reg_chasis_s', ('S',))]},
+            {'field': 'numero_serie', 'kind': 'fit', 'source': getv('numero_serie'), 'max_width': 260},
+            {'kind': 'choice', 'source': getv('reg_numero_serie'), 'match': 'equals', 'size': 10,
+             'options': [('reg_serie_n', ('N',)), ('reg_serie_s', ('S',))]},
+            {'field': 'numero_vin', 'kind': 'fit', 'source': getv('numero_vin', 'vin'), 'max_width': 260},
+
+            # CHECKBOXES: combustible, clase de vehículo y tipo de servicio
+            {'kind': 'choice', 'source': getv('combustible'), 'options': [
+                ('combustible_gasolina', ('gasolina',)),
+                ('combustible_diesel', ('diesel', 'diésel')),
+                ('combustible_gas', ('gas',)),
+                ('combustible_electrico', ('eléctrico', 'electrico')),
+            ]},
+            {'kind': 'choice', 'source': getv('clase_vehiculo'), 'otherwise': 'clase_otro', 'options': [
+                ('clase_automovil', ('automóvil', 'automovil', 'auto')),
+                ('clase_motocicleta', ('motocicleta', 'moto')),
+                ('clase_camioneta', ('camioneta',)),
+                ('clase_camion', ('camión', 'camion')),
+                ('clase_bus', ('bus',)),
+            ]},
+            # Por defecto se marca particular si no se especifica
+            {'kind': 'choice', 'source': getv('servicio'), 'otherwise': 'servicio_particular', 'options': [
+                ('servicio_particular', ('particular', 'privado')),
+                ('servicio_publico', ('público', 'publico')),
+                ('servicio_oficial', ('oficial',)),
+                ('servicio_diplomatico', ('diplomático', 'diplomatico')),
+            ]},
+
+            # DATOS DEL PROPIETARIO
+            {'field': 'propietario_primer_apellido', 'source': ('propietario_primer_apellido',)},
+            {'field': 'propietario_segundo_apellido', 'source': ('propietario_segundo_apellido',)},
+            {'field': 'propietario_nombres', 'source': ('propietario_nombres',)},
+            {'field': 'propietario_documento', 'source': ('propietario_documento',), 'transform': 'document'},
+            {'field': 'propietario_direccion', 'source': ('propietario_direccion',)},
+            {'field': 'propietario_ciudad', 'source': ('propietario_ciudad',)},
+            {'field': 'propietario_telefono', 'source': ('propietario_telefono',)},
+            {'kind': 'choice', 'source': ('propietario_tipo_documento',), 'otherwise': 'propietario_otro_doc', 'options': [
+                ('propietario_cc', ('c.c.', 'ciudadanía')),
+                ('propietario_nit', ('nit',)),
+                ('propietario_ce', ('c.e.', 'extranjería')),
+                ('propietario_pasaporte', ('pasaporte',)),
+            ]},
+
+            # DATOS DEL COMPRADOR (si aplica traspaso)
+            {'field': 'comprador_primer_apellido', 'source': ('comprador_primer_apellido',)},
+            {'field': 'comprador_segundo_apellido', 'source': ('comprador_segundo_apellido',)},
+            {'field': 'comprador_nombres', 'source': ('comprador_nombres',)},
+            {'field': 'comprador_documento', 'source': ('comprador_documento',), 'transform': 'document'},
+            {'field': 'comprador_direccion', 'source': ('comprador_direccion',)},
+            {'field': 'comprador_ciudad', 'source': ('comprador_ciudad',)},
+            {'field': 'comprador_telefono', 'source': ('comprador_telefono',)},
+            {'kind': 'choice', 'source': ('comprador_tipo_documento',), 'otherwise': 'comprador_otro_doc',
+             'otherwise_requires_value': True, 'options': [
+                ('comprador_cc', ('c.c.', 'ciudadanía')),
+                ('comprador_nit', ('nit',)),
+                ('comprador_ce', ('c.e.', 'extranjería')),
+                ('comprador_pasaporte', ('pasaporte',)),
+            ]},
+
+            # OBSERVACIONES
+            {'field': 'observaciones', 'kind': 'fit', 'source': ('observaciones',), 'max_width': 350},
+
+            # DATOS DE IMPORTACIÓN
+            {'field': 'declaracion_importacion', 'source': ('declaracion_importacion',)},
+            {'field': 'importacion_dia', 'source': ('fecha_importacion',), 'transform': 'import_day'},
+            {'field': 'importacion_mes', 'source': ('fecha_importacion',), 'transform': 'import_month'},
+            {'field': 'importacion_ano', 'source': ('fecha_importacion',), 'transform': 'import_year'},
+        ],
+    },
+
+    'contrato_compraventa': {
+        'template': 'contrato_compraventa_template.pdf',
+        'font_size': 10,
+        'coordinates': {
+            # Línea de vendedor (coordenadas corregidas según cuadrícula)
+            'vendedor_nombre': (130, 690),
+            'vendedor_ciudad': (200, 675),
+
+            # Línea de comprador (coordenadas corregidas)
+            'comprador_nombre': (70, 645),
+            'comprador_ciudad': (150, 630),
+
+            # Identificación del vehículo (reposicionado)
+            'vehiculo_tipo': (70, 545),
+
+            # Campos del vehículo en tabla (coordenadas corregidas según cuadrícula)
+            'marca': (140, 520),
+            'linea': (370, 520),
+            'placa': (140, 507),
+            'modelo': (370, 507),
+            'motor': (140, 493),
+            'chasis': (370, 493),
+            'color': (140, 481),
+            'matriculado_en': (400, 481),
+            'vin': (140, 468),
+            'serie': (370, 468),
+
+            # Precio (coordenadas ajustadas)
+            'precio_numeros': (440, 440),
+            'precio_letras': (80, 422),
+
+            # Forma de pago (reposicionado)
+            'forma_pago': (190, 377),
+
+            # Lugar y fecha (coordenadas corregidas según imagen)
+            'ciudad_contrato': (350, 260),
+            'dia_contrato': (520, 260),
+            'mes_contrato': (160, 245),
+            'año_contrato': (380, 245),
+
+            # Datos para firmas (coordenadas ajustadas)
+            'vendedor_doc_firma': (110, 115),
+            'vendedor_dir_firma': (110, 100),
+            'vendedor_tel_firma': (110, 85),
+
+            'comprador_doc_firma': (360, 115),
+            'comprador_dir_firma': (360, 100),
+            'comprador_tel_firma': (360, 85),
+        },
+        'fields': [
+            # El nombre del vendedor viene de la tarjeta ('Apellidos Nombres'); el del comprador, del formulario
+            {'field': 'vendedor_nombre', 'source': ('vendedor.nombre',), 'transform': 'name_order'},
+            {'field': 'vendedor_ciudad', 'source': ('vendedor.ciudad',)},
+            {'field': 'comprador_nombre', 'source': ('comprador.nombre',)},
+            {'field': 'comprador_ciudad', 'source': ('comprador.ciudad',)},
+
+            # IDENTIFICACIÓN DEL VEHÍCULO
+            {'field': 'vehiculo_tipo', 'source': ('vehiculo.clase_vehiculo', 'vehiculo.tipo_carroceria')},
+            {'field': 'marca', 'source': ('vehiculo.marca',)},
+            {'field': 'linea', 'source': ('vehiculo.linea',)},
+            {'field': 'placa', 'source': ('vehiculo.placa',)},
+            {'field': 'modelo', 'source': ('vehiculo.modelo',)},
+            {'field': 'motor', 'source': ('vehiculo.numero_motor',)},
+            {'field': 'chasis', 'source': ('vehiculo.numero_chasis',)},
+            {'field': 'color', 'source': ('vehiculo.color',)},
+            {'field': 'matriculado_en', 'source': ('organismo_transito',)},
+            {'field': 'vin', 'source': ('vehiculo.vin',)},
+            {'field': 'serie', 'source': ('vehiculo.numero_serie',)},
+
+            # VALOR DE LA VENTA Y FORMA DE PAGO
+            {'field': 'precio_numeros', 'source': ('valor_venta',), 'transform': 'price'},
+            {'field': 'precio_letras', 'source': ('valor_venta',), 'transform': 'price_words'},
+            {'field': 'forma_pago', 'source': ('forma_pago',)},
+
+            # CIUDAD Y FECHA DEL CONTRATO (sin fallback automático de ciudad; fecha actual por defecto)
+            {'field': 'ciudad_contrato', 'source': ('ciudad_contrato',)},
+            {'field': 'dia_contrato', 'source': ('fecha_contrato',), 'transform': 'date_day'},
+            {'field': 'mes_contrato', 'source': ('fecha_contrato',), 'transform': 'date_month_name'},
+            {'field': 'año_contrato', 'source': ('fecha_contrato',), 'transform': 'date_year'},
+
+            # DATOS PARA FIRMAS (sin prefijos)
+            {'field': 'vendedor_doc_firma', 'source': ('vendedor.documento',), 'transform': 'document'},
+            {'field': 'vendedor_dir_firma', 'source': ('vendedor.direccion',)},
+            {'field': 'vendedor_tel_firma', 'source': ('vendedor.telefono',)},
+            {'field': 'comprador_doc_firma', 'source': ('comprador.documento',), 'transform': 'document'},
+            {'field': 'comprador_dir_firma', 'source': ('comprador.direccion',)},
+            {'field': 'comprador_tel_firma', 'source': ('comprador.telefono',)},
+        ],
+    },
+
+    'contrato_mandato': {
+        'template': 'contrato_mandato_template.pdf',
+        'font_size': 11,
+        'coordinates': {
+            # Primera línea - datos del mandante (coordenadas corregidas)
+            'mandante_nombre': (240, 660),  # Aumentado de 635 a 680
+            'mandante_ciudad': (310, 645),  # Aumentado de 610 a 655
+            'mandante_documento': (245, 630), # Aumentado de 585 a 630
+
+            # Segunda línea - datos del mandatario (coordenadas Y más altas)
+            'mandatario_nombre': (120, 600),  # Aumentado de 545 a 590
+            'mandatario_documento': (90, 570), # Aumentado de 510 a 555
+
+            # Trámites autorizados (reposicionado más arriba)
+            'tramites_autorizados': (90, 462), # Aumentado de 375 a 420
+
+            # Placa del vehículo (coordenada Y más alta)
+            'vehiculo_placa': (410, 445),  # Aumentado de 350 a 450
+
+            # Organismo de tránsito (reajustado hacia arriba)
+            'organismo_transito': (220, 430), # Aumentado de 325 a 425
+
+            # Lugar y fecha del contrato (coordenadas Y más altas para la parte inferior)
+            'ciudad_contrato': (90, 310),  # Aumentado de 240 a 340
+            'dia_contrato': (223, 310),     # Aumentado de 215 a 315
+            'mes_contrato': (330, 310),     # Aumentado de 215 a 315
+            'año_contrato': (480, 310),     # Aumentado de 215 a 315
+        },
+        'fields': [
+            {'field': 'mandante_documento', 'source': ('mandante.documento',), 'transform': 'document'},
+            {'field': 'mandatario_documento', 'source': ('mandatario.documento',), 'transform': 'document'},
+            {'field': 'mandante_nombre', 'source': ('mandante.nombre',), 'transform': 'name_order'},
+            {'field': 'mandante_ciudad', 'source': ('mandante.ciudad',)},
+            {'field': 'mandatario_nombre', 'source': ('mandatario.nombre',)},
+
+            {'field': 'tramites_autorizados', 'source': ('tramites_autorizados',), 'present': True,
+             'default': 'Matricula, registro, traspaso, cambio de propietario y demás trámites vehiculares'},
+            {'field': 'vehiculo_placa', 'source': ('vehiculo.placa', 'placa'), 'present': True},
+            {'field': 'organismo_transito', 'source': ('organismo_transito',), 'present': True, 'default': 'RUNT'},
+
+            # FECHA Y LUGAR DEL CONTRATO
+            {'field': 'ciudad_contrato', 'source': ('ciudad_contrato', 'mandante.ciudad'), 'present': True,
+             'default': 'BOGOTÁ'},
+            {'field': 'dia_contrato', 'source': ('fecha_contrato',), 'transform': 'date_day'},
+            {'field': 'mes_contrato', 'source': ('fecha_contrato',), 'transform': 'date_month_name'},
+            {'field': 'año_contrato', 'source': ('fecha_contrato',), 'transform': 'date_year'},
+        ],
+    },
+}
+
+
+@lru_cache(maxsize=4096)
+def string_width(text, font, size):
+    """Ancho del texto en puntos; los valores repetidos no se vuelven a medir"""
+    return pdfmetrics.stringWidth(text, font, size)
+
+
+def _parse_date(value):
+    """Fecha del contrato: fecha/ISO del formulario o la fecha actual"""
+    if value and not isinstance(value, str):
+        return value
+    if value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+def _split_import_date(value):
+    """(día, mes, año) de 'AAAA-MM-DD' o 'DD/MM/AAAA'; vacíos si no tiene tres partes"""
+    parts = str(value or '').replace('/', '-').split('-')
+    if len(parts) != 3:
+        return '', '', ''
+    if len(parts[0]) == 4:
+        return parts[2], parts[1], parts[0]
+    return parts[0], parts[1], parts[2]
+
+
+def _when_present(transform):
+    return lambda value: transform(value) if value else ''
+
+
+BUILTIN_TRANSFORMS = {
+    'today_day': lambda value: f"{datetime.now().day:02d}",
+    'today_month': lambda value: f"{datetime.now().month:02d}",
+    'today_year': lambda value: str(datetime.now().year),
+    'date_day': lambda value: str(_parse_date(value).day),
+    'date_month_name': lambda value: MESES[_parse_date(value).month - 1],
+    'date_year': lambda value: str(_parse_date(value).year),
+    'import_day': lambda value: _split_import_date(value)[0],
+    'import_month': lambda value: _split_import_date(value)[1],
+    'import_year': lambda value: _split_import_date(value)[2],
+    'price': _when_present(lambda value: f"${value:,.0f}"),
+}
+
+
+class _Pen:
+    """Estado de un dibujo: evita cambiar la fuente si el tamaño no cambió"""
+
+    __slots__ = ('canvas', 'font', 'size', 'page_w', 'page_h')
+
+    def __init__(self, canvas_obj, font):
+        self.canvas = canvas_obj
+        self.font = font
+        self.size = None
+        self.page_w, self.page_h = canvas_obj._pagesize
+
+    def use(self, size):
+        if size != self.size:
+            self.canvas.setFont(self.font, size)
+            self.size = size
+
+
+class FillPlan:
+    """Diseño compilado: lista de operaciones de dibujo con coordenadas y orígenes ya resueltos"""
+
+    def __init__(self, form_type, font, ops):
+        self.form_type = form_type
+        self.font = font
+        self.ops = ops
+
+    def render(self, canvas_obj, data):
+        pen = _Pen(canvas_obj, self.font)
+        for op in self.ops:
+            op(pen, data)
+        logger.info(f"{self.form_type} rellenado ({len(self.ops)} campos en el plan)")
+
+
+def _compile_source(spec):
+    """Función data -> valor según las rutas del campo"""
+    paths = [tuple(path.split('.')) for path in spec.get('source', ())]
+    default = spec.get('default', '')
+
+    if spec.get('present'):
+        def resolve(data):
+            for path in paths:
+                node = data
+                for key in path[:-1]:
+                    node = node.get(key) if isinstance(node, dict) else None
+                if isinstance(node, dict) and path[-1] in node:
+                    return node[path[-1]]
+            return default
+        return resolve
+
+    def resolve(data):
+        for path in paths:
+            node = data
+            for key in path:
+                node = node.get(key) if isinstance(node, dict) else None
+            if node:
+                return node
+        return default
+    return resolve
+
+
+def _compile_text(spec, coords, font, size, transform):
+    x0, y = coords
+    resolve = _compile_source(spec)
+    size = spec.get('size', size)
+
+    def draw_text(pen, data):
+        value = transform(resolve(data))
+        if not value or not str(value).strip():
+            return
+        text = str(value).strip().upper()[:50]
+        pen.use(size)
+        # Desplazar a la izquierda si se sale del ancho de la página
+        x = x0
+        overflow = (x + string_width(text, font, size)) - (pen.page_w - 2)
+        if overflow > 0:
+            x = max(2, x - overflow)
+        pen.canvas.drawString(x, y, text)
+    return draw_text
+
+
+def _compile_fit(spec, coords, font, size, transform):
+    x0, y = coords
+    resolve = _compile_source(spec)
+    max_width = spec.get('max_width', 160)
+
+    def draw_fit(pen, data):
+        value = transform(resolve(data))
+        if not value or not str(value).strip():
+            return
+        text = str(value).strip()
+        # Probar tamaños de fuente decrecientes para encajar
+        for fit_size in (9, 8, 7, 6):
+            width = string_width(text, font, fit_size)
+            if width <= max_width:
+                x = x0
+                overflow = (x + width) - (pen.page_w - 2)
+                if overflow > 0:
+                    x = max(2, x - overflow)
+                pen.use(fit_size)
+                pen.canvas.drawString(x, y, text)
+                return
+        # Si no cupo, truncar conservando el final (identificadores)
+        text = text[-30:]
+        x = max(2, min(x0, (pen.page_w - 2) - string_width(text, font, 6)))
+        pen.use(6)
+        pen.canvas.drawString(x, y, text)
+    return draw_fit
+
+
+def _compile_plate(spec, coordinates, font):
+    letters_xy = coordinates.get(spec['fields'][0])
+    numbers_xy = coordinates.get(spec['fields'][1])
+    if letters_xy is None and numbers_xy is None:
+        return None
+    resolve = _compile_source(spec)
+    min_gap = 10  # Separación mínima entre letras y números
+
+    def draw_plate(pen, data):
+        plate = ''.join(ch for ch in str(resolve(data)).upper().strip() if ch.isalnum())
+        if not plate:
+            return
+        # Siempre tres letras al inicio (AAA123, o AAA12A en motocicletas)
+        letters, numbers = plate[:3], plate[3:]
+        pen.use(9)
+        if letters_xy is None or numbers_xy is None:
+            for xy, text in ((letters_xy, letters), (numbers_xy, numbers)):
+                if xy and text:
+                    x = xy[0]
+                    overflow = (x + string_width(text, font, 9)) - (pen.page_w - 2)
+                    pen.canvas.drawString(max(2, x - overflow) if overflow > 0 else x, xy[1], text)
+            return
+        x_letters = letters_xy[0]
+        width_letters = string_width(letters, font, 9)
+        x_numbers = max(numbers_xy[0], x_letters + width_letters + min_gap)
+        right_edge = max(x_letters + width_letters, x_numbers + string_width(numbers, font, 9))
+        overflow = right_edge - (pen.page_w - 2)
+        if overflow > 0:
+            x_letters -= overflow
+            x_numbers -= overflow
+        pen.canvas.drawString(x_letters, letters_xy[1], letters)
+        pen.canvas.drawString(x_numbers, numbers_xy[1], numbers)
+    return draw_plate
+
+
+def _compile_choice(spec, coordinates, size):
+    # Las opciones sin coordenada se conservan: si coinciden, no se marca ninguna otra
+    options = [(tuple(keywords), coordinates.get(name)) for name, keywords in spec['options']]
+    otherwise = coordinates.get(spec['otherwise']) if spec.get('otherwise') else None
+    if otherwise is None and not any(xy for _, xy in options):
+        return None
+    resolve = _compile_source(spec)
+    equals = spec.get('match') == 'equals'
+    requires_value = spec.get('otherwise_requires_value', False)
+    size = spec.get('size', size)
+
+    def draw_choice(pen, data):
+        raw = resolve(data)
+        value = str(raw).upper().strip() if equals else str(raw).lower()
+        for keywords, xy in options:
+            if (value in keywords) if equals else any(keyword in value for keyword in keywords):
+                break
+        else:
+            xy = otherwise if (value or not requires_value) else None
+        if xy is None:
+            return
+        x = max(10, min(xy[0], pen.page_w - 10))
+        y = max(10, min(xy[1], pen.page_h - 10))
+        pen.use(size)
+        pen.canvas.drawString(x, y, "X")
+    return draw_choice
+
+
+def compile_layout(form_type, font, transforms=None):
+    """Compila el diseño de una plantilla; se omiten los campos sin coordenadas"""
+    layout = FORM_LAYOUTS[form_type]
+    coordinates = layout['coordinates']
+    size = layout.get('font_size', 9)
+    available = dict(BUILTIN_TRANSFORMS, **(transforms or {}))
+    identity = lambda value: value
+
+    ops = []
+    for spec in layout['fields']:
+        kind = spec.get('kind', 'text')
+        if kind == 'plate':
+            op = _compile_plate(spec, coordinates, font)
+        elif kind == 'choice':
+            op = _compile_choice(spec, coordinates, size)
+        else:
+            coords = coordinates.get(spec['field'])
+            if coords is None:
+                continue
+            transform = available[spec['transform']] if spec.get('transform') else identity
+            compile_field = _compile_fit if kind == 'fit' else _compile_text
+            op = compile_field(spec, coords, font, size, transform)
+        if op is not None:
+            ops.append(op)
+    return FillPlan(form_type, font, ops)
@@ -0,0 +1,557 @@
+import io
+import os
+import time
+import atexit
+import logging
+import zipfile
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from functools import partial
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+GENERATED_DIR = 'generated_forms'
+
+
+class BatchGenerationError(Exception):
+    """El lote de formularios no se puede generar (trabajos inválidos o documentos ajenos)"""
+
+
+# ---------------------------------------------------------------------------
+# Armado de datos para cada tipo de formulario
+# ---------------------------------------------------------------------------
+
+def normalize_value(value):
+    """Convierte valores tipo "No disponible"/None/"N/A" en cadena vacía"""
+    try:
+        if value is None:
+            return ''
+        text = str(value).strip()
+        if text.lower() in ['no disponible', 'n/a', 'na', 'none', 'null', 'sin dato']:
+            return ''
+        return text
+    except Exception:
+        return ''
+
+
+def split_apellidos_nombres(fullname):
+    """Separa un nombre completo de la tarjeta ('Apellido1 Apellido2 Nombres')"""
+    try:
+        if not fullname:
+            return '', '', ''
+        parts = str(fullname).strip().split()
+        if len(parts) >= 3:
+            return parts[0], parts[1], ' '.join(parts[2:])
+        if len(parts) == 2:
+            return parts[0], '', parts[1]
+        return parts[0], '', ''
+    except Exception:
+        return '', '', ''
+
+
+def contrato_mandato_payload(extracted_data, mandante_data, mandatario_data):
+    """Datos del contrato de mandato a partir de los datos extraídos combinados con el formulario"""
+    form_data = {
+        'vehiculo': extracted_data.get('vehiculo', {}),
+        'mandante': {
+            'nombre': mandante_data.get('nombre', ''),
+            'documento': mandante_data.get('documento', ''),
+            'ciudad': mandante_data.get('ciudad', ''),
+            'direccion': mandante_data.get('direccion', ''),
+            'telefono': mandante_data.get('telefono', '')
+        },
+        'mandatario': {
+            'nombre': mandatario_data.get('nombre', ''),
+            'documento': mandatario_data.get('documento', ''),
+            'ciudad': mandatario_data.get('ciudad', ''),
+            'direccion': mandatario_data.get('direccion', ''),
+            'telefono': mandatario_data.get('telefono', '')
+        },
+        # Incluir todos los datos adicionales del formulario
+        'tramites_autorizados': extracted_data.get('tramites_autorizados', ''),
+        'organismo_transito': extracted_data.get('organismo_transito', ''),
+        'ciudad_contrato': extracted_data.get('ciudad_contrato', ''),
+        'fecha_contrato': extracted_data.get('fecha_contrato', '')
+    }
+
+    # Asegurarse de que los datos del vehículo estén en el nivel superior para compatibilidad
+    if 'vehiculo' in extracted_data and extracted_data['vehiculo']:
+        form_data.update({
+            'placa': extracted_data['vehiculo'].get('placa', ''),
+            'marca': extracted_data['vehiculo'].get('marca', ''),
+            'linea': extracted_data['vehiculo'].get('linea', ''),
+            'modelo': extracted_data['vehiculo'].get('modelo', '')
+        })
+    return form_data
+
+
+def contrato_compraventa_payload(extracted_data, additional_data):
+    """Datos del contrato de compraventa: vehículo extraído + partes y valores del formulario"""
+    return {
+        'vehiculo': extracted_data.get('vehiculo', {}),
+        'vendedor': additional_data.get('vendedor', {}),
+        'comprador': additional_data.get('comprador', {}),
+        'valor_venta': additional_data.get('valor_venta'),
+        'forma_pago': additional_data.get('forma_pago'),
+        'ciudad_contrato': additional_data.get('ciudad_contrato'),
+        'fecha_contrato': additional_data.get('fecha_contrato'),
+        'organismo_transito': (
+            additional_data.get('organismo_transito')
+            or extracted_data.get('registro', {}).get('organismo_transito')
+        ),
+    }
+
+
+def formulario_tramite_base(extracted_data):
+    """Datos base del formulario de trámite tomados de la tarjeta de propiedad"""
+    # Preferir 'informacion_vehiculo' (como en data_preview), con fallback a 'vehiculo'
+    vehiculo = extracted_data.get('informacion_vehiculo') or extracted_data.get('vehiculo', {})
+    propietario = extracted_data.get('propietario', {})
+    registro = extracted_data.get('registro', {})
+    ap1, ap2, nombres = split_apellidos_nombres(propietario.get('nombre'))
+
+    return {
+        'placa': vehiculo.get('placa'),
+        'marca': normalize_value(vehiculo.get('marca')),
+        'linea': normalize_value(vehiculo.get('linea')),
+        'color': normalize_value(vehiculo.get('color')),
+        'modelo': normalize_value(vehiculo.get('modelo')),
+        'cilindrada': normalize_value(vehiculo.get('cilindrada_cc')),
+        'capacidad': normalize_value(vehiculo.get('capacidad_kg_psj')),
+        'potencia': normalize_value(vehiculo.get('potencia_hp')),
+        'carroceria': normalize_value(vehiculo.get('tipo_carroceria')),
+        'numero_motor': normalize_value(vehiculo.get('numero_motor')),
+        'reg_numero_motor': normalize_value(vehiculo.get('reg_numero_motor')),
+        'numero_chasis': normalize_value(vehiculo.get('numero_chasis')),
+        'reg_numero_chasis': normalize_value(vehiculo.get('reg_numero_chasis')),
+        'numero_serie': normalize_value(vehiculo.get('numero_serie')),
+        'reg_numero_serie': normalize_value(vehiculo.get('reg_numero_serie')),
+        'numero_vin': normalize_value(vehiculo.get('vin')),
+        'tipo_servicio': normalize_value(vehiculo.get('servicio')),
+        'clase_vehiculo': normalize_value(vehiculo.get('clase_vehiculo')),
+        'combustible': normalize_value(vehiculo.get('combustible')),
+        # Propietario (separado automáticamente)
+        'propietario_primer_apellido': ap1,
+        'propietario_segundo_apellido': ap2,
+        'propietario_nombres': nombres,
+        'propietario_documento': normalize_value(propietario.get('identificacion')),
+
+        # Datos de importación
+        'declaracion_importacion': normalize_value(registro.get('declaracion_importacion')),
+        'fecha_importacion': normalize_value(registro.get('fecha_importacion')),
+    }
+
+
+def build_payload(form_type, extracted_data, data=None):
+    """Datos listos para PDFFormFiller; `data` tiene prioridad sobre lo extraído"""
+    data = data or {}
+    if form_type == 'contrato_mandato':
+        merged = dict(extracted_data)
+        merged.update(data)
+        return contrato_mandato_payload(merged, data.get('mandante', {}), data.get('mandatario', {}))
+    if form_type == 'contrato_compraventa':
+        return contrato_compraventa_payload(extracted_data, data)
+    if form_type == 'formulario_tramite':
+        payload = formulario_tramite_base(extracted_data)
+        payload.update({k: v for k, v in data.items() if v is not None and v != ''})
+        return payload
+    raise BatchGenerationError(f"Tipo de formulario no soportado: {form_type}")
+
+
+# ---------------------------------------------------------------------------
+# Pool de procesos de renderizado
+# ---------------------------------------------------------------------------
+
+_worker_filler = None
+
+
+def _init_worker():
+    """Prepara un proceso del pool: Django, fuentes, plantillas y planes de llenado"""
+    global _worker_filler
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    _worker_filler = _preload_filler()
+
+
+def _preload_filler():
+    from .PdfFormFiller import PDFFormFiller, get_template_cache
+    from .form_layouts import FORM_LAYOUTS
+
+    filler = PDFFormFiller()
+    for form_type in FORM_LAYOUTS:
+        filler.get_fill_plan(form_type)
+        template_path = filler.get_template_path(form_type)
+        if template_path:
+            get_template_cache().get(template_path)
+    return filler
+
+
+def render_form(form_type, payload, output_path):
+    """Rellena un formulario en el proceso actual; retorna True si se generó"""
+    global _worker_filler
+    if _worker_filler is None:
+        _worker_filler = _preload_filler()
+    try:
+        if _worker_filler.fill_pdf_form(form_type, payload, output_path):
+            return True
+    except Exception as e:
+        logger.error(f"Error rellenando la plantilla de {form_type}: {str(e)}")
+
+    # Si la plantilla oficial falta o no se pudo rellenar se usa la generación con ReportLab
+    # (mandato y trámite), igual que DocumentGenerator
+    if form_type not in ('contrato_mandato', 'formulario_tramite'):
+        return False
+    logger.warning(f"Plantilla oficial de {form_type} no disponible, usando generación por ReportLab")
+    from .DocumentGenerator import DocumentGenerator
+    generator = DocumentGenerator()
+    if form_type == 'contrato_mandato':
+        return generator._generate_contrato_mandato_fallback(
+            payload, payload.get('mandante', {}), payload.get('mandatario', {}), output_path
+        )
+    return generator._generate_formulario_tramite_fallback(payload, output_path)
+
+
+def _ping():
+    return True
+
+
+def _render_task(task):
+    """Renderiza en el proceso del pool; retorna (ok, error, segundos)"""
+    form_type, payload, output_path = task
+    started = time.perf_counter()
+    try:
+        ok, error = render_form(form_type, payload, output_path), ''
+    except Exception as e:
+        ok, error = False, str(e)
+    return ok, error, time.perf_counter() - started
+
+
+def _record_render(form_type, future):
+    """Registra en el proceso web la duración medida en el proceso del pool"""
+    try:
+        ok, _, seconds = future.result()
+    except Exception:
+        return
+    get_metrics().observe_render(form_type, seconds, ok)
+
+
+class FormRenderPool:
+    """
+    Pool de procesos que rellena formularios en paralelo. Cada proceso carga una
+    sola vez las fuentes, las plantillas y los planes compilados; con 0 workers
+    se renderiza en el proceso actual.
+    """
+
+    def __init__(self, workers=None, start_method=None):
+        self.workers = getattr(settings, 'PDF_RENDER_WORKERS', os.cpu_count() or 2) if workers is None else workers
+        # 'spawn' (o 'forkserver'): un fork del proceso web copiaría sus hilos, locks y conexiones abiertas
+        self.start_method = start_method or getattr(settings, 'PDF_RENDER_START_METHOD', 'spawn')
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_worker,
+                )
+                logger.info(f"Pool de renderizado PDF iniciado con {self.workers} procesos ({self.start_method})")
+            return self._executor
+
+    def warm_up(self):
+        """Arranca los procesos para que la primera solicitud no pague la carga de plantillas"""
+        if self.workers > 0:
+            executor = self._get_executor()
+            for _ in range(self.workers):
+                executor.submit(_ping)
+
+    def submit(self, form_type, payload, output_path):
+        """Encola un formulario y retorna un Future con (ok, error, segundos)"""
+        task = (form_type, payload, output_path)
+        if self.workers <= 0:
+            future = Future()
+            future.set_result(_render_task(task))
+        else:
+            try:
+                future = self._get_executor().submit(_render_task, task)
+            except BrokenProcessPool:
+                logger.error("El pool de renderizado PDF se rompió; se crea uno nuevo")
+                self.shutdown()
+                future = self._get_executor().submit(_render_task, task)
+        future.add_done_callback(partial(_record_render, form_type))
+        return future
+
+    def render_many(self, tasks):
+        """Renderiza [(form_type, payload, output_path)] y retorna [(ok, error)] en el mismo orden"""
+        if not tasks:
+            return []
+        if self.workers <= 0:
+            results = [_render_task(task) for task in tasks]
+        else:
+            try:
+                results = list(self._get_executor().map(_render_task, tasks))
+            except BrokenProcessPool:
+                # Un proceso murió (p. ej. por memoria): se descarta el pool y se reintenta en línea
+                logger.error("El pool de renderizado PDF se rompió; se renderiza en el proceso actual")
+                self.shutdown()
+                results = [_render_task(task) for task in tasks]
+        metrics = get_metrics()
+        for (form_type, _, _), (ok, _, seconds) in zip(tasks, results):
+            metrics.observe_render(form_type, seconds, ok)
+        return [(ok, error) for ok, error, _ in results]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Pool de renderizado compartido por el proceso"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = FormRenderPool()
+            atexit.register(_render_pool.shutdown)
+        return _render_pool
+
+
+RENDER_TIMEOUT_MESSAGE = 'El formulario no se generó a tiempo. Inténtalo de nuevo.'
+
+
+def _finish_generated_form(form_id, future, owner=None):
+    """
+    Registra el resultado del renderizado en el GeneratedForm (idempotente).
+    `owner` es el hilo que envió el trabajo: si el callback corre en otro hilo
+    (el del pool) se cierra la conexión que abrió; nunca la de una petición.
+    """
+    from django.db import connection
+    from apps.forms_generation.models import GeneratedForm
+
+    try:
+        ok, error, _ = future.result()
+    except CancelledError:
+        ok, error = False, RENDER_TIMEOUT_MESSAGE
+    except Exception as e:
+        ok, error = False, str(e)
+    try:
+        GeneratedForm.objects.filter(id=form_id, status='processing').update(
+            status='completed' if ok else 'error',
+            render_error='' if ok else (error or 'No se pudo generar el PDF'),
+        )
+    finally:
+        if owner is not None and threading.get_ident() != owner:
+            connection.close()
+
+
+def sweep_stale_forms(queryset=None):
+    """
+    Marca como error los formularios que siguen en 'processing' después de
+    PDF_RENDER_MAX_SECONDS (p. ej. el proceso que los renderizaba se reinició)
+    """
+    from apps.forms_generation.models import GeneratedForm
+
+    limit = timezone.now() - timedelta(seconds=getattr(settings, 'PDF_RENDER_MAX_SECONDS', 300))
+    queryset = GeneratedForm.objects.all() if queryset is None else queryset
+    stale = queryset.filter(status='processing', updated_at__lt=limit).update(
+        status='error', render_error=RENDER_TIMEOUT_MESSAGE
+    )
+    if stale:
+        logger.warning(f"{stale} formularios bloqueados en 'processing' se marcaron como error")
+    return stale
+
+
+def render_generated_form(generated_form, form_type, payload, timeout=None):
+    """
+    Envía el formulario al pool y espera hasta `timeout` segundos. Retorna el
+    estado resultante: 'completed', 'error' o 'processing' si sigue en curso
+    (el GeneratedForm se actualiza al terminar y la vista consulta su estado).
+    Si al vencer la espera el trabajo ni siquiera empezó, se cancela y queda en error.
+    """
+    from apps.forms_generation.models import GeneratedForm
+
+    if timeout is None:
+        timeout = getattr(settings, 'PDF_RENDER_TIMEOUT', 20)
+    sweep_stale_forms(GeneratedForm.objects.filter(user_id=generated_form.user_id))
+    output_path = os.path.join(settings.MEDIA_ROOT, generated_form.generated_file.name)
+    try:
+        future = get_render_pool().submit(form_type, payload, output_path)
+    except Exception as e:
+        logger.error(f"No se pudo enviar el formulario {generated_form.id} al pool de renderizado: {str(e)}")
+        future = Future()
+        future.set_exception(e)
+    future.add_done_callback(partial(_finish_generated_form, generated_form.id, owner=threading.get_ident()))
+    try:
+        future.result(timeout=timeout)
+    except FutureTimeoutError:
+        if future.cancel():
+            logger.warning(f"Formulario {generated_form.id} cancelado: seguía en la cola tras {timeout}s")
+        else:
+            logger.info(f"Formulario {generated_form.id} sigue renderizándose; se consultará su estado")
+    except Exception as e:
+        logger.error(f"Error renderizando el formulario {generated_form.id}: {str(e)}")
+    # El callback puede no haber corrido aún: se registra aquí también
+    if future.done():
+        _finish_generated_form(generated_form.id, future)
+    generated_form.refresh_from_db(fields=['status', 'render_error'])
+    return generated_form.status
+
+
+# ---------------------------------------------------------------------------
+# Generación en lote
+# ---------------------------------------------------------------------------
+
+class BatchGenerationResult:
+    """Formularios generados, trabajos fallidos y el archivo combinado del lote"""
+
+    def __init__(self):
+        self.forms = []
+        self.failed = []
+        self.content = b''
+        self.content_type = ''
+        self.filename = ''
+
+
+class BatchFormGenerator:
+    """
+    Genera muchos formularios en una pasada: carga los documentos en una consulta,
+    arma los datos de cada trabajo, renderiza en el pool de procesos, crea los
+    GeneratedForm con bulk_create y entrega un ZIP o un PDF combinado.
+    """
+
+    OUTPUTS = ('zip', 'pdf')
+
+    def __init__(self, user, pool=None):
+        self.user = user
+        self.pool = pool or get_render_pool()
+        self.max_jobs = getattr(settings, 'PDF_BATCH_MAX_JOBS', 50)
+
+    def generate(self, jobs, output='zip'):
+        """`jobs`: lista de {'document_id', 'form_type', 'data'}"""
+        from apps.documents.models import Document
+        from apps.forms_generation.models import GeneratedForm
+        from .form_layouts import FORM_LAYOUTS
+
+        if output not in self.OUTPUTS:
+            raise BatchGenerationError(f"Formato de salida no soportado: {output}")
+        if not jobs:
+            raise BatchGenerationError('No se recibieron formularios para generar')
+        if len(jobs) > self.max_jobs:
+            raise BatchGenerationError(f'Máximo {self.max_jobs} formularios por lote')
+
+        try:
+            document_ids = {int(job['document_id']) for job in jobs}
+        except (KeyError, TypeError, ValueError):
+            raise BatchGenerationError('Cada formulario debe indicar un document_id válido')
+        documents = Document.objects.filter(id__in=document_ids, user=self.user).in_bulk()
+        missing = document_ids - set(documents)
+        if missing:
+            raise BatchGenerationError(f'Documentos no encontrados: {sorted(missing)}')
+
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, GENERATED_DIR), exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        structured = {}
+        tasks, items = [], []
+        for index, job in enumerate(jobs):
+            form_type = job.get('form_type')
+            if not isinstance(form_type, str) or form_type not in FORM_LAYOUTS:
+                raise BatchGenerationError(f"Tipo de formulario no soportado: {form_type}")
+            if not isinstance(job.get('data') or {}, dict):
+                raise BatchGenerationError('Los datos de cada formulario deben ser un objeto JSON')
+            document = documents[int(job['document_id'])]
+            if document.id not in structured:
+                structured[document.id] = document.get_structured_data()
+            payload = build_payload(form_type, structured[document.id], job.get('data'))
+            filename = f"{form_type}_{document.id}_{timestamp}_{index + 1}.pdf"
+            tasks.append((form_type, payload, os.path.join(settings.MEDIA_ROOT, GENERATED_DIR, filename)))
+            items.append((document, form_type, filename, payload))
+
+        result = BatchGenerationResult()
+        generated = []
+        for (document, form_type, filename, payload), (ok, error) in zip(items, self.pool.render_many(tasks)):
+            if ok:
+                generated.append((document, form_type, filename, payload))
+            else:
+                result.failed.append({
+                    'document_id': document.id,
+                    'form_type': form_type,
+                    'error': error or 'No se pudo generar el PDF',
+                })
+
+        if not generated:
+            raise BatchGenerationError('No se pudo generar ningún formulario del lote')
+
+        result.forms = GeneratedForm.objects.bulk_create([
+            GeneratedForm(
+                user=self.user,
+                document=document,
+                form_type=form_type,
+                generated_file=f'{GENERATED_DIR}/{filename}',
+                placa=GeneratedForm.placa_from_data(structured[document.id]),
+            )
+            for document, form_type, filename, _ in generated
+        ])
+        paths = [os.path.join(settings.MEDIA_ROOT, GENERATED_DIR, filename) for _, _, filename, _ in generated]
+        if output == 'pdf':
+            result.content = self._merge_pdfs(paths)
+            result.content_type = 'application/pdf'
+            result.filename = f'formularios_{timestamp}.pdf'
+        else:
+            names = [self._archive_name(form_type, payload) for _, form_type, _, payload in generated]
+            result.content = self._zip(paths, names)
+            result.content_type = 'application/zip'
+            result.filename = f'formularios_{timestamp}.zip'
+
+        logger.info(
+            f"Lote de formularios: {len(result.forms)} generados, {len(result.failed)} fallidos "
+            f"(usuario {self.user.id})"
+        )
+        return result
+
+    @staticmethod
+    def _archive_name(form_type, payload):
+        vehiculo = payload.get('vehiculo') or {}
+        placa = slugify(payload.get('placa') or vehiculo.get('placa') or '').upper() or 'SIN_PLACA'
+        return f"{form_type}_{placa}.pdf"
+
+    @staticmethod
+    def _zip(paths, names):
+        buffer = io.BytesIO()
+        used = {}
+        # Los PDF ya vienen comprimidos: se guardan sin volver a comprimir
+        with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for path, name in zip(paths, names):
+                count = used.get(name, 0)
+                used[name] = count + 1
+                if count:
+                    base, ext = os.path.splitext(name)
+                    name = f"{base}_{count + 1}{ext}"
+                archive.write(path, name)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _merge_pdfs(paths):
+        from PyPDF2 import PdfWriter
+
+        writer = PdfWriter()
+        for path in paths:
+            writer.append(path)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
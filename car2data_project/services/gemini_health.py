@@ -0,0 +1,181 @@
+import time
+import logging
+import threading
+from collections import deque
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker compartido por todo el proceso alrededor del cliente de Gemini.
+    Registra éxitos, fallos y errores 429 en una ventana móvil; tras N fallos
+    consecutivos se abre y rechaza llamadas sin consultar la API hasta que pase
+    el tiempo de enfriamiento. Después deja pasar una sola llamada de prueba
+    (half-open) que decide si se cierra o vuelve a abrirse.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    CACHE_KEY = 'gemini_circuit_breaker'
+
+    def __init__(self, failure_threshold=None, cooldown_seconds=None, window_seconds=None):
+        self.failure_threshold = failure_threshold or getattr(settings, 'GEMINI_BREAKER_FAILURE_THRESHOLD', 5)
+        self.cooldown_seconds = cooldown_seconds or getattr(settings, 'GEMINI_BREAKER_COOLDOWN_SECONDS', 60)
+        self.window_seconds = window_seconds or getattr(settings, 'GEMINI_BREAKER_WINDOW_SECONDS', 300)
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_started_at = None
+        self._probe_owner = None
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """Indica si se puede llamar a Gemini ahora mismo"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.cooldown_seconds:
+                    return False
+                self._transition(self.HALF_OPEN)
+
+            # Half-open: solo una llamada de prueba a la vez
+            if self._probe_started_at is not None and now - self._probe_started_at < self.cooldown_seconds:
+                return False
+            self._probe_started_at = now
+            self._probe_owner = threading.get_ident()
+            return True
+
+    def release_probe(self):
+        """
+        Libera la llamada de prueba que tomó este hilo si terminó sin consultar a Gemini
+        (caché o pasada local); si no, el breaker quedaría en half-open hasta el enfriamiento
+        """
+        with self._lock:
+            if self._probe_owner == threading.get_ident():
+                self._probe_started_at = None
+                self._probe_owner = None
+
+    def retry_after(self):
+        """Segundos que faltan para que el breaker vuelva a dejar pasar una llamada"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                return max(0.0, self.cooldown_seconds - (now - self.opened_at))
+            if self.state == self.HALF_OPEN and self._probe_started_at is not None:
+                return max(0.0, self.cooldown_seconds - (now - self._probe_started_at))
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            self._record('success')
+            self.consecutive_failures = 0
+            self._probe_started_at = None
+            self._probe_owner = None
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+            self._publish()
+
+    def record_failure(self, rate_limited=False):
+        with self._lock:
+            self._record('rate_limited' if rate_limited else 'failure')
+            self.consecutive_failures += 1
+            self._probe_started_at = None
+            self._probe_owner = None
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self._transition(self.OPEN)
+            self._publish()
+
+    def snapshot(self):
+        """Estado actual y conteos de la ventana móvil"""
+        with self._lock:
+            return self._snapshot()
+
+    def _record(self, outcome):
+        now = time.monotonic()
+        self._events.append((now, outcome))
+        self._trim(now)
+
+    def _trim(self, now):
+        limit = now - self.window_seconds
+        while self._events and self._events[0][0] < limit:
+            self._events.popleft()
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+            logger.warning(
+                f"Circuit breaker de Gemini abierto tras {self.consecutive_failures} fallos; "
+                f"se reintentará en {self.cooldown_seconds}s"
+            )
+        elif state == self.CLOSED:
+            self.opened_at = None
+            logger.info("Circuit breaker de Gemini cerrado: servicio restablecido")
+        else:
+            logger.info("Circuit breaker de Gemini en prueba (half-open)")
+        self.state = state
+        self._publish()
+
+    def _snapshot(self):
+        now = time.monotonic()
+        self._trim(now)
+        counts = {'success': 0, 'failure': 0, 'rate_limited': 0}
+        for _, outcome in self._events:
+            counts[outcome] += 1
+        total = sum(counts.values())
+        retry_in = 0
+        if self.state == self.OPEN:
+            retry_in = max(0, int(self.cooldown_seconds - (now - self.opened_at)))
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'successes': counts['success'],
+            'failures': counts['failure'],
+            'rate_limited': counts['rate_limited'],
+            'failure_rate': round((counts['failure'] + counts['rate_limited']) / total, 3) if total else 0.0,
+            'retry_in': retry_in,
+            'window_seconds': self.window_seconds,
+            'updated_at': time.time(),
+        }
+
+    def _publish(self):
+        """Replica el estado en la caché de Django para que otros procesos lo vean"""
+        try:
+            cache.set(self.CACHE_KEY, self._snapshot(), self.window_seconds)
+        except Exception as e:
+            logger.debug(f"No se pudo publicar el estado del circuit breaker: {str(e)}")
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_gemini_breaker():
+    """Circuit breaker único del proceso para las llamadas a Gemini"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker()
+    return _breaker
+
+
+def get_gemini_status():
+    """
+    Estado de salud de Gemini para mostrar en el dashboard. Prefiere el estado
+    publicado en la caché (puede venir de los workers dedicados).
+    """
+    status = cache.get(CircuitBreaker.CACHE_KEY)
+    if status is None:
+        status = get_gemini_breaker().snapshot()
+    return status
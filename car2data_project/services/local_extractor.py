@@ -0,0 +1,173 @@
+import re
+import logging
+import unicodedata
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import pytesseract
+    from pdf2image import convert_from_path
+except ImportError:
+    pytesseract = None
+    convert_from_path = None
+
+
+class LocalExtractionResult:
+    """Campos obtenidos localmente y su origen ('texto' u 'ocr')"""
+
+    def __init__(self, tier=None):
+        self.tier = tier
+        self.tipo_documento = None
+        self.fields = {}
+
+    def set(self, section, field, value):
+        self.fields.setdefault(section, {})[field] = value
+
+    def has(self, section, field):
+        return field in self.fields.get(section, {})
+
+    def __bool__(self):
+        return bool(self.fields)
+
+
+class LocalTextExtractor:
+    """
+    Pasada local previa a Gemini: lee la capa de texto del PDF (o aplica OCR si
+    no tiene) y extrae con expresiones regulares los identificadores de formato
+    fijo. Un campo solo se acepta si la etiqueta aparece, el valor cumple el
+    formato esperado y no hay valores contradictorios en el documento.
+    """
+
+    # Cambiar al modificar los patrones: invalida la caché de extracción
+    VERSION = 'local-v2'
+
+    # (seccion, campo): (patrón con etiqueta, caracteres a eliminar, formato válido)
+    PATTERNS = {
+        ('informacion_vehiculo', 'placa'): (
+            r'\bPLACA\s*(?:NO\.?)?\s*[:.]?\s*([A-Z]{3}\s?-?\s?\d{2}[0-9A-Z])\b',
+            r'[\s\-]',
+            r'^[A-Z]{3}\d{2}[0-9A-Z]$',
+        ),
+        ('informacion_vehiculo', 'vin'): (
+            r'\bVIN\s*(?:NO\.?)?\s*[:.]?\s*([A-HJ-NPR-Z0-9]{17})\b',
+            r'\s',
+            r'^[A-HJ-NPR-Z0-9]{17}$',
+        ),
+        ('informacion_vehiculo', 'numero_motor'): (
+            r'\b(?:NO\.?|NUMERO)?\s*(?:DE\s+)?MOTOR\s*[:.]?\s*([A-Z0-9][A-Z0-9\-]{4,24})\b',
+            r'\s',
+            r'^(?=.*\d)[A-Z0-9\-]{5,25}$',
+        ),
+        ('informacion_vehiculo', 'numero_chasis'): (
+            r'\b(?:NO\.?|NUMERO)?\s*(?:DE\s+)?CHASIS\s*[:.]?\s*([A-Z0-9]{5,25})\b',
+            r'\s',
+            r'^(?=.*\d)[A-Z0-9]{5,25}$',
+        ),
+        # Campos de texto libre: la etiqueta y el valor deben ocupar la misma línea
+        ('informacion_vehiculo', 'marca'): (
+            r'(?m)^\s*MARCA\s*[:.]?[ ]*([A-Z][A-Z0-9 .\-]{1,29}?)[ ]*$',
+            r'^\s+|\s+$',
+            r'^[A-Z][A-Z0-9 .\-]{1,29}$',
+        ),
+        ('informacion_vehiculo', 'linea'): (
+            r'(?m)^\s*LINEA\s*[:.]?[ ]*([A-Z0-9][A-Z0-9 .\-/]{0,39}?)[ ]*$',
+            r'^\s+|\s+$',
+            r'^[A-Z0-9][A-Z0-9 .\-/]{0,39}$',
+        ),
+        ('informacion_vehiculo', 'modelo'): (
+            r'\bMODELO\s*[:.]?\s*((?:19|20)\d{2})\b',
+            r'\s',
+            r'^(19|20)\d{2}$',
+        ),
+        ('informacion_vehiculo', 'color'): (
+            r'(?m)^\s*COLOR\s*[:.]?[ ]*([A-Z][A-Z ]{2,39}?)[ ]*$',
+            r'^\s+|\s+$',
+            r'^[A-Z][A-Z ]{2,39}$',
+        ),
+        ('informacion_propietario', 'nombre'): (
+            r'(?m)^\s*(?:NOMBRES?\s+(?:DEL\s+)?PROPIETARIO|PROPIETARIO)\s*[:.]?[ ]*([A-Z][A-Z .]{4,79}?)[ ]*$',
+            r'^\s+|\s+$',
+            r'^[A-Z][A-Z .]{4,79}$',
+        ),
+        ('informacion_propietario', 'identificacion'): (
+            r'\b(?:C\.?\s?C\.?|CEDULA(?:\s+DE\s+CIUDADANIA)?|IDENTIFICACION)\s*(?:NO\.?)?\s*[:.]?\s*(\d{1,3}(?:[.,]?\d{3}){1,3})\b',
+            r'[\s.,]',
+            r'^\d{6,10}$',
+        ),
+    }
+
+    DOCUMENT_MARKERS = ('LICENCIA DE TRANSITO', 'TARJETA DE PROPIEDAD')
+
+    def __init__(self):
+        self.min_text_chars = getattr(settings, 'LOCAL_EXTRACTION_MIN_TEXT_CHARS', 80)
+        self.ocr_enabled = getattr(settings, 'LOCAL_OCR_ENABLED', False)
+        self.ocr_dpi = getattr(settings, 'LOCAL_OCR_DPI', 300)
+        self.ocr_lang = getattr(settings, 'LOCAL_OCR_LANG', 'spa')
+        self.ocr_max_pages = getattr(settings, 'LOCAL_OCR_MAX_PAGES', 2)
+
+    def extract(self, pdf_path) -> LocalExtractionResult:
+        """Retorna los campos que se pudieron extraer con confianza (puede estar vacío)"""
+        tier = 'texto'
+        text = self._text_layer(pdf_path)
+        if len(text.strip()) < self.min_text_chars:
+            text = self._ocr(pdf_path)
+            tier = 'ocr'
+
+        result = LocalExtractionResult(tier)
+        if not text.strip():
+            return result
+
+        normalized = self._normalize(text)
+        for (section, field), (pattern, strip, validator) in self.PATTERNS.items():
+            value = self._match_unique(normalized, pattern, strip, validator)
+            if value:
+                result.set(section, field, value)
+
+        if any(marker in normalized for marker in self.DOCUMENT_MARKERS):
+            result.tipo_documento = 'Tarjeta de Propiedad'
+
+        logger.info(f"Extracción local ({tier}): {sum(len(v) for v in result.fields.values())} campos")
+        return result
+
+    def _text_layer(self, pdf_path):
+        if PdfReader is None:
+            return ''
+        try:
+            reader = PdfReader(pdf_path)
+            return '\n'.join(page.extract_text() or '' for page in reader.pages)
+        except Exception as e:
+            logger.warning(f"No se pudo leer la capa de texto del PDF: {str(e)}")
+            return ''
+
+    def _ocr(self, pdf_path):
+        if not self.ocr_enabled or pytesseract is None or convert_from_path is None:
+            return ''
+        try:
+            images = convert_from_path(pdf_path, dpi=self.ocr_dpi, last_page=self.ocr_max_pages)
+            return '\n'.join(pytesseract.image_to_string(image, lang=self.ocr_lang) for image in images)
+        except Exception as e:
+            # Sin binarios de tesseract/poppler el OCR simplemente se omite
+            logger.warning(f"OCR local no disponible: {str(e)}")
+            return ''
+
+    @staticmethod
+    def _normalize(text):
+        text = unicodedata.normalize('NFKD', text.upper())
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+        return re.sub(r'[ \t]+', ' ', text)
+
+    @staticmethod
+    def _match_unique(text, pattern, strip, validator):
+        """Retorna el valor solo si todas las coincidencias válidas son iguales"""
+        values = set()
+        for match in re.finditer(pattern, text):
+            value = re.sub(strip, '', match.group(1))
+            if re.match(validator, value):
+                values.add(value)
+        return values.pop() if len(values) == 1 else None
@@ -0,0 +1,417 @@
+import os
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    )
+except ImportError:
+    Counter = Histogram = None
+    generate_latest = None
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 2e7, 1e8)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Etiquetas acotadas para no multiplicar series con valores que manda el cliente
+HTTP_METHODS = frozenset(('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'))
+STATUS_CLASSES = {1: '1xx', 2: '2xx', 3: '3xx', 4: '4xx', 5: '5xx'}
+
+
+class LocalMetric:
+    """Histograma o contador en memoria con el formato de texto de Prometheus (sin prometheus_client)"""
+
+    def __init__(self, kind, name, documentation, labelnames, buckets=()):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            series = sorted(
+                (key, [list(value[0]), value[1]] if self.kind == 'histogram' else value)
+                for key, value in self._series.items()
+            )
+        if self.kind == 'counter':
+            lines = [f'# HELP {self.name}_total {self.documentation}', f'# TYPE {self.name}_total counter']
+            for key, value in series:
+                lines.append(f'{self.name}_total{{{self._labels(key)}}} {value}')
+            return '\n'.join(lines) + '\n'
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, (counts, total) in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+    def _labels(self, key):
+        return ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, key))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class AppMetrics:
+    """
+    Métricas de la aplicación: peticiones HTTP (latencia y consultas a la BD por
+    vista), etapas del procesamiento de documentos, llamadas a Gemini y
+    renderizado de PDFs. Con prometheus_client y PROMETHEUS_MULTIPROC_DIR los
+    valores se comparten entre los workers de gunicorn; sin la librería cada
+    proceso expone los suyos.
+    """
+
+    def __init__(self):
+        self._local = []
+        self.request_seconds = self._metric(
+            'histogram', 'car2data_http_request_duration_seconds', 'Latencia de las peticiones por vista',
+            ('view', 'method', 'status'), DURATION_BUCKETS,
+        )
+        self.request_queries = self._metric(
+            'histogram', 'car2data_http_request_db_queries', 'Consultas a la BD por petición',
+            ('view',), QUERY_COUNT_BUCKETS,
+        )
+        self.request_db_seconds = self._metric(
+            'histogram', 'car2data_http_request_db_seconds', 'Tiempo en la BD por petición',
+            ('view',), DURATION_BUCKETS,
+        )
+        self.stage_seconds = self._metric(
+            'histogram', 'car2data_pipeline_stage_seconds', 'Duración de cada etapa del procesamiento de documentos',
+            ('stage', 'model', 'outcome'), DURATION_BUCKETS,
+        )
+        self.stage_bytes = self._metric(
+            'histogram', 'car2data_pipeline_stage_payload_bytes', 'Tamaño del payload manejado en cada etapa',
+            ('stage', 'model'), BYTES_BUCKETS,
+        )
+        self.gemini_seconds = self._metric(
+            'histogram', 'car2data_gemini_request_seconds',
+            'Llamadas a Gemini por resultado (ok, error, rate_limited = 429)',
+            ('model', 'outcome'), DURATION_BUCKETS,
+        )
+        self.render_seconds = self._metric(
+            'histogram', 'car2data_pdf_render_seconds', 'Renderizado de formularios PDF',
+            ('form_type', 'outcome'), DURATION_BUCKETS,
+        )
+        self.generated_forms = self._metric(
+            'counter', 'car2data_generated_forms', 'Formularios PDF generados',
+            ('form_type', 'outcome'),
+        )
+
+    def _metric(self, kind, name, documentation, labelnames, buckets=()):
+        if Histogram is not None:
+            if kind == 'counter':
+                return Counter(name, documentation, labelnames)
+            return Histogram(name, documentation, labelnames, buckets=buckets)
+        metric = LocalMetric(kind, name, documentation, labelnames, buckets)
+        self._local.append(metric)
+        return metric
+
+    @staticmethod
+    def _observe(metric, label_values, value):
+        if isinstance(metric, LocalMetric):
+            metric.observe(label_values, value)
+        else:
+            metric.labels(*label_values).observe(value)
+
+    @staticmethod
+    def _inc(metric, label_values, amount=1):
+        if isinstance(metric, LocalMetric):
+            metric.inc(label_values, amount)
+        else:
+            metric.labels(*label_values).inc(amount)
+
+    def observe_request(self, view, method, status_code, seconds, queries, db_seconds):
+        method = method if method in HTTP_METHODS else 'other'
+        status = STATUS_CLASSES.get(status_code // 100, 'other')
+        self._observe(self.request_seconds, (view, method, status), seconds)
+        self._observe(self.request_queries, (view,), queries)
+        self._observe(self.request_db_seconds, (view,), db_seconds)
+
+    def observe(self, stage, seconds, model_name='', outcome='ok', payload_bytes=None):
+        """Duración (y payload) de una etapa del procesamiento de documentos"""
+        model_name = model_name or ''
+        self._observe(self.stage_seconds, (stage, model_name, outcome), seconds)
+        if payload_bytes is not None:
+            self._observe(self.stage_bytes, (stage, model_name), payload_bytes)
+
+    def observe_gemini(self, model_name, seconds, outcome='ok'):
+        self._observe(self.gemini_seconds, (model_name or '', outcome), seconds)
+
+    def observe_render(self, form_type, seconds, ok):
+        outcome = 'ok' if ok else 'error'
+        self._observe(self.render_seconds, (form_type, outcome), seconds)
+        self._inc(self.generated_forms, (form_type, outcome))
+
+    def render(self):
+        """Retorna (contenido, content_type) en formato de exposición de Prometheus"""
+        if generate_latest is not None:
+            registry = REGISTRY
+            if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+                # Suma los archivos que escribe cada worker de gunicorn
+                registry = CollectorRegistry()
+                multiprocess.MultiProcessCollector(registry)
+            content = generate_latest(registry)
+        else:
+            content = ''.join(metric.render() for metric in self._local).encode('utf-8')
+        gauges = _render_database_gauges() + _render_breaker_gauges()
+        return content + gauges.encode('utf-8'), CONTENT_TYPE_LATEST
+
+
+def _render_database_gauges():
+    """Valores leídos de la BD al momento del scrape; iguales desde cualquier worker"""
+    from django.db.models import Count
+    from apps.documents.models import ExtractionJob
+    from apps.forms_generation.models import GeneratedForm
+
+    lines = []
+    try:
+        jobs = dict(
+            ExtractionJob.objects.filter(status__in=['queued', 'running'])
+            .values_list('status').annotate(total=Count('id')).order_by()
+        )
+        lines += [
+            '# HELP car2data_extraction_queue_jobs Trabajos de extracción en cola o en ejecución',
+            '# TYPE car2data_extraction_queue_jobs gauge',
+        ]
+        lines += [f'car2data_extraction_queue_jobs{{status="{status}"}} {jobs.get(status, 0)}'
+                  for status in ('queued', 'running')]
+
+        forms = GeneratedForm.objects.values_list('form_type', 'status').annotate(total=Count('id')).order_by()
+        lines += [
+            '# HELP car2data_generated_forms_stored Formularios generados guardados, por tipo y estado',
+            '# TYPE car2data_generated_forms_stored gauge',
+        ]
+        lines += [f'car2data_generated_forms_stored{{form_type="{_escape(form_type)}",status="{status}"}} {total}'
+                  for form_type, status, total in sorted(forms)]
+    except Exception as e:
+        logger.warning(f"No se pudieron leer las métricas de la BD: {str(e)}")
+        return ''
+    return '\n'.join(lines) + '\n'
+
+
+BREAKER_STATES = ('closed', 'open', 'half_open')
+
+
+def _render_breaker_gauges():
+    """Estado del circuit breaker de Gemini según el último snapshot compartido"""
+    from services.gemini_health import get_gemini_status
+
+    try:
+        status = get_gemini_status()
+        lines = [
+            '# HELP car2data_gemini_breaker_state Estado del circuit breaker de Gemini (1 = estado actual)',
+            '# TYPE car2data_gemini_breaker_state gauge',
+        ]
+        lines += [f'car2data_gemini_breaker_state{{state="{state}"}} {int(status["state"] == state)}'
+                  for state in BREAKER_STATES]
+        lines += [
+            '# HELP car2data_gemini_breaker_consecutive_failures Fallos consecutivos de Gemini',
+            '# TYPE car2data_gemini_breaker_consecutive_failures gauge',
+            f'car2data_gemini_breaker_consecutive_failures {status["consecutive_failures"]}',
+            '# HELP car2data_gemini_breaker_window_events Llamadas a Gemini en la ventana del breaker, por resultado',
+            '# TYPE car2data_gemini_breaker_window_events gauge',
+        ]
+        lines += [f'car2data_gemini_breaker_window_events{{outcome="{outcome}"}} {status[key]}'
+                  for outcome, key in (('success', 'successes'), ('failure', 'failures'), ('rate_limited', 'rate_limited'))]
+    except Exception as e:
+        logger.warning(f"No se pudo leer el estado del circuit breaker: {str(e)}")
+        return ''
+    return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = AppMetrics()
+        return _metrics
+
+
+# ---------------------------------------------------------------------------
+# Consultas a la BD por petición
+# ---------------------------------------------------------------------------
+
+class QueryCounter:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_queries = threading.local()
+
+
+def query_counter():
+    """Contador acumulado de consultas del hilo actual (la petición lee la diferencia)"""
+    counter = getattr(_queries, 'counter', None)
+    if counter is None:
+        counter = _queries.counter = QueryCounter()
+    return counter
+
+
+def _count_query(execute, sql, params, many, context):
+    counter = query_counter()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.count += 1
+        counter.seconds += time.perf_counter() - started
+
+
+def install_query_counter(sender=None, connection=None, **kwargs):
+    """Receptor de connection_created: agrega el contador una sola vez por conexión"""
+    if connection is not None and _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+# ---------------------------------------------------------------------------
+# Trazas por documento
+# ---------------------------------------------------------------------------
+
+class Span:
+    """Una etapa medida: nombre, inicio, duración, modelo, payload y resultado"""
+
+    def __init__(self, stage, model_name='', payload_bytes=None):
+        self.stage = stage
+        self.model_name = model_name or ''
+        self.payload_bytes = payload_bytes
+        self.outcome = 'ok'
+        self.started_at = timezone.now()
+        self.duration = 0.0
+
+    def set(self, **attributes):
+        """Completa atributos conocidos recién al final de la etapa (p. ej. bytes enviados)"""
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+
+class PipelineTrace:
+    """Spans de un documento; se guardan juntos como ProcessingSpan al cerrar la traza"""
+
+    def __init__(self, document_id):
+        self.document_id = document_id
+        self.spans = []
+
+    def flush(self):
+        if not self.spans or not getattr(settings, 'PIPELINE_SPANS_ENABLED', True):
+            return
+        from apps.documents.models import ProcessingSpan
+
+        spans, self.spans = self.spans, []
+        try:
+            ProcessingSpan.objects.bulk_create([
+                ProcessingSpan(
+                    document_id=self.document_id,
+                    stage=span.stage,
+                    started_at=span.started_at,
+                    duration_ms=span.duration * 1000,
+                    payload_bytes=span.payload_bytes,
+                    model_name=span.model_name[:100],
+                    outcome=span.outcome,
+                )
+                for span in spans
+            ])
+        except Exception as e:
+            logger.warning(f"No se pudieron guardar los tiempos del documento {self.document_id}: {str(e)}")
+
+
+_active = threading.local()
+
+
+def current_trace():
+    return getattr(_active, 'trace', None)
+
+
+@contextmanager
+def trace_document(document):
+    """Agrupa las etapas medidas en este hilo bajo el documento; reutiliza la traza abierta"""
+    trace = current_trace()
+    if trace is not None and trace.document_id == document.id:
+        yield trace
+        return
+
+    previous, _active.trace = trace, PipelineTrace(document.id)
+    try:
+        yield _active.trace
+    finally:
+        _active.trace.flush()
+        _active.trace = previous
+
+
+@contextmanager
+def stage(name, model_name='', payload_bytes=None):
+    """Mide una etapa: siempre alimenta las métricas y, si hay traza abierta, la guarda por documento"""
+    span = Span(name, model_name, payload_bytes)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        span.outcome = 'error'
+        raise
+    finally:
+        span.duration = time.perf_counter() - started
+        _finish(span)
+
+
+def record_stage(name, seconds, document=None, model_name='', payload_bytes=None, outcome='ok'):
+    """Registra una etapa medida por fuera (espera en cola, subida del archivo)"""
+    span = Span(name, model_name, payload_bytes)
+    span.duration = max(0.0, seconds)
+    span.outcome = outcome
+    span.started_at = timezone.now() - timedelta(seconds=span.duration)
+    trace = current_trace()
+    if document is not None and (trace is None or trace.document_id != document.id):
+        single = PipelineTrace(document.id)
+        single.spans.append(span)
+        get_metrics().observe(span.stage, span.duration, span.model_name, span.outcome, span.payload_bytes)
+        single.flush()
+        return
+    _finish(span)
+
+
+def _finish(span):
+    try:
+        get_metrics().observe(span.stage, span.duration, span.model_name, span.outcome, span.payload_bytes)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la métrica de la etapa {span.stage}: {str(e)}")
+    trace = current_trace()
+    if trace is not None:
+        trace.spans.append(span)
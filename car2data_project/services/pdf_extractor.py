@@ -1,19 +1,183 @@
 import os
-import base64
 import json
 import logging
 import re
+import time
+import threading
 import google.generativeai as genai
 from django.conf import settings
+from .extraction_cache import ExtractionCache
+from .gemini_health import get_gemini_breaker
+from .local_extractor import LocalTextExtractor
+from .metrics import get_metrics, stage
+from .pdf_preprocessing import PdfPreprocessor
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL = 'gemini-1.5-flash'
+
+_configured_api_key = None
+_configure_lock = threading.Lock()
+
+
+def _configure_genai(api_key):
+    """Configura el SDK de Gemini solo cuando cambia la API key"""
+    global _configured_api_key
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+
+
+def current_model_name():
+    return os.environ.get('GEMINI_MODEL', DEFAULT_MODEL)
+
+
+def build_prompt(header, schema):
+    """Arma el prompt con el formato JSON esperado para los campos indicados"""
+    return f"{header}\n{json.dumps(schema, indent=4, ensure_ascii=False)}\n\nDocumento a analizar:\n"
+
+
+def build_response_schema(schema):
+    """Convierte el esquema de campos en el response_schema (OpenAPI) del modo JSON de Gemini"""
+    if isinstance(schema, dict):
+        return {
+            'type': 'object',
+            'properties': {key: build_response_schema(value) for key, value in schema.items()},
+            'required': list(schema),
+        }
+    return {'type': 'string', 'description': schema}
+
+
+def subset_schema(schema, keys):
+    """Esquema con solo los campos indicados como (sección, campo); campo None para valores de primer nivel"""
+    subset = {}
+    for section, field in keys:
+        if field is None:
+            subset[section] = schema[section]
+        else:
+            subset.setdefault(section, {})[field] = schema[section][field]
+    return subset
+
+
+class PreparedContent:
+    """Contenido listo para Gemini y los tamaños usados para medir el payload"""
+
+    def __init__(self, content, original_bytes, payload_bytes, uploaded_file=None):
+        self.content = content
+        self.original_bytes = original_bytes
+        self.payload_bytes = payload_bytes
+        self.uploaded_file = uploaded_file
+
+    def describe(self):
+        if self.uploaded_file is not None:
+            return "subido con la File API"
+        return f"{self.payload_bytes} bytes enviados ({self.content[1]['mime_type']})"
+
+
 class PDFExtractor:
     """
     Servicio para extraer información de PDFs de tarjeta de propiedad usando únicamente Gemini Vision
     """
     
-    def __init__(self):
+    # Prompt especializado para tarjeta de propiedad
+    PROMPT_HEADER = """
+        Eres un experto en análisis de documentos vehiculares colombianos. Analiza el siguiente documento PDF
+        y extrae ÚNICAMENTE la información que esté explícitamente mencionada en la tarjeta de propiedad.
+
+        ⚠️ Reglas:
+        - Si un dato no aparece, responde exactamente "No disponible"
+        - Devuelve SOLO un JSON válido, sin explicaciones ni texto adicional
+        - No inventes información, solo toma lo que esté en el documento
+
+        Formato de salida esperado:
+"""
+
+    # Campos a extraer por sección con la descripción que recibe Gemini
+    FIELD_SCHEMA = {
+        "tipo_documento": "Debe ser 'Tarjeta de Propiedad' o similar si se identifica",
+        "informacion_vehiculo": {
+            "placa": "Es el identificador único de un vehículo, generalmente compuesto por letras y números, asignado por la autoridad de tránsito",
+            "marca": "Nombre del fabricante del vehículo, como CHEVROLET, Toyota, Ford, etc.",
+            "linea": "Subdivisión de una marca que agrupa vehículos con características similares, por ejemplo, la línea SAIL.",
+            "modelo": "Año en que el vehículo fue fabricado.",
+            "cilindrada_cc": "El volumen total en centímetros cúbicos (cc) de los cilindros del motor.",
+            "color": "El color principal de la carrocería del vehículo.",
+            "clase_vehiculo": "Clasificación general del tipo de vehículo, como automóvil, motocicleta, camión, etc.",
+            "tipo_carroceria": "Se refiere a la estructura principal y forma del vehículo, por ejemplo, SEDAN, hatchback, SUV, etc.",
+            "numero_motor": "Identificador alfanumérico único grabado en el motor.",
+            "reg_numero_motor": "Campo REG asociado a número de motor. Devuelve solo 'S' (sí) o 'N' (no).",
+            "servicio": "Indica el uso que se le da al vehículo, como particular, público, diplomático, etc.",
+            "combustible": "El tipo de carburante que utiliza el motor, como gasolina, diésel, o eléctrico.",
+            "capacidad_kg_psj": "La capacidad de carga del vehículo, expresada en kilogramos (Kg) o el número de pasajeros (PSJ) que puede transportar.",
+            "vin": "Es un código de identificación único mundialmente para cada vehículo automotor.",
+            "numero_serie": "Identificador único del vehículo que se usa para su seguimiento y registro.",
+            "reg_numero_serie": "Campo REG asociado a número de serie. Devuelve solo 'S' (sí) o 'N' (no).",
+            "numero_chasis": "Identificador único del vehículo que se usa para su seguimiento y registro.",
+            "reg_numero_chasis": "Campo REG asociado a número de chasis. Devuelve solo 'S' (sí) o 'N' (no).",
+            "potencia_hp": "La potencia del motor expresada en caballos de fuerza (HP).",
+            "puertas": "El número de puertas que tiene el vehículo."
+        },
+        "informacion_propietario": {
+            "nombre": "Nombre(s) y apellido(s) de la persona o entidad legal propietaria del vehículo.",
+            "identificacion": "El número de documento de identidad del propietario, como una cédula de ciudadanía (C.C.).",
+            "direccion": "La dirección de residencia del propietario del vehículo.",
+            "telefono": "El número de teléfono de contacto del propietario del vehículo.",
+            "ciudad": "La ciudad de residencia del propietario del vehículo."
+        },
+        "detalles_registro": {
+            "licencia_transito_numero": "El número único de la licencia de tránsito del vehículo.",
+            "declaracion_importacion": "Código o número que identifica el documento aduanero que valida la entrada legal del vehículo al país.",
+            "fecha_importacion": "La fecha en que se realizó la declaración de importación del vehículo.",
+            "fecha_matricula": "La fecha en que el vehículo fue registrado por primera vez ante la autoridad de tránsito.",
+            "fecha_expedicion_licencia": "Fecha en que se emitió el documento de la licencia de tránsito.",
+            "organismo_transito": "La entidad u oficina de tránsito responsable de expedir la matrícula y la licencia."
+        },
+        "restricciones_limitaciones": {
+            "restriccion_movilidad": "Indica si el vehículo tiene alguna limitación para circular, a menudo relacionada con normas ambientales o de seguridad.",
+            "blindaje": "Se refiere al nivel de protección balística del vehículo.",
+            "limitacion_propiedad": "Indica si el vehículo tiene alguna restricción legal, como un embargo, prenda o algún tipo de gravamen."
+        }
+    }
+
+    # Formato esperado por campo, sobre el valor ya normalizado; un valor que no cumple se vuelve a pedir a Gemini
+    NOT_AVAILABLE = 'No disponible'
+    DATE_PATTERN = r'^\d{1,4}[/\-.]\d{1,2}[/\-.]\d{1,4}$'
+    FIELD_VALIDATORS = {
+        # Particulares y públicos (ABC123), motos (ABC12D, ABC12), diplomáticos y antiguos (AB1234), remolques (R12345)
+        ('informacion_vehiculo', 'placa'): r'^([A-Z]{3}\d{2}[0-9A-Z]?|[A-Z]{2}\d{4}|[RST]\d{5})$',
+        ('informacion_vehiculo', 'modelo'): r'^(19|20)\d{2}$',
+        ('informacion_vehiculo', 'vin'): r'^[A-HJ-NPR-Z0-9]{17}$',
+        ('informacion_vehiculo', 'cilindrada_cc'): r'^\d{2,5}$',
+        ('informacion_vehiculo', 'puertas'): r'^\d{1,2}$',
+        ('informacion_vehiculo', 'reg_numero_motor'): r'^[SN]$',
+        ('informacion_vehiculo', 'reg_numero_serie'): r'^[SN]$',
+        ('informacion_vehiculo', 'reg_numero_chasis'): r'^[SN]$',
+        # Cédula, cédula de extranjería o NIT con dígito de verificación
+        ('informacion_propietario', 'identificacion'): r'^\d{5,15}(-\d)?$',
+        ('detalles_registro', 'fecha_importacion'): DATE_PATTERN,
+        ('detalles_registro', 'fecha_matricula'): DATE_PATTERN,
+        ('detalles_registro', 'fecha_expedicion_licencia'): DATE_PATTERN,
+    }
+
+    # Normalización previa a la validación
+    YES_NO = {'SI': 'S', 'SÍ': 'S', 'S': 'S', 'NO': 'N', 'N': 'N'}
+    REG_FIELDS = ('reg_numero_motor', 'reg_numero_serie', 'reg_numero_chasis')
+    DATE_FIELDS = ('fecha_importacion', 'fecha_matricula', 'fecha_expedicion_licencia')
+    DOCUMENT_PREFIX = re.compile(r'^(C\.?\s?C|C\.?\s?E|T\.?\s?I|NIT|PAS(APORTE)?)\.?\s*(NO\.?|N[°º]|#|:)?\s*')
+    DISPLACEMENT_UNIT = re.compile(r'\s*(C\.?\s?C|CM3|CENT[IÍ]METROS C[UÚ]BICOS)\.?$')
+    MONTHS = {
+        'ENE': 1, 'FEB': 2, 'MAR': 3, 'ABR': 4, 'MAY': 5, 'JUN': 6,
+        'JUL': 7, 'AGO': 8, 'SEP': 9, 'SET': 9, 'OCT': 10, 'NOV': 11, 'DIC': 12,
+    }
+    # Campos con valor que no cumplió el formato: se conservan tal cual y se listan aquí
+    REVIEW_KEY = 'campos_por_revisar'
+
+    BASE_PROMPT = build_prompt(PROMPT_HEADER, FIELD_SCHEMA)
+    RESPONSE_FORMAT = 'json-schema-v2'
+    PROMPT_VERSION = ExtractionCache.prompt_version(BASE_PROMPT + LocalTextExtractor.VERSION + RESPONSE_FORMAT)
+
+    def __init__(self, model_name=None):
         # Usar la configuración de Django
         self.api_key = getattr(settings, 'GEMINI_API_KEY', '')
         if not self.api_key:
@@ -21,11 +185,11 @@ class PDFExtractor:
             raise ValueError("La clave de API de Gemini no está configurada en los ajustes")
         # Configurar Gemini
         try:
-            # Configurar con la API key
-            genai.configure(api_key=self.api_key)
+            # Configurar con la API key (una sola vez por proceso)
+            _configure_genai(self.api_key)
             
             # Permitir configurar el modelo por variable de entorno; default a un modelo estable
-            model_name = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
+            model_name = model_name or current_model_name()
             try:
                 self.model = genai.GenerativeModel(model_name)
             except Exception:
@@ -39,101 +203,288 @@ class PDFExtractor:
                     fallback = 'gemini-2.0-flash'
                     self.model = genai.GenerativeModel(fallback)
                     model_name = fallback
+            self.model_name = model_name
             logger.info(f"Gemini configurado correctamente con {model_name}")
                 
         except Exception as e:
             logger.error(f"Error en la respuesta de Gemini: {str(e)}")
             raise Exception(f"Error al procesar el documento con la inteligencia artificial: {str(e)}")
-        
-        # Prompt especializado para tarjeta de propiedad
-        self.base_prompt = """
-        
-        Eres un experto en análisis de documentos vehiculares colombianos. Analiza el siguiente documento PDF
-        y extrae ÚNICAMENTE la información que esté explícitamente mencionada en la tarjeta de propiedad.
 
-        ⚠️ Reglas:
-        - Si un dato no aparece, responde exactamente "No disponible"
-        - Devuelve SOLO un JSON válido, sin explicaciones ni texto adicional
-        - No inventes información, solo toma lo que esté en el documento
+        self.cache = ExtractionCache()
+        self.breaker = get_gemini_breaker()
+        self.local_extractor = LocalTextExtractor()
+        self.local_required_fields = getattr(settings, 'LOCAL_REQUIRED_FIELDS', ())
+        self.preprocessor = PdfPreprocessor()
+        self.upload_threshold = getattr(settings, 'GEMINI_FILE_UPLOAD_THRESHOLD', 15 * 1024 * 1024)
+        self.reask_attempts = getattr(settings, 'GEMINI_REASK_ATTEMPTS', 1)
+        self._local = threading.local()
 
-        Formato de salida esperado:
+    @property
+    def last_call_failed(self) -> bool:
+        """Indica si la última llamada a Gemini de este hilo falló"""
+        return getattr(self._local, 'last_call_failed', False)
 
-        {
-            "tipo_documento": "Debe ser 'Tarjeta de Propiedad' o similar si se identifica",
-            "informacion_vehiculo": {
-                "placa": "Es el identificador único de un vehículo, generalmente compuesto por letras y números, asignado por la autoridad de tránsito",
-                "marca": "Nombre del fabricante del vehículo, como CHEVROLET, Toyota, Ford, etc.",
-                "linea": "Subdivisión de una marca que agrupa vehículos con características similares, por ejemplo, la línea SAIL.",
-                "modelo": "Año en que el vehículo fue fabricado.",
-                "cilindrada_cc": "El volumen total en centímetros cúbicos (cc) de los cilindros del motor.",
-                "color": "El color principal de la carrocería del vehículo.",
-                "clase_vehiculo": "Clasificación general del tipo de vehículo, como automóvil, motocicleta, camión, etc.",
-                "tipo_carroceria": "Se refiere a la estructura principal y forma del vehículo, por ejemplo, SEDAN, hatchback, SUV, etc.",
-                "numero_motor": "Identificador alfanumérico único grabado en el motor.",
-                "reg_numero_motor": "Campo REG asociado a número de motor. Devuelve solo 'S' (sí) o 'N' (no).",
-                "servicio": "Indica el uso que se le da al vehículo, como particular, público, diplomático, etc.",
-                "combustible": "El tipo de carburante que utiliza el motor, como gasolina, diésel, o eléctrico.",
-                "capacidad_kg_psj": "La capacidad de carga del vehículo, expresada en kilogramos (Kg) o el número de pasajeros (PSJ) que puede transportar.",
-                "vin": "Es un código de identificación único mundialmente para cada vehículo automotor.",
-                "numero_serie": "Identificador único del vehículo que se usa para su seguimiento y registro.",
-                "reg_numero_serie": "Campo REG asociado a número de serie. Devuelve solo 'S' (sí) o 'N' (no).",
-                "numero_chasis": "Identificador único del vehículo que se usa para su seguimiento y registro.",
-                "reg_numero_chasis": "Campo REG asociado a número de chasis. Devuelve solo 'S' (sí) o 'N' (no).",
-                "potencia_hp": "La potencia del motor expresada en caballos de fuerza (HP).",
-                "puertas": "El número de puertas que tiene el vehículo."
-            },
-            "informacion_propietario": {
-                "nombre": "Nombre(s) y apellido(s) de la persona o entidad legal propietaria del vehículo.",
-                "identificacion": "El número de documento de identidad del propietario, como una cédula de ciudadanía (C.C.).",
-                "direccion": "La dirección de residencia del propietario del vehículo.",
-                "telefono": "El número de teléfono de contacto del propietario del vehículo.",
-                "ciudad": "La ciudad de residencia del propietario del vehículo."
-            },
-            "detalles_registro": {
-                "licencia_transito_numero": "El número único de la licencia de tránsito del vehículo.",
-                "declaracion_importacion": "Código o número que identifica el documento aduanero que valida la entrada legal del vehículo al país.",
-                "fecha_importacion": "La fecha en que se realizó la declaración de importación del vehículo.",
-                "fecha_matricula": "La fecha en que el vehículo fue registrado por primera vez ante la autoridad de tránsito.",
-                "fecha_expedicion_licencia": "Fecha en que se emitió el documento de la licencia de tránsito.",
-                "organismo_transito": "La entidad u oficina de tránsito responsable de expedir la matrícula y la licencia."
-            },
-            "restricciones_limitaciones": {
-                "restriccion_movilidad": "Indica si el vehículo tiene alguna limitación para circular, a menudo relacionada con normas ambientales o de seguridad.",
-                "blindaje": "Se refiere al nivel de protección balística del vehículo.",
-                "limitacion_propiedad": "Indica si el vehículo tiene alguna restricción legal, como un embargo, prenda o algún tipo de gravamen."
+    @last_call_failed.setter
+    def last_call_failed(self, value: bool):
+        self._local.last_call_failed = value
+
+    @staticmethod
+    def _is_rate_limited(error) -> bool:
+        """Indica si el error corresponde a un 429 (cuota agotada)"""
+        try:
+            from google.api_core.exceptions import ResourceExhausted
+            return isinstance(error, ResourceExhausted)
+        except Exception:
+            return False
+
+    def prompt_for(self, requested: dict = None) -> str:
+        """Prompt para el subconjunto de campos solicitado (todos por defecto)"""
+        if not requested or requested == self.FIELD_SCHEMA:
+            return self.BASE_PROMPT
+        return build_prompt(self.PROMPT_HEADER, requested)
+
+    def generation_config_for(self, requested: dict = None):
+        """Modo JSON de Gemini con el esquema de respuesta de los campos solicitados"""
+        return genai.GenerationConfig(
+            response_mime_type='application/json',
+            response_schema=build_response_schema(requested or self.FIELD_SCHEMA),
+        )
+
+    def _generate(self, content, generation_config=None):
+        """Llama a Gemini registrando el resultado en el circuit breaker"""
+        started = time.perf_counter()
+        try:
+            response = self.model.generate_content(content, generation_config=generation_config)
+        except Exception as e:
+            rate_limited = self._is_rate_limited(e)
+            get_metrics().observe_gemini(
+                self.model_name, time.perf_counter() - started, 'rate_limited' if rate_limited else 'error'
+            )
+            self.last_call_failed = True
+            self.breaker.record_failure(rate_limited=rate_limited)
+            raise
+        get_metrics().observe_gemini(self.model_name, time.perf_counter() - started)
+        self.last_call_failed = False
+        self.breaker.record_success()
+        return response
+
+    def build_content(self, pdf_data: bytes, requested: dict = None) -> list:
+        """Arma el contenido (prompt + página de la tarjeta o PDF) que se envía a Gemini"""
+        mime_type, payload = self.preprocessor.prepare(pdf_data)
+        # El SDK acepta bytes directamente; codificar en base64 solo duplicaba el PDF en memoria
+        return [
+            self.prompt_for(requested),
+            {
+                "mime_type": mime_type,
+                "data": payload
             }
-        }
+        ]
 
-        Documento a analizar:
+    def prepare_content(self, pdf_path: str, requested: dict = None) -> PreparedContent:
         """
+        Prepara el contenido para un PDF en disco. Los archivos que superan
+        GEMINI_FILE_UPLOAD_THRESHOLD se suben con la File API en vez de cargarse
+        en memoria, lo que acota la memoria por trabajo a ese umbral.
+        """
+        original_bytes = os.path.getsize(pdf_path)
+        if self.upload_threshold and original_bytes > self.upload_threshold:
+            uploaded_file = genai.upload_file(pdf_path, mime_type='application/pdf')
+            return PreparedContent(
+                [self.prompt_for(requested), uploaded_file], original_bytes, 0, uploaded_file
+            )
+
+        with open(pdf_path, 'rb') as file:
+            pdf_data = file.read()
+        content = self.build_content(pdf_data, requested)
+        return PreparedContent(content, original_bytes, len(content[1]['data']))
 
-    def _analyze_with_vision(self, pdf_path: str) -> dict:
+    def release_content(self, prepared: PreparedContent):
+        """Elimina de Gemini el archivo subido con la File API, si lo hay"""
+        if prepared.uploaded_file is None:
+            return
+        try:
+            genai.delete_file(prepared.uploaded_file.name)
+        except Exception as e:
+            logger.warning(f"No se pudo eliminar el archivo subido a Gemini: {str(e)}")
+
+    def _analyze_with_vision(self, pdf_path: str, requested: dict = None) -> dict:
         """Analiza el PDF directamente con Gemini Vision"""
+        requested = requested or self.FIELD_SCHEMA
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_data = file.read()
-                pdf_base64 = base64.b64encode(pdf_data).decode('utf-8')
-            
-            content = [
-                self.base_prompt,
-                {
-                    "mime_type": "application/pdf",
-                    "data": pdf_base64
-                }
-            ]
-            
-            response = self.model.generate_content(content)
-            
-            if response and response.text:
+            started = time.monotonic()
+            with stage('prepare_payload') as span:
+                prepared = self.prepare_content(pdf_path, requested)
+                span.set(payload_bytes=prepared.original_bytes)
+            try:
+                with stage('gemini_request', self.model_name, prepared.payload_bytes):
+                    response = self._generate(prepared.content, self.generation_config_for(requested))
+                logger.info(
+                    f"Payload Gemini: PDF {prepared.original_bytes} bytes -> {prepared.describe()}; "
+                    f"latencia {(time.monotonic() - started) * 1000:.0f} ms"
+                )
+                if not (response and response.text):
+                    return self.create_default_structure("Sin respuesta de Vision")
+
                 logger.info("Análisis con Vision completado")
-                return self.clean_and_parse_json(response.text)
-            else:
-                return self.create_default_structure("Sin respuesta de Vision")
+                with stage('parse_response', self.model_name, len(response.text)):
+                    data = self.parse_response(response.text)
+                self._reask_invalid(data, requested, prepared)
+            finally:
+                self.release_content(prepared)
+
+            return self.sanitize(data, requested)
                 
         except Exception as e:
             logger.error(f"Error en análisis con Vision: {str(e)}")
             return self.create_default_structure(f"Error en Vision: {str(e)}")
     
+    def _reask_invalid(self, data: dict, requested: dict, prepared: PreparedContent):
+        """Vuelve a pedir solo los campos faltantes o inválidos reutilizando el payload ya preparado"""
+        for _ in range(self.reask_attempts):
+            invalid = self.find_invalid_fields(data, requested)
+            if not invalid:
+                return
+            subset = subset_schema(requested, invalid)
+            logger.info(f"Re-consultando {len(invalid)} campos faltantes o inválidos")
+            try:
+                with stage('gemini_reask', self.model_name):
+                    retry = self._generate(
+                        [self.prompt_for(subset), prepared.content[1]], self.generation_config_for(subset)
+                    )
+            except Exception as e:
+                # La re-consulta es opcional: se conserva la primera respuesta
+                logger.warning(f"La re-consulta a Gemini falló; se conserva la primera respuesta: {str(e)}")
+                self.last_call_failed = False
+                return
+            if retry and retry.text:
+                self.merge_response(data, self.parse_response(retry.text), invalid)
+
+    def parse_response(self, response_text: str) -> dict:
+        """Parsea la respuesta del modo JSON; un JSON inválido equivale a no tener campos"""
+        try:
+            data = json.loads(response_text)
+        except json.JSONDecodeError:
+            try:
+                data = self.clean_and_parse_json(response_text)
+            except Exception:
+                logger.warning("Respuesta de Gemini no es JSON válido")
+                return {}
+            if self.is_fallback_result(data):
+                return {}
+        return data if isinstance(data, dict) else {}
+
+    def normalize_value(self, section: str, field: str, value):
+        """
+        Forma canónica de un valor antes de validarlo: sin prefijos de documento,
+        separadores ni unidades, fechas en texto como dd/mm/aaaa y SI/NO como S/N
+        """
+        if not isinstance(value, str):
+            return value
+        text = ' '.join(value.split())
+        if not text or text == self.NOT_AVAILABLE:
+            return text
+        upper = text.upper()
+        if field in ('placa', 'vin'):
+            return re.sub(r'[\s\-.]', '', upper)
+        if field in self.REG_FIELDS:
+            return self.YES_NO.get(upper.rstrip('.'), text)
+        if field == 'identificacion':
+            number = re.sub(r'[\s.,]', '', self.DOCUMENT_PREFIX.sub('', upper))
+            return number if re.match(r'^\d[\d\-]*$', number) else text
+        if field == 'cilindrada_cc':
+            number = re.sub(r'[.,](?=\d{3}$)', '', self.DISPLACEMENT_UNIT.sub('', upper))
+            return number if number.isdigit() else text
+        if field == 'modelo':
+            match = re.search(r'\b(19|20)\d{2}\b', upper)
+            return match.group() if match else text
+        if field == 'puertas':
+            match = re.match(r'^(\d{1,2})\s*(PUERTAS?)?$', upper)
+            return match.group(1) if match else text
+        if field in self.DATE_FIELDS:
+            return self._normalize_date(upper) or text
+        return text
+
+    def _normalize_date(self, text: str):
+        """'15 de marzo de 2019', '15-MAR-2019' o '15 MAR. 2019' -> '15/03/2019'; None si no es una fecha en texto"""
+        parts = [part for part in re.split(r'[\s/\-.,]+', re.sub(r'\b(DE|DEL)\b', ' ', text)) if part]
+        if len(parts) != 3:
+            return None
+        day, month, year = parts
+        month = self.MONTHS.get(month[:3])
+        if not (day.isdigit() and year.isdigit() and month and len(year) == 4):
+            return None
+        return f"{int(day):02d}/{month:02d}/{year}"
+
+    def is_valid_value(self, section: str, field: str, value) -> bool:
+        """Valida el tipo y formato de un campo ya normalizado ('No disponible' siempre es válido)"""
+        value = self.normalize_value(section, field, value)
+        if not isinstance(value, str) or not value.strip():
+            return False
+        if value == self.NOT_AVAILABLE:
+            return True
+        pattern = self.FIELD_VALIDATORS.get((section, field))
+        return pattern is None or re.match(pattern, value.upper()) is not None
+
+    def find_invalid_fields(self, data: dict, requested: dict) -> list:
+        """Campos solicitados que faltan o no cumplen el formato, como (sección, campo)"""
+        invalid = []
+        for section, fields in requested.items():
+            if not isinstance(fields, dict):
+                if not self.is_valid_value(section, None, data.get(section)):
+                    invalid.append((section, None))
+                continue
+            values = data.get(section) if isinstance(data.get(section), dict) else {}
+            for field in fields:
+                if not self.is_valid_value(section, field, values.get(field)):
+                    invalid.append((section, field))
+        return invalid
+
+    def merge_response(self, data: dict, retry_data: dict, keys: list):
+        """Incorpora a `data` los campos re-consultados"""
+        for section, field in keys:
+            if field is None:
+                if section in retry_data:
+                    data[section] = retry_data[section]
+                continue
+            retry_section = retry_data.get(section)
+            if isinstance(retry_section, dict) and field in retry_section:
+                if not isinstance(data.get(section), dict):
+                    data[section] = {}
+                data[section][field] = retry_section[field]
+
+    def sanitize(self, data: dict, requested: dict) -> dict:
+        """
+        Deja los campos en su forma normalizada. Los que faltan quedan como 'No disponible';
+        los que siguen sin cumplir el formato conservan el valor leído y se listan en
+        `campos_por_revisar` para que el usuario los verifique.
+        """
+        for section, fields in requested.items():
+            if isinstance(fields, dict) and isinstance(data.get(section), dict):
+                values = data[section]
+                for field in fields:
+                    if field in values and self.is_valid_value(section, field, values[field]):
+                        values[field] = self.normalize_value(section, field, values[field])
+
+        flagged = []
+        for section, field in self.find_invalid_fields(data, requested):
+            if field is None:
+                value = data.get(section)
+            else:
+                value = data[section].get(field) if isinstance(data.get(section), dict) else None
+            if isinstance(value, str) and value.strip():
+                flagged.append(section if field is None else f"{section}.{field}")
+                continue
+            if field is None:
+                data[section] = self.NOT_AVAILABLE
+            else:
+                if not isinstance(data.get(section), dict):
+                    data[section] = {}
+                data[section][field] = self.NOT_AVAILABLE
+        if flagged:
+            logger.info(f"Campos con formato inesperado, se conservan para revisión: {', '.join(flagged)}")
+            data[self.REVIEW_KEY] = flagged
+        return data
+
     def clean_and_parse_json(self, response_text: str) -> dict:
         """Limpia y parsea la respuesta JSON de Gemini"""
         try:
@@ -199,25 +550,184 @@ class PDFExtractor:
             "observaciones": f"Respuesta original: {raw_response[:300]}..."
         }
     
-    def extract_vehicle_info(self, pdf_path: str) -> dict:
-        """Extrae información vehicular de un PDF usando Gemini Vision"""
-        logger.info(f"Iniciando análisis de PDF con Gemini Vision: {pdf_path}")
-        return self._analyze_with_vision(pdf_path)
+    def cache_key_for(self, pdf_path: str):
+        """(hash del contenido, clave de caché) del PDF; (None, None) si no se puede leer"""
+        try:
+            content_hash = ExtractionCache.hash_file(pdf_path)
+        except OSError as e:
+            logger.warning(f"No se pudo calcular el hash del PDF: {str(e)}")
+            return None, None
+        return content_hash, ExtractionCache.make_key(content_hash, self.model_name, self.PROMPT_VERSION)
+
+    def get_cached_result(self, pdf_path: str, cache_key=None):
+        """
+        Retorna la extracción cacheada para este PDF o None.
+        `cache_key` reutiliza un par de cache_key_for() ya calculado para no volver a leer el PDF.
+        """
+        try:
+            _, key = cache_key or self.cache_key_for(pdf_path)
+            return self.cache.get(key) if key else None
+        except Exception as e:
+            logger.warning(f"No se pudo consultar la caché de extracción: {str(e)}")
+            return None
+
+    def is_fallback_result(self, data: dict) -> bool:
+        """Indica si el resultado es la estructura por defecto generada ante un error"""
+        return data.get('tipo_documento') == 'No identificado' and 'observaciones' in data
+
+    def plan_extraction(self, pdf_path: str):
+        """
+        Ejecuta la pasada local y decide qué pedir a Gemini.
+        Retorna (resultado_local, campos_solicitados); None cuando la pasada local
+        encontró el tipo de documento y todos los LOCAL_REQUIRED_FIELDS, en cuyo caso
+        se omite Gemini y el resto de campos queda como 'No disponible'.
+        """
+        local = self.local_extractor.extract(pdf_path)
+        if local.tipo_documento and self.local_required_fields and all(
+            local.has(*field.split('.', 1)) for field in self.local_required_fields
+        ):
+            return local, None
+
+        missing = {}
+        for section, fields in self.FIELD_SCHEMA.items():
+            if not isinstance(fields, dict):
+                if section == 'tipo_documento' and local.tipo_documento:
+                    continue
+                missing[section] = fields
+                continue
+            pending = {field: description for field, description in fields.items() if not local.has(section, field)}
+            if pending:
+                missing[section] = pending
+
+        return local, missing or None
+
+    def merge_results(self, local, gemini_data: dict = None) -> dict:
+        """
+        Combina la pasada local con la respuesta de Gemini sobre el esquema completo.
+        `origen_campos` indica qué nivel ('texto', 'ocr' o 'gemini') aportó cada campo.
+        """
+        gemini_data = gemini_data or {}
+        result = self.create_default_structure()
+        result.pop('observaciones')
+        origins = {}
+
+        for section, fields in self.FIELD_SCHEMA.items():
+            if not isinstance(fields, dict):
+                if section == 'tipo_documento' and local.tipo_documento:
+                    result[section] = local.tipo_documento
+                    origins[section] = local.tier
+                elif section in gemini_data:
+                    result[section] = gemini_data[section]
+                    origins[section] = 'gemini'
+                continue
+
+            gemini_section = gemini_data.get(section) if isinstance(gemini_data.get(section), dict) else {}
+            for field in fields:
+                if local.has(section, field):
+                    result[section][field] = local.fields[section][field]
+                    origins[f"{section}.{field}"] = local.tier
+                elif field in gemini_section:
+                    result[section][field] = gemini_section[field]
+                    origins[f"{section}.{field}"] = 'gemini'
+
+        if 'observaciones' in gemini_data:
+            result['observaciones'] = gemini_data['observaciones']
+        flagged = [key for key in gemini_data.get(self.REVIEW_KEY, []) if origins.get(key) == 'gemini']
+        if flagged:
+            result[self.REVIEW_KEY] = flagged
+        result['origen_campos'] = origins
+        return result
+
+    def extract_vehicle_info(self, pdf_path: str, cache_key=None) -> dict:
+        """
+        Extrae información vehicular de un PDF: primero localmente (capa de texto u OCR)
+        y luego con Gemini Vision solo para los campos que falten.
+        Si se recibe `cache_key`, el llamador ya consultó la caché con esa clave y
+        solo se usa para guardar el resultado.
+        """
+        # Un fallo de una llamada anterior de este hilo no debe marcar esta extracción
+        self.last_call_failed = False
+        if cache_key is None:
+            cache_key = self.cache_key_for(pdf_path)
+            cached = self.get_cached_result(pdf_path, cache_key)
+            if cached is not None:
+                logger.info(f"Extracción obtenida de la caché para {pdf_path}")
+                return cached
+        content_hash, key = cache_key
+
+        with stage('local_extraction'):
+            local, requested = self.plan_extraction(pdf_path)
+        if requested is None:
+            logger.info(f"Campos requeridos obtenidos localmente ({local.tier}); se omite Gemini")
+            gemini_data = {}
+        else:
+            logger.info(f"Iniciando análisis de PDF con Gemini Vision: {pdf_path}")
+            gemini_data = self._analyze_with_vision(pdf_path, requested)
+
+        if self.is_fallback_result(gemini_data) and not local:
+            return gemini_data
+        result = self.merge_results(local, gemini_data)
+
+        # Solo se cachean respuestas reales de Gemini, nunca la estructura de error
+        if key and not self.is_fallback_result(gemini_data):
+            try:
+                self.cache.set(key, content_hash, self.model_name, self.PROMPT_VERSION, result)
+            except Exception as e:
+                logger.warning(f"No se pudo guardar en la caché de extracción: {str(e)}")
+        return result
     
     def test_connection(self) -> bool:
         """Prueba la conexión con Gemini. En caso de 429 (cuota), devuelve False sin lanzar excepción."""
         try:
             test_prompt = "Responde con un JSON simple: {\"test\": \"ok\"}"
-            response = self.model.generate_content(test_prompt)
+            with stage('test_connection', self.model_name):
+                response = self._generate(test_prompt)
             return bool(response and response.text)
         except Exception as e:
             # Manejo explícito de errores de cuota (429)
-            try:
-                from google.api_core.exceptions import ResourceExhausted
-                if isinstance(e, ResourceExhausted):
-                    logger.warning("Cuota de Gemini agotada (429). test_connection devuelve False.")
-                    return False
-            except Exception:
-                pass
+            if self._is_rate_limited(e):
+                logger.warning("Cuota de Gemini agotada (429). test_connection devuelve False.")
+                return False
             logger.error(f"Error en test_connection: {str(e)}")
             return False
+
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+
+def get_extractor(model_name=None):
+    """
+    Retorna el extractor compartido del proceso para el modelo indicado
+    (por defecto GEMINI_MODEL). Se crea una sola vez y es seguro entre hilos.
+    """
+    model_name = model_name or current_model_name()
+    extractor = _extractors.get(model_name)
+    if extractor is None:
+        with _extractors_lock:
+            extractor = _extractors.get(model_name)
+            if extractor is None:
+                extractor = PDFExtractor(model_name)
+                _extractors[model_name] = extractor
+    return extractor
+
+
+def reload_extractors():
+    """Descarta los extractores creados; se recrean en el próximo uso (p. ej. tras cambiar GEMINI_MODEL)"""
+    global _configured_api_key
+    with _extractors_lock:
+        _extractors.clear()
+    with _configure_lock:
+        _configured_api_key = None
+    logger.info("Registro de extractores de Gemini reiniciado")
+
+
+def warm_up():
+    """Crea el extractor por defecto al arrancar los workers para no pagarlo en el primer documento"""
+    try:
+        extractor = get_extractor()
+        logger.info(f"Extractor de Gemini precargado ({extractor.model_name})")
+        return extractor
+    except Exception as e:
+        logger.warning(f"No se pudo precargar el extractor de Gemini: {str(e)}")
+        return None
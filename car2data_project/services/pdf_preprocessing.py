@@ -0,0 +1,102 @@
+import io
+import logging
+import unicodedata
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    from pdf2image import convert_from_bytes
+    from pdf2image.exceptions import PDFInfoNotInstalledError
+except ImportError:
+    convert_from_bytes = None
+    PDFInfoNotInstalledError = None
+
+
+class PdfPreprocessor:
+    """
+    Reduce el payload que se envía a Gemini Vision: ubica la página de la
+    tarjeta de propiedad, la rasteriza al DPI configurado y la comprime en JPEG.
+    Si no se puede rasterizar (sin poppler) o la imagen no resulta más pequeña,
+    se envía el PDF original.
+    """
+
+    PAGE_KEYWORDS = ('TARJETA DE PROPIEDAD', 'LICENCIA DE TRANSITO', 'PLACA', 'PROPIETARIO')
+
+    # Se desactiva la rasterización en el proceso si poppler no está instalado
+    poppler_missing = False
+
+    def __init__(self):
+        self.enabled = getattr(settings, 'PDF_PREPROCESS_ENABLED', True)
+        self.dpi = getattr(settings, 'PDF_PREPROCESS_DPI', 150)
+        self.jpeg_quality = getattr(settings, 'PDF_PREPROCESS_JPEG_QUALITY', 75)
+
+    def prepare(self, pdf_data: bytes):
+        """Retorna (mime_type, datos) con el payload más liviano disponible"""
+        if not self.enabled or convert_from_bytes is None or PdfPreprocessor.poppler_missing:
+            return 'application/pdf', pdf_data
+
+        page_index = self.find_page(pdf_data)
+        if page_index is None:
+            return 'application/pdf', pdf_data
+
+        image_data = self.rasterize(pdf_data, page_index)
+        if image_data is None or len(image_data) >= len(pdf_data):
+            return 'application/pdf', pdf_data
+        return 'image/jpeg', image_data
+
+    def find_page(self, pdf_data: bytes):
+        """
+        Índice de la página con la tarjeta de propiedad. En PDFs de varias páginas
+        sin capa de texto no se puede saber cuál es, así que se retorna None.
+        """
+        if PdfReader is None:
+            return None
+        try:
+            reader = PdfReader(io.BytesIO(pdf_data))
+            pages = reader.pages
+            if len(pages) == 1:
+                return 0
+
+            best_index, best_score = None, 0
+            for index, page in enumerate(pages):
+                text = self._normalize(page.extract_text() or '')
+                score = sum(keyword in text for keyword in self.PAGE_KEYWORDS)
+                if score > best_score:
+                    best_index, best_score = index, score
+            return best_index
+        except Exception as e:
+            logger.warning(f"No se pudo analizar el PDF para elegir la página: {str(e)}")
+            return None
+
+    def rasterize(self, pdf_data: bytes, page_index: int):
+        """Rasteriza una página y la comprime como JPEG"""
+        try:
+            images = convert_from_bytes(
+                pdf_data,
+                dpi=self.dpi,
+                first_page=page_index + 1,
+                last_page=page_index + 1,
+            )
+            if not images:
+                return None
+            buffer = io.BytesIO()
+            images[0].convert('RGB').save(buffer, format='JPEG', quality=self.jpeg_quality, optimize=True)
+            return buffer.getvalue()
+        except PDFInfoNotInstalledError:
+            PdfPreprocessor.poppler_missing = True
+            logger.warning("Poppler no está instalado; se enviará el PDF completo a Gemini")
+            return None
+        except Exception as e:
+            logger.warning(f"No se pudo rasterizar la página {page_index + 1}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _normalize(text):
+        text = unicodedata.normalize('NFKD', text.upper())
+        return ''.join(char for char in text if not unicodedata.combining(char))
@@ -0,0 +1,120 @@
+import io
+import time
+import pstats
+import marshal
+import logging
+import cProfile
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+
+class QueryRecorder:
+    """execute_wrapper que guarda cada consulta SQL de la petición perfilada con su duración"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.queries = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.queries) < self.limit:
+                self.queries.append({'sql': sql[:2000], 'ms': round(elapsed * 1000, 3), 'many': many})
+
+
+class ProfileSession:
+    """
+    Perfil de una sola petición: arranca el profiler y la captura de SQL en el
+    hilo actual y, al detenerse, guarda un ProfileArtifact descargable desde el admin.
+    """
+
+    def __init__(self, trigger, backend=None):
+        self.trigger = trigger
+        backend = backend or getattr(settings, 'PROFILING_BACKEND', 'cprofile')
+        if backend == 'pyinstrument' and PyinstrumentProfiler is None:
+            logger.warning("pyinstrument no está instalado; se perfila con cProfile")
+            backend = 'cprofile'
+        self.backend = backend
+        self.recorder = QueryRecorder(getattr(settings, 'PROFILING_MAX_QUERIES', 500))
+        self._wrapper = None
+        self._profiler = None
+        self._started = None
+        self.duration = 0.0
+
+    def start(self):
+        self._wrapper = connection.execute_wrapper(self.recorder)
+        self._wrapper.__enter__()
+        if self.backend == 'pyinstrument':
+            self._profiler = PyinstrumentProfiler()
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self._started
+        if self.backend == 'pyinstrument':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        self._wrapper.__exit__(None, None, None)
+
+    def _render(self):
+        """Retorna (contenido del archivo, extensión, resumen de texto)"""
+        if self.backend == 'pyinstrument':
+            return self._profiler.output_html().encode('utf-8'), 'html', self._profiler.output_text()
+
+        summary = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(getattr(settings, 'PROFILING_SUMMARY_LINES', 40))
+        # Mismo formato que pstats.dump_stats: se abre con snakeviz o pstats.Stats(ruta)
+        return marshal.dumps(stats.stats), 'prof', summary.getvalue()
+
+    def save(self, request, response):
+        """Guarda el perfil; nunca interrumpe la respuesta si algo falla"""
+        from apps.administration.models import ProfileArtifact
+
+        try:
+            content, extension, summary = self._render()
+            match = request.resolver_match
+            user = getattr(request, 'user', None)
+            view_name = match.view_name if match else ''
+            artifact = ProfileArtifact(
+                user=user if user is not None and user.is_authenticated else None,
+                method=request.method[:10],
+                path=request.path[:500],
+                view_name=view_name,
+                status_code=response.status_code,
+                trigger=self.trigger,
+                profiler=self.backend,
+                duration_ms=self.duration * 1000,
+                query_count=self.recorder.count,
+                query_ms=self.recorder.seconds * 1000,
+                queries=self.recorder.queries,
+                summary=summary,
+            )
+            stamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+            name = f"{stamp}_{(view_name or 'request').replace(':', '_')}.{extension}"
+            artifact.profile_file.save(name, ContentFile(content), save=False)
+            artifact.save()
+            return artifact
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el perfil de {request.path}: {str(e)}")
+            return None
@@ -0,0 +1,86 @@
+import time
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+class StatusBroker:
+    """
+    Aviso liviano de cambios de estado de documentos por usuario. Dentro del
+    proceso despierta al instante a las peticiones long-poll en espera; entre
+    procesos (workers de extracción aparte) publica un token en la caché, que
+    los que esperan revisan cada STATUS_FEED_CHECK_INTERVAL sin tocar la BD.
+    """
+
+    CACHE_PREFIX = 'status-feed:user:'
+    CACHE_TTL = 3600
+
+    def __init__(self):
+        self.check_interval = getattr(settings, 'STATUS_FEED_CHECK_INTERVAL', 1.0)
+        self.max_waiters = getattr(settings, 'STATUS_FEED_MAX_WAITERS', 50)
+        self._condition = threading.Condition()
+        self._versions = {}
+        # Límite de peticiones retenidas a la vez en este proceso (fan-out)
+        self._slots = threading.BoundedSemaphore(max(1, self.max_waiters))
+
+    def publish(self, user_id):
+        """Registra que cambió el estado de algún documento del usuario"""
+        with self._condition:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._condition.notify_all()
+        try:
+            cache.set(self.CACHE_PREFIX + str(user_id), time.time_ns(), self.CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"No se pudo publicar el cambio de estado en la caché: {str(e)}")
+
+    def token(self, user_id):
+        """Marca de versión actual del usuario; cambia con cada publish"""
+        try:
+            shared = cache.get(self.CACHE_PREFIX + str(user_id))
+        except Exception:
+            shared = None
+        return self._versions.get(user_id, 0), shared
+
+    def acquire_slot(self):
+        """Reserva un lugar para esperar; False si ya hay STATUS_FEED_MAX_WAITERS esperando"""
+        return self._slots.acquire(blocking=False)
+
+    def release_slot(self):
+        self._slots.release()
+
+    def wait(self, user_id, token, timeout):
+        """Bloquea hasta que cambie el token del usuario o venza el timeout. True si cambió"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.token(user_id) != token:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._condition:
+                if self._versions.get(user_id, 0) == token[0]:
+                    self._condition.wait(min(remaining, self.check_interval))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_status_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = StatusBroker()
+        return _broker
+
+
+def notify_status_change(user_id):
+    """
+    Avisa a los long-poll del usuario que hubo un cambio de estado. El aviso sale al
+    confirmar la transacción: antes, quien despierta no vería el cambio en la BD.
+    """
+    transaction.on_commit(lambda: get_status_broker().publish(user_id))
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Load environment variables from .env file
 try:
@@ -118,6 +119,8 @@ SOCIALACCOUNT_PROVIDERS = {
 }
 
 MIDDLEWARE = [
+    # Primero, para medir la petición completa
+    "apps.administration.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -126,6 +129,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    # Después de AuthenticationMiddleware: usa request.user para la cabecera de staff
+    "apps.administration.middleware.ProfilingMiddleware",
 ]
 
 # Add WhiteNoise middleware only in production (when not using S3)
@@ -145,6 +150,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "apps.authentication.context_processors.subscription",
             ],
         },
     },
@@ -177,6 +183,27 @@ else:
     }
 
 
+# Caché compartida por todos los procesos (workers de gunicorn, run_extraction_workers):
+# guarda la suscripción de cada usuario, el estado del circuit breaker de Gemini y los
+# avisos del feed de estados. En producción usar Redis (REDIS_URL); sin él se usa una
+# caché en disco, compartida solo entre procesos del mismo servidor. Una caché en memoria
+# (LocMemCache) no sirve: cada proceso vería solo sus propias invalidaciones.
+REDIS_URL = os.environ.get('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'car2data_cache')),
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -228,6 +255,119 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
 
+# Cola de extracción de documentos (trabajos persistentes en la base de datos)
+# Workers embebidos en cada proceso web; usar 0 cuando se ejecuten workers dedicados
+# con `python manage.py run_extraction_workers`.
+EXTRACTION_EMBEDDED_WORKERS = int(os.environ.get('EXTRACTION_EMBEDDED_WORKERS', '2'))
+EXTRACTION_WORKER_CONCURRENCY = int(os.environ.get('EXTRACTION_WORKER_CONCURRENCY', '2'))
+EXTRACTION_POLL_INTERVAL = float(os.environ.get('EXTRACTION_POLL_INTERVAL', '2'))
+EXTRACTION_MAX_ATTEMPTS = int(os.environ.get('EXTRACTION_MAX_ATTEMPTS', '3'))
+EXTRACTION_RETRY_BASE_SECONDS = int(os.environ.get('EXTRACTION_RETRY_BASE_SECONDS', '30'))
+EXTRACTION_RETRY_MAX_SECONDS = int(os.environ.get('EXTRACTION_RETRY_MAX_SECONDS', '900'))
+EXTRACTION_MAX_RUNNING_PER_USER = int(os.environ.get('EXTRACTION_MAX_RUNNING_PER_USER', '2'))
+# Los workers renuevan el latido de sus trabajos cada EXTRACTION_HEARTBEAT_INTERVAL segundos;
+# un trabajo sin latido durante EXTRACTION_JOB_LOCK_TIMEOUT segundos vuelve a la cola.
+EXTRACTION_HEARTBEAT_INTERVAL = int(os.environ.get('EXTRACTION_HEARTBEAT_INTERVAL', '15'))
+EXTRACTION_JOB_LOCK_TIMEOUT = int(os.environ.get('EXTRACTION_JOB_LOCK_TIMEOUT', '120'))
+
+# Caché de extracción por contenido (SHA-256 del PDF + modelo + versión del prompt)
+EXTRACTION_CACHE_ENABLED = os.environ.get('EXTRACTION_CACHE_ENABLED', 'True') == 'True'
+EXTRACTION_CACHE_TTL = int(os.environ.get('EXTRACTION_CACHE_TTL', str(30 * 24 * 3600)))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', '10000'))
+
+# Circuit breaker de Gemini: se abre tras N fallos consecutivos y prueba de nuevo tras el enfriamiento
+GEMINI_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('GEMINI_BREAKER_FAILURE_THRESHOLD', '5'))
+GEMINI_BREAKER_COOLDOWN_SECONDS = int(os.environ.get('GEMINI_BREAKER_COOLDOWN_SECONDS', '60'))
+GEMINI_BREAKER_WINDOW_SECONDS = int(os.environ.get('GEMINI_BREAKER_WINDOW_SECONDS', '300'))
+
+# Extracción asíncrona por lotes (`python manage.py bulk_extract`)
+GEMINI_ASYNC_CONCURRENCY = int(os.environ.get('GEMINI_ASYNC_CONCURRENCY', '8'))
+GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', '60'))
+GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', '5'))
+GEMINI_RETRY_BASE_SECONDS = float(os.environ.get('GEMINI_RETRY_BASE_SECONDS', '2'))
+
+# Carga masiva de documentos (ZIP o varios PDFs por petición)
+BULK_UPLOAD_MAX_FILES = int(os.environ.get('BULK_UPLOAD_MAX_FILES', '50'))
+BULK_UPLOAD_MAX_FILE_SIZE = int(os.environ.get('BULK_UPLOAD_MAX_FILE_SIZE', str(10 * 1024 * 1024)))
+
+# Pasada local (capa de texto / OCR) antes de Gemini. Si encuentra todos los
+# LOCAL_REQUIRED_FIELDS (los que exigen los formularios) no se llama a Gemini.
+# El OCR (300 DPI por página) es opcional: en escaneos rara vez completa esos campos.
+LOCAL_REQUIRED_FIELDS = [
+    field.strip()
+    for field in os.environ.get(
+        'LOCAL_REQUIRED_FIELDS',
+        'informacion_vehiculo.placa,informacion_vehiculo.marca,informacion_vehiculo.linea,'
+        'informacion_vehiculo.modelo,informacion_vehiculo.color,'
+        'informacion_propietario.nombre,informacion_propietario.identificacion',
+    ).split(',')
+    if field.strip()
+]
+LOCAL_OCR_ENABLED = os.environ.get('LOCAL_OCR_ENABLED', 'False') == 'True'
+LOCAL_OCR_DPI = int(os.environ.get('LOCAL_OCR_DPI', '300'))
+LOCAL_OCR_LANG = os.environ.get('LOCAL_OCR_LANG', 'spa')
+LOCAL_OCR_MAX_PAGES = int(os.environ.get('LOCAL_OCR_MAX_PAGES', '2'))
+LOCAL_EXTRACTION_MIN_TEXT_CHARS = int(os.environ.get('LOCAL_EXTRACTION_MIN_TEXT_CHARS', '80'))
+
+# Preprocesamiento del payload para Gemini: solo la página de la tarjeta, rasterizada y en JPEG
+PDF_PREPROCESS_ENABLED = os.environ.get('PDF_PREPROCESS_ENABLED', 'True') == 'True'
+PDF_PREPROCESS_DPI = int(os.environ.get('PDF_PREPROCESS_DPI', '150'))
+PDF_PREPROCESS_JPEG_QUALITY = int(os.environ.get('PDF_PREPROCESS_JPEG_QUALITY', '75'))
+
+# PDFs más grandes que este umbral (bytes) se suben con la File API de Gemini en vez de enviarse en línea
+GEMINI_FILE_UPLOAD_THRESHOLD = int(os.environ.get('GEMINI_FILE_UPLOAD_THRESHOLD', str(15 * 1024 * 1024)))
+
+# Re-consultas a Gemini pidiendo solo los campos faltantes o con formato inválido
+GEMINI_REASK_ATTEMPTS = int(os.environ.get('GEMINI_REASK_ATTEMPTS', '1'))
+
+# Generación de formularios PDF: procesos del pool de renderizado (0 = en el proceso web) y máximo por lote
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', str(min(4, os.cpu_count() or 1))))
+PDF_BATCH_MAX_JOBS = int(os.environ.get('PDF_BATCH_MAX_JOBS', '50'))
+
+# Segundos que la vista espera el PDF antes de responder y dejar que la página consulte el estado
+PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', '20'))
+# Segundos tras los que un formulario que sigue en 'processing' se da por perdido y se marca como error
+PDF_RENDER_MAX_SECONDS = int(os.environ.get('PDF_RENDER_MAX_SECONDS', '300'))
+# Arranque de los procesos de renderizado: 'spawn' o 'forkserver' (un fork copiaría hilos y conexiones del proceso web)
+PDF_RENDER_START_METHOD = os.environ.get('PDF_RENDER_START_METHOD', 'spawn')
+
+# Descarga de PDFs generados: '' (Django en streaming), 'x-sendfile' (Apache) o 'x-accel-redirect' (nginx)
+FILE_SERVE_MODE = os.environ.get('FILE_SERVE_MODE', '')
+X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+
+# Segundos que se guarda en caché la suscripción de cada usuario (se invalida al guardarla)
+SUBSCRIPTION_CACHE_TIMEOUT = int(os.environ.get('SUBSCRIPTION_CACHE_TIMEOUT', '300'))
+
+# Feed de estados (long-poll): espera máxima, revisión de la caché, respaldo en BD y peticiones retenidas por proceso.
+# El long-poll requiere workers con hilos (gunicorn.conf.py usa gthread) y menos esperas que hilos por worker;
+# con workers síncronos usar STATUS_FEED_TIMEOUT=0 (polling corto)
+STATUS_FEED_TIMEOUT = float(os.environ.get('STATUS_FEED_TIMEOUT', '25'))
+STATUS_FEED_CHECK_INTERVAL = float(os.environ.get('STATUS_FEED_CHECK_INTERVAL', '1'))
+STATUS_FEED_DB_INTERVAL = float(os.environ.get('STATUS_FEED_DB_INTERVAL', '10'))
+STATUS_FEED_MAX_WAITERS = int(os.environ.get('STATUS_FEED_MAX_WAITERS', '4'))
+
+# Guardar los tiempos por etapa de cada documento (ProcessingSpan) además de los histogramas en memoria
+PIPELINE_SPANS_ENABLED = os.environ.get('PIPELINE_SPANS_ENABLED', 'True') == 'True'
+
+# Endpoint /metrics (Prometheus): token Bearer exigido; sin token solo responde con DEBUG.
+# Con varios workers de gunicorn definir PROMETHEUS_MULTIPROC_DIR (variable de entorno de prometheus_client);
+# el hook child_exit de gunicorn.conf.py limpia los archivos de los workers que terminan.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Perfilado en producción: cabecera X-Profile para staff y muestreo de las vistas listadas
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_VIEWS = [
+    view.strip()
+    for view in os.environ.get('PROFILING_VIEWS', 'forms_generation:generate,documents:upload').split(',')
+    if view.strip()
+]
+PROFILING_BACKEND = os.environ.get('PROFILING_BACKEND', 'cprofile')  # 'cprofile' o 'pyinstrument'
+PROFILING_MAX_QUERIES = int(os.environ.get('PROFILING_MAX_QUERIES', '500'))
+# Los perfiles exponen rutas internas y tiempos: se guardan fuera de MEDIA_ROOT y solo
+# se descargan desde el admin (staff)
+PROFILING_ROOT = os.environ.get('PROFILING_ROOT', str(BASE_DIR / 'profiles'))
+
 # Email API (Resend)
 RESEND_API_KEY = os.environ.get("RESEND_API_KEY", "")
 RESEND_FROM_EMAIL = os.environ.get("RESEND_FROM_EMAIL", "")
@@ -0,0 +1,70 @@
+import os
+import json
+import tempfile
+import pytest
+from django.contrib.auth.models import User
+
+EXTRACTED_DATA = {
+    'tipo_documento': 'Tarjeta de Propiedad',
+    'informacion_vehiculo': {
+        'placa': 'KLM482',
+        'marca': 'CHEVROLET',
+        'linea': 'SAIL LT',
+        'modelo': '2019',
+        'color': 'BLANCO',
+        'numero_motor': 'LCU180920451',
+        'numero_chasis': '9GASA58M1KB012345',
+        'vin': '9GASA58M1KB012345',
+    },
+    'informacion_propietario': {
+        'nombre': 'RODRIGUEZ GOMEZ CARLOS ANDRES',
+        'identificacion': '1020345678',
+    },
+}
+
+
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    """
+    Base de pruebas SQLite en archivo: la de memoria compartida bloquea tablas
+    enteras y las pruebas con varios hilos fallarían con 'database table is locked'.
+    """
+    from django.conf import settings
+
+    for alias, config in settings.DATABASES.items():
+        if config['ENGINE'].endswith('sqlite3'):
+            config.setdefault('TEST', {})['NAME'] = os.path.join(tempfile.gettempdir(), f'car2data_test_{alias}.sqlite3')
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(settings, tmp_path):
+    """Sin workers embebidos, archivos en un directorio temporal y caché local por prueba"""
+    settings.EXTRACTION_EMBEDDED_WORKERS = 0
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+    settings.PROFILING_ROOT = str(tmp_path / 'profiles')
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    from django.core.cache import cache
+    cache.clear()
+    yield settings
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username='tester', email='tester@example.com', password='clave-segura-123')
+
+
+@pytest.fixture
+def make_document():
+    """Crea documentos completados con datos extraídos (campos denormalizados incluidos)"""
+    from apps.documents.models import Document
+
+    def make(user, **fields):
+        fields.setdefault('name', 'tarjeta.pdf')
+        fields.setdefault('document_type', 'ownership')
+        fields.setdefault('status', 'completed')
+        document = Document(user=user, **fields)
+        document.extracted_data_json = json.dumps(EXTRACTED_DATA, ensure_ascii=False)
+        document.sync_extracted_fields()
+        document.save()
+        return document
+    return make
@@ -0,0 +1,44 @@
+import io
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from benchmarks.fixtures import check_benchmark_database
+
+
+class FakeConnection:
+    def __init__(self, name):
+        self.settings_dict = {'NAME': name}
+
+
+def test_guard_refuses_production_database(settings):
+    settings.DEBUG = False
+    with pytest.raises(CommandError):
+        check_benchmark_database(connection=FakeConnection('car2data'))
+
+
+def test_guard_allows_benchmark_database_debug_or_confirmation(settings):
+    settings.DEBUG = False
+    check_benchmark_database(connection=FakeConnection('car2data_bench'))
+    check_benchmark_database(confirmed=True, connection=FakeConnection('car2data'))
+    settings.DEBUG = True
+    check_benchmark_database(connection=FakeConnection('car2data'))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_index_comparison_restores_indexes():
+    from django.db import connection
+    from apps.documents.models import Document
+
+    def index_names():
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Document._meta.db_table)
+        return {name for name, info in constraints.items() if info['index']}
+
+    before = index_names()
+    out = io.StringIO()
+    call_command(
+        'benchmark_listings', '--documents', '40', '--forms', '10', '--users', '2',
+        '--repeat', '1', '--compare', stdout=out,
+    )
+    assert 'sin índices' in out.getvalue()
+    assert index_names() == before
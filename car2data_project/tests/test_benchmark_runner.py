@@ -0,0 +1,30 @@
+from benchmarks.runner import Benchmark, compare, measure, percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile([7], 0.99) == 7
+
+
+def test_measure_reports_latency_and_memory():
+    calls = []
+    result = measure(
+        Benchmark('lista', lambda state: calls.append(bytearray(64 * 1024))),
+        min_time=0, min_iterations=3,
+    )
+    assert result['iterations'] == 3
+    assert result['ops_per_sec'] > 0
+    assert result['p95_ms'] >= result['p50_ms']
+    assert result['peak_memory_bytes'] >= 64 * 1024
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    base = {'a': {'ops_per_sec': 100, 'p95_ms': 10, 'peak_memory_bytes': 1000}}
+    slower = {'a': {'ops_per_sec': 80, 'p95_ms': 12, 'peak_memory_bytes': 1000}}
+    similar = {'a': {'ops_per_sec': 95, 'p95_ms': 10.5, 'peak_memory_bytes': 1050}}
+
+    assert compare(slower, base, threshold=0.10)['a']['regressions'] == ['ops_per_sec', 'p95_ms']
+    assert compare(similar, base, threshold=0.10)['a']['regressions'] == []
+    assert compare({'nuevo': slower['a']}, base) == {}
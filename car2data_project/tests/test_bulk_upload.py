@@ -0,0 +1,29 @@
+import io
+import os
+import zipfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from services.bulk_upload import BulkUploadService
+
+GOOD_PDF = b'%PDF-1.4\n% tarjeta buena\n%%EOF\n'
+BAD_PDF = b'%PDF-1.4\n% tarjeta con CRC alterado\n%%EOF\n'
+
+
+def corrupted_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr('lote/buena.pdf', GOOD_PDF)
+        archive.writestr('lote/mala.pdf', BAD_PDF)
+    # Se altera el contenido almacenado sin actualizar el CRC del encabezado
+    data = buffer.getvalue().replace(BAD_PDF, BAD_PDF.replace(b'alterado', b'ALTERADO'))
+    return SimpleUploadedFile('lote.zip', data, content_type='application/zip')
+
+
+def test_corrupted_member_is_skipped_without_partial_file(user, settings):
+    result = BulkUploadService(user).ingest([corrupted_zip()])
+
+    assert [document.name for document in result.documents] == ['buena']
+    assert result.skipped == [('lote/mala.pdf', 'El archivo está dañado dentro del ZIP')]
+    stored = os.listdir(os.path.join(settings.MEDIA_ROOT, BulkUploadService.UPLOAD_DIR))
+    assert stored == ['buena.pdf']
+    with open(os.path.join(settings.MEDIA_ROOT, BulkUploadService.UPLOAD_DIR, 'buena.pdf'), 'rb') as saved:
+        assert saved.read() == GOOD_PDF
@@ -0,0 +1,100 @@
+from datetime import timedelta
+import pytest
+from django.db.models import F
+from django.utils import timezone
+from services.extraction_queue import ExtractionQueue
+
+
+@pytest.fixture
+def queue(settings):
+    settings.EXTRACTION_MAX_RUNNING_PER_USER = 2
+    settings.EXTRACTION_JOB_LOCK_TIMEOUT = 60
+    return ExtractionQueue()
+
+
+def enqueue(queue, user, make_document, count):
+    return [queue.enqueue(make_document(user, status='pending')) for _ in range(count)]
+
+
+def test_claim_respects_running_limit(queue, user, make_document):
+    jobs = enqueue(queue, user, make_document, 3)
+    assert queue.claim('w-1').id == jobs[0].id
+    assert queue.claim('w-2').id == jobs[1].id
+    assert queue.claim('w-3') is None
+
+
+def test_locked_claim_rechecks_limit_with_stale_counts(queue, user, make_document):
+    from apps.documents.models import ExtractionJob
+
+    jobs = enqueue(queue, user, make_document, 3)
+    queue.claim('w-1')
+    queue.claim('w-2')
+
+    # Otro worker ya llenó el cupo después de que este leyó los conteos
+    candidate = {'id': jobs[2].id, 'user_id': user.id}
+    assert queue._claim_candidate(candidate, 'w-3', timezone.now()) is None
+    jobs[2].refresh_from_db()
+    assert (jobs[2].status, jobs[2].attempts) == ('queued', 0)
+    assert ExtractionJob.objects.filter(status='running').count() == 2
+
+
+def test_heartbeat_keeps_long_jobs_from_being_requeued(queue, user, make_document):
+    from apps.documents.models import ExtractionJob
+
+    long_job, dead_job = enqueue(queue, user, make_document, 2)
+    queue.claim('w-1')
+    queue.claim('w-2')
+    started = timezone.now() - timedelta(minutes=30)
+    ExtractionJob.objects.update(locked_at=started, heartbeat_at=started)
+
+    assert queue.heartbeat([long_job.id]) == 1
+    assert queue.requeue_stale() == 1
+
+    long_job.refresh_from_db()
+    dead_job.refresh_from_db()
+    assert long_job.status == 'running'
+    assert (dead_job.status, dead_job.heartbeat_at) == ('queued', None)
+
+
+def test_stale_job_without_attempts_left_fails_and_releases_quota(queue, user, make_document):
+    from apps.authentication.models import UserSubscription
+    from apps.documents.models import ExtractionJob
+
+    subscription = UserSubscription.objects.create(user=user, plan='starter')
+    assert subscription.reserve_documents()
+    job = queue.enqueue(make_document(user, status='processing', quota_reserved=True))
+    claimed = queue.claim('w-1')
+    ExtractionJob.objects.filter(pk=claimed.pk).update(
+        attempts=F('max_attempts'), heartbeat_at=timezone.now() - timedelta(minutes=30),
+    )
+
+    assert queue.requeue_stale() == 0
+
+    job.refresh_from_db()
+    job.document.refresh_from_db()
+    subscription.refresh_from_db()
+    assert (job.status, job.locked_by) == ('failed', '')
+    assert job.finished_at is not None
+    assert (job.document.status, job.document.quota_reserved) == ('error', False)
+    assert subscription.documents_used == 0
+
+
+def test_reprocess_reuses_pending_job(queue, user, make_document):
+    from django.test import Client
+    from django.urls import reverse
+    from apps.documents.models import ExtractionJob
+
+    document = make_document(user, status='error')
+    url = reverse('documents:reprocess', args=[document.pk])
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+
+    for _ in range(2):
+        response = client.post(url)
+        assert response.json()['status'] == 'success'
+
+    assert ExtractionJob.objects.filter(document=document).count() == 1
+    queue.claim('w-1')
+    response = client.post(url)
+    assert response.json()['message'] == 'El documento ya está en proceso de extracción'
+    assert ExtractionJob.objects.filter(document=document).count() == 1
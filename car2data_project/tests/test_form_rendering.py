@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+import pytest
+from django.db import connection
+from django.utils import timezone
+from services import form_rendering
+from services.form_rendering import (RENDER_TIMEOUT_MESSAGE, FormRenderPool, _finish_generated_form,
+                                     render_form, sweep_stale_forms)
+
+
+@pytest.fixture
+def generated_form(user, make_document):
+    from apps.forms_generation.models import GeneratedForm
+
+    return GeneratedForm.objects.create(
+        user=user,
+        document=make_document(user),
+        form_type='formulario_tramite',
+        generated_file='generated_forms/prueba.pdf',
+        status='processing',
+    )
+
+
+def done_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_finish_in_request_thread_keeps_connection(generated_form):
+    connection.ensure_connection()
+    _finish_generated_form(generated_form.id, done_future((True, '', 0.1)), owner=threading.get_ident())
+
+    assert connection.connection is not None
+    generated_form.refresh_from_db()
+    assert generated_form.status == 'completed'
+
+
+def test_cancelled_render_is_marked_error(generated_form):
+    future = Future()
+    future.cancel()
+    _finish_generated_form(generated_form.id, future)
+
+    generated_form.refresh_from_db()
+    assert (generated_form.status, generated_form.render_error) == ('error', RENDER_TIMEOUT_MESSAGE)
+
+
+def test_sweep_marks_stale_processing_forms(generated_form, settings):
+    from apps.forms_generation.models import GeneratedForm
+
+    settings.PDF_RENDER_MAX_SECONDS = 60
+    assert sweep_stale_forms() == 0
+    GeneratedForm.objects.filter(id=generated_form.id).update(updated_at=timezone.now() - timedelta(minutes=5))
+
+    assert sweep_stale_forms() == 1
+    generated_form.refresh_from_db()
+    assert generated_form.status == 'error'
+
+
+class FailingFiller:
+    def fill_pdf_form(self, form_type, payload, output_path):
+        return False
+
+    def get_template_path(self, form_type):
+        return '/plantillas/formulario_tramite.pdf'
+
+
+def test_template_failure_falls_back_to_document_generator(monkeypatch, tmp_path):
+    from services.DocumentGenerator import DocumentGenerator
+
+    calls = []
+    monkeypatch.setattr(form_rendering, '_worker_filler', FailingFiller())
+    monkeypatch.setattr(
+        DocumentGenerator, '_generate_formulario_tramite_fallback',
+        lambda self, payload, output_path: calls.append(output_path) or True,
+    )
+    output = str(tmp_path / 'tramite.pdf')
+
+    assert render_form('formulario_tramite', {'placa': 'KLM482'}, output)
+    assert calls == [output]
+    assert not render_form('contrato_compraventa', {}, output)
+
+
+def test_pool_uses_spawn_by_default():
+    pool = FormRenderPool(workers=1)
+    try:
+        assert pool._get_executor()._mp_context.get_start_method() == 'spawn'
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize('body', [
+    b'[]',
+    b'"jobs"',
+    b'{"jobs": {"document_id": %d}}',
+    b'{"jobs": [{"document_id": %d, "form_type": ["contrato_mandato"]}]}',
+    b'{"jobs": [{"document_id": %d, "form_type": "formulario_tramite", "data": [1]}]}',
+    b'\xff\xfe',
+])
+def test_batch_api_rejects_malformed_bodies(user, make_document, body):
+    from django.test import Client
+    from django.urls import reverse
+
+    document = make_document(user)
+    if b'%d' in body:
+        body %= document.id
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    response = client.post(reverse('forms_generation:generate_batch'), body, content_type='application/json')
+    assert response.status_code == 400
+    assert set(response.json()) == {'error'}
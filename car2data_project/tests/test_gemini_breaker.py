@@ -0,0 +1,68 @@
+from datetime import timedelta
+from django.utils import timezone
+from services.document_processor import CircuitOpenError, ExtractionUnavailableError
+from services.extraction_queue import ExtractionQueue
+from services.gemini_health import CircuitBreaker
+
+
+def open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=60)
+    breaker.record_failure()
+    # Enfriamiento ya cumplido: la siguiente llamada es la prueba half-open
+    breaker.opened_at -= 61
+    return breaker
+
+
+def test_probe_released_when_extraction_skips_gemini():
+    breaker = open_breaker()
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.release_probe()
+    assert breaker.allow_request()
+
+
+def test_release_probe_ignores_probe_of_another_thread():
+    import threading
+
+    breaker = open_breaker()
+    assert breaker.allow_request()
+    thread = threading.Thread(target=breaker.release_probe)
+    thread.start()
+    thread.join()
+    assert not breaker.allow_request()
+
+
+def test_retry_after_reports_remaining_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=60)
+    breaker.record_failure()
+    assert 0 < breaker.retry_after() <= 60
+    assert CircuitBreaker().retry_after() == 0.0
+
+
+def claimed_job(user, make_document, attempts):
+    from apps.documents.models import ExtractionJob
+
+    document = make_document(user, status='processing')
+    return ExtractionJob.objects.create(
+        document=document, user=user, status='running', attempts=attempts, max_attempts=3,
+        locked_by='worker-0', locked_at=timezone.now(),
+    )
+
+
+def test_breaker_open_does_not_consume_attempts(user, make_document):
+    job = claimed_job(user, make_document, attempts=3)
+
+    assert ExtractionQueue().retry_or_fail(job, CircuitOpenError('abierto', retry_after=45))
+    job.refresh_from_db()
+    assert job.status == 'queued'
+    assert job.attempts == 2
+    assert job.run_after >= timezone.now() + timedelta(seconds=44)
+
+
+def test_failed_call_still_consumes_last_attempt(user, make_document):
+    job = claimed_job(user, make_document, attempts=3)
+
+    assert not ExtractionQueue().retry_or_fail(job, ExtractionUnavailableError('falló'))
+    job.refresh_from_db()
+    assert job.status == 'failed'
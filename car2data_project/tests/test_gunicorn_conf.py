@@ -0,0 +1,27 @@
+import importlib.util
+import sys
+import types
+from django.conf import settings
+
+
+def load_gunicorn_conf():
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', settings.BASE_DIR / 'gunicorn.conf.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_child_exit_marks_dead_worker_in_multiprocess_mode(monkeypatch, tmp_path):
+    dead = []
+    multiprocess = types.SimpleNamespace(mark_process_dead=dead.append)
+    monkeypatch.setitem(sys.modules, 'prometheus_client', types.SimpleNamespace(multiprocess=multiprocess))
+    conf = load_gunicorn_conf()
+    worker = types.SimpleNamespace(pid=4321)
+
+    monkeypatch.delenv('PROMETHEUS_MULTIPROC_DIR', raising=False)
+    conf.child_exit(None, worker)
+    assert dead == []
+
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    conf.child_exit(None, worker)
+    assert dead == [4321]
@@ -0,0 +1,39 @@
+import pytest
+from services.gemini_health import CircuitBreaker
+from services.metrics import get_metrics
+
+
+def scrape():
+    content, _ = get_metrics().render()
+    return content.decode('utf-8').splitlines()
+
+
+@pytest.mark.django_db
+def test_metrics_export_breaker_state_from_shared_snapshot():
+    # El breaker de otro proceso publica su estado en la caché compartida
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure(rate_limited=True)
+    breaker.record_failure(rate_limited=True)
+
+    lines = scrape()
+    assert 'car2data_gemini_breaker_state{state="open"} 1' in lines
+    assert 'car2data_gemini_breaker_state{state="closed"} 0' in lines
+    assert 'car2data_gemini_breaker_state{state="half_open"} 0' in lines
+    assert 'car2data_gemini_breaker_consecutive_failures 3' in lines
+    assert 'car2data_gemini_breaker_window_events{outcome="success"} 1' in lines
+    assert 'car2data_gemini_breaker_window_events{outcome="failure"} 1' in lines
+    assert 'car2data_gemini_breaker_window_events{outcome="rate_limited"} 2' in lines
+    assert '# TYPE car2data_gemini_breaker_state gauge' in lines
+
+
+@pytest.mark.django_db
+def test_metrics_export_closed_breaker_without_published_state(monkeypatch):
+    import services.gemini_health as gemini_health
+
+    monkeypatch.setattr(gemini_health, '_breaker', None)
+    lines = scrape()
+    assert 'car2data_gemini_breaker_state{state="closed"} 1' in lines
+    assert 'car2data_gemini_breaker_consecutive_failures 0' in lines
+    assert 'car2data_extraction_queue_jobs{status="queued"} 0' in lines
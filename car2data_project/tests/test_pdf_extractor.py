@@ -0,0 +1,259 @@
+import os
+import threading
+import tracemalloc
+import pytest
+from services.pdf_extractor import PDFExtractor
+from services.pdf_preprocessing import PdfPreprocessor
+
+PDF_PAGES = 15
+
+
+class DictCache:
+    def __init__(self, entries=None):
+        self.entries = {} if entries is None else entries
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, content_hash, model_name, prompt_version, data):
+        self.entries[key] = data
+
+
+def bare_extractor(**attributes):
+    """PDFExtractor sin configurar Gemini"""
+    extractor = PDFExtractor.__new__(PDFExtractor)
+    extractor._local = threading.local()
+    extractor.model_name = 'gemini-test'
+    for name, value in attributes.items():
+        setattr(extractor, name, value)
+    return extractor
+
+
+def test_cached_extraction_resets_previous_failure(tmp_path):
+    pdf_path = tmp_path / 'tarjeta.pdf'
+    pdf_path.write_bytes(b'%PDF-1.4 prueba')
+    extractor = bare_extractor()
+    _, key = extractor.cache_key_for(str(pdf_path))
+    extractor.cache = DictCache({key: {'tipo_documento': 'Tarjeta de Propiedad'}})
+
+    extractor.last_call_failed = True
+    assert extractor.extract_vehicle_info(str(pdf_path)) == {'tipo_documento': 'Tarjeta de Propiedad'}
+    assert extractor.last_call_failed is False
+
+
+def test_normalizes_values_before_validating():
+    extractor = bare_extractor()
+    cases = [
+        ('informacion_propietario', 'identificacion', 'NIT 900.123.456-7', '900123456-7'),
+        ('informacion_propietario', 'identificacion', 'C.C. 1.020.345.678', '1020345678'),
+        ('informacion_vehiculo', 'placa', 'r12345', 'R12345'),
+        ('informacion_vehiculo', 'placa', 'ABC-12D', 'ABC12D'),
+        ('informacion_vehiculo', 'cilindrada_cc', '1.399 cc', '1399'),
+        ('informacion_vehiculo', 'reg_numero_motor', 'NO', 'N'),
+        ('informacion_vehiculo', 'reg_numero_serie', 'Sí', 'S'),
+        ('detalles_registro', 'fecha_matricula', '15 de marzo de 2019', '15/03/2019'),
+        ('detalles_registro', 'fecha_importacion', '02-MAY-2019', '02/05/2019'),
+    ]
+    for section, field, raw, expected in cases:
+        assert extractor.normalize_value(section, field, raw) == expected
+        assert extractor.is_valid_value(section, field, raw)
+
+
+def test_sanitize_keeps_and_flags_values_that_still_fail():
+    extractor = bare_extractor()
+    requested = {'informacion_vehiculo': {'placa': '', 'modelo': '', 'color': ''}}
+    data = {'informacion_vehiculo': {'placa': 'PLACA ILEGIBLE', 'modelo': 'Modelo 2019'}}
+
+    result = extractor.sanitize(data, requested)
+    assert result['informacion_vehiculo'] == {
+        'placa': 'PLACA ILEGIBLE', 'modelo': '2019', 'color': 'No disponible',
+    }
+    assert result['campos_por_revisar'] == ['informacion_vehiculo.placa']
+
+
+def test_failed_reask_keeps_first_response(monkeypatch):
+    import json
+    from services.pdf_extractor import PreparedContent
+
+    extractor = bare_extractor(reask_attempts=1)
+    monkeypatch.setattr(extractor, 'generation_config_for', lambda requested=None: None)
+
+    def failing_generate(content, generation_config=None):
+        extractor.last_call_failed = True
+        raise RuntimeError('429')
+
+    monkeypatch.setattr(extractor, '_generate', failing_generate)
+    requested = {'informacion_vehiculo': {'placa': '', 'modelo': ''}}
+    data = extractor.parse_response(json.dumps({'informacion_vehiculo': {'placa': 'KLM482'}}))
+    prepared = PreparedContent(['prompt', {'mime_type': 'application/pdf', 'data': b''}], 0, 0)
+
+    extractor._reask_invalid(data, requested, prepared)
+    assert data == {'informacion_vehiculo': {'placa': 'KLM482'}}
+    assert extractor.last_call_failed is False
+
+
+@pytest.fixture
+def multipage_pdf(tmp_path):
+    """PDF escaneado de varias páginas (~2 MB) con la tarjeta en una página intermedia"""
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    pdf_path = tmp_path / 'escaneo.pdf'
+    pdf = canvas.Canvas(str(pdf_path))
+    for index in range(PDF_PAGES):
+        pdf.drawString(72, 760, 'TARJETA DE PROPIEDAD PLACA' if index == PDF_PAGES // 2 else f'Anexo {index}')
+        # Ruido aleatorio: no se comprime, así que cada página pesa lo mismo que la imagen
+        scan = Image.frombytes('RGB', (220, 220), os.urandom(220 * 220 * 3))
+        pdf.drawImage(ImageReader(scan), 72, 72, width=440, height=440)
+        pdf.showPage()
+    pdf.save()
+    return str(pdf_path)
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def memory_extractor(monkeypatch, upload_threshold=0, preprocess=True):
+    from services import pdf_preprocessing
+
+    # Sin poppler no se rasteriza, pero la búsqueda de página recorre todo el PDF
+    monkeypatch.setattr(pdf_preprocessing, 'convert_from_bytes', lambda *args, **kwargs: [])
+    monkeypatch.setattr(PdfPreprocessor, 'poppler_missing', False)
+    preprocessor = PdfPreprocessor()
+    preprocessor.enabled = preprocess
+    return bare_extractor(
+        preprocessor=preprocessor,
+        upload_threshold=upload_threshold,
+        prompt_for=lambda requested=None: 'prompt',
+    )
+
+
+def test_inline_payload_keeps_a_single_copy_of_the_pdf(multipage_pdf, monkeypatch):
+    extractor = memory_extractor(monkeypatch, preprocess=False)
+    size = os.path.getsize(multipage_pdf)
+
+    prepared, peak = peak_memory(extractor.prepare_content, multipage_pdf)
+    assert isinstance(prepared.content[1]['data'], bytes)
+    # Con base64 en str había tres copias (bytes, bytes b64 y str): más de 3.6x el PDF
+    assert peak < size * 1.2
+
+
+def test_page_search_bounds_peak_memory_for_multipage_pdf(multipage_pdf, monkeypatch):
+    extractor = memory_extractor(monkeypatch)
+    size = os.path.getsize(multipage_pdf)
+
+    prepared, peak = peak_memory(extractor.prepare_content, multipage_pdf)
+    assert prepared.content[1]['mime_type'] == 'application/pdf'
+    # pypdf mantiene una copia de las páginas mientras busca la tarjeta; con base64 serían ~4.7x
+    assert peak < size * 3
+
+
+def test_large_pdf_is_uploaded_without_reading_it(multipage_pdf, monkeypatch):
+    from services import pdf_extractor
+
+    uploaded = object()
+    monkeypatch.setattr(pdf_extractor.genai, 'upload_file', lambda path, mime_type=None: uploaded)
+    extractor = memory_extractor(monkeypatch, upload_threshold=1024 * 1024)
+    size = os.path.getsize(multipage_pdf)
+
+    prepared, peak = peak_memory(extractor.prepare_content, multipage_pdf)
+    assert prepared.uploaded_file is uploaded
+    assert peak < size * 0.05
+
+
+TARJETA_LINES = [
+    'LICENCIA DE TRÁNSITO',
+    'PLACA: KLM482',
+    'MARCA: CHEVROLET',
+    'LÍNEA: SAIL LT',
+    'MODELO: 2019',
+    'COLOR: BLANCO GALAXIA',
+    'NÚMERO DE MOTOR: LCU180920451',
+    'VIN: 9GASA58M1KB012345',
+    'PROPIETARIO: RODRIGUEZ GOMEZ CARLOS ANDRES',
+    'C.C. 1.020.345.678',
+]
+
+
+def text_layer_pdf(path, lines):
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(str(path))
+    for index, line in enumerate(lines):
+        pdf.drawString(72, 760 - index * 18, line)
+    pdf.save()
+    return str(path)
+
+
+def local_extractor(monkeypatch, settings):
+    from services.local_extractor import LocalTextExtractor
+
+    extractor = bare_extractor(
+        cache=DictCache(),
+        local_extractor=LocalTextExtractor(),
+        local_required_fields=settings.LOCAL_REQUIRED_FIELDS,
+    )
+    calls = []
+    monkeypatch.setattr(
+        extractor, '_analyze_with_vision',
+        lambda pdf_path, requested=None: calls.append(requested) or {'informacion_vehiculo': {'cilindrada_cc': '1399'}},
+    )
+    return extractor, calls
+
+
+def test_text_layer_with_required_fields_skips_gemini(tmp_path, monkeypatch, settings):
+    extractor, calls = local_extractor(monkeypatch, settings)
+    pdf_path = text_layer_pdf(tmp_path / 'tarjeta.pdf', TARJETA_LINES)
+
+    result = extractor.extract_vehicle_info(pdf_path)
+    assert calls == []
+    assert result['informacion_vehiculo']['marca'] == 'CHEVROLET'
+    assert result['informacion_propietario']['nombre'] == 'RODRIGUEZ GOMEZ CARLOS ANDRES'
+    assert result['origen_campos']['informacion_vehiculo.color'] == 'texto'
+    # El resultado local también se guarda en la caché
+    assert extractor.extract_vehicle_info(pdf_path) == result
+
+
+def test_missing_required_field_asks_gemini_only_for_the_rest(tmp_path, monkeypatch, settings):
+    extractor, calls = local_extractor(monkeypatch, settings)
+    lines = [line for line in TARJETA_LINES if not line.startswith('COLOR')]
+    pdf_path = text_layer_pdf(tmp_path / 'tarjeta.pdf', lines)
+
+    result = extractor.extract_vehicle_info(pdf_path)
+    assert len(calls) == 1
+    assert 'color' in calls[0]['informacion_vehiculo']
+    assert 'placa' not in calls[0]['informacion_vehiculo']
+    assert result['origen_campos']['informacion_vehiculo.cilindrada_cc'] == 'gemini'
+
+
+def test_processor_hashes_the_pdf_once(tmp_path, monkeypatch, settings, user, make_document):
+    from services import document_processor
+    from services.extraction_cache import ExtractionCache
+    from services.gemini_health import CircuitBreaker
+
+    extractor, calls = local_extractor(monkeypatch, settings)
+    extractor.breaker = CircuitBreaker()
+    monkeypatch.setattr(document_processor, 'get_extractor', lambda: extractor)
+    hashed, lookups = [], []
+    hash_file = ExtractionCache.hash_file
+    monkeypatch.setattr(ExtractionCache, 'hash_file', staticmethod(lambda path: hashed.append(path) or hash_file(path)))
+    monkeypatch.setattr(extractor.cache, 'get', lambda key: lookups.append(key))
+
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'uploads/pdfs'))
+    text_layer_pdf(os.path.join(settings.MEDIA_ROOT, 'uploads/pdfs/tarjeta.pdf'), TARJETA_LINES)
+    document = make_document(user, status='pending', file='uploads/pdfs/tarjeta.pdf')
+
+    document_processor.DocumentProcessor().process(document)
+    assert len(hashed) == 1
+    assert len(lookups) == 1
+    assert calls == []
+    assert len(extractor.cache.entries) == 1
+    document.refresh_from_db()
+    assert document.status == 'completed'
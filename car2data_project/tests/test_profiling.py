@@ -0,0 +1,39 @@
+import os
+import pytest
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from services.profiling import ProfileSession
+
+
+@pytest.fixture
+def artifact(user):
+    request = RequestFactory().get('/dashboard/')
+    request.user = user
+    request.resolver_match = None
+    session = ProfileSession('header', backend='cprofile')
+    session.start()
+    sum(range(1000))
+    session.stop()
+    return session.save(request, HttpResponse())
+
+
+def test_profiles_are_stored_outside_media_root(artifact, settings):
+    path = os.path.realpath(artifact.profile_file.path)
+    assert path.startswith(os.path.realpath(settings.PROFILING_ROOT))
+    assert not path.startswith(os.path.realpath(settings.MEDIA_ROOT))
+    with pytest.raises(ValueError):
+        artifact.profile_file.url
+
+
+def test_profile_download_is_staff_only(artifact, user):
+    url = reverse('admin:administration_profileartifact_download', args=[artifact.pk])
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    assert client.get(url).status_code == 302
+
+    user.is_staff = user.is_superuser = True
+    user.save()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response['Content-Disposition'].startswith('attachment')
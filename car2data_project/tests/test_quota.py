@@ -0,0 +1,66 @@
+import threading
+import pytest
+from django.db import connection
+from apps.authentication.models import UserSubscription
+
+THREADS = 8
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_reservations_never_exceed_the_limit(user):
+    subscription = UserSubscription.objects.create(user=user, plan='starter')
+    limit = subscription.get_documents_limit()
+    assert limit < THREADS
+
+    barrier = threading.Barrier(THREADS)
+    results, errors = [], []
+
+    def reserve():
+        try:
+            own = UserSubscription.objects.get(pk=subscription.pk)
+            barrier.wait()
+            results.append(own.reserve_documents(1))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=reserve) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sum(results) == limit
+    subscription.refresh_from_db()
+    assert subscription.documents_used == limit
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_partial_reservations_fill_the_remaining_quota(user):
+    subscription = UserSubscription.objects.create(user=user, plan='pro')
+    limit = subscription.get_documents_limit()
+    barrier = threading.Barrier(THREADS)
+    results, errors = [], []
+
+    def reserve():
+        try:
+            own = UserSubscription.objects.get(pk=subscription.pk)
+            barrier.wait()
+            results.append(own.reserve_documents(limit // 2, partial=True))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=reserve) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sum(results) == limit
+    subscription.refresh_from_db()
+    assert subscription.documents_used == limit
@@ -0,0 +1,61 @@
+import pytest
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from apps.documents.models import StatusFeedVersion
+from services.status_feed import get_status_broker
+
+FEED_URL = reverse('documents:status_feed')
+
+
+@pytest.fixture
+def feed_client(user, settings):
+    settings.STATUS_FEED_TIMEOUT = 0
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    return client
+
+
+def test_malformed_cursor_is_rejected(feed_client):
+    response = feed_client.get(FEED_URL, {'since': '2024-01-01T00:00:00'})
+    assert response.status_code == 400
+
+
+def test_cursor_follows_status_versions(feed_client, user, make_document):
+    document = make_document(user, status='pending')
+    first = feed_client.get(FEED_URL).json()
+    assert [change['id'] for change in first['documents']] == [document.id]
+    assert first['cursor'] == StatusFeedVersion.current(user.id)
+
+    document.status = 'completed'
+    document.save(update_fields=['status'])
+    changes = feed_client.get(FEED_URL, {'since': first['cursor']}).json()
+    assert [(change['id'], change['status']) for change in changes['documents']] == [(document.id, 'completed')]
+    assert changes['cursor'] > first['cursor']
+
+    # Sin cambios nuevos se responde al instante (polling corto) conservando el cursor
+    empty = feed_client.get(FEED_URL, {'since': changes['cursor']}).json()
+    assert empty['documents'] == [] and empty['cursor'] == changes['cursor'] and empty['retry_after']
+
+
+def test_versions_increase_per_user(user, make_document):
+    document = make_document(user, status='pending')
+    versions = []
+    for status in ('processing', 'completed'):
+        document.status = status
+        document.save(update_fields=['status'])
+        versions.append(document.status_version)
+    assert versions[0] < versions[1] == StatusFeedVersion.current(user.id)
+
+
+def test_publish_waits_for_commit(user, make_document, django_capture_on_commit_callbacks):
+    document = make_document(user, status='pending')
+    broker = get_status_broker()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            token = broker.token(user.id)
+            document.status = 'processing'
+            document.save(update_fields=['status'])
+            assert broker.token(user.id) == token
+    assert broker.token(user.id) != token
@@ -0,0 +1,23 @@
+from django.db import transaction
+from apps.authentication.models import UserSubscription
+
+
+def test_reserve_invalidates_cached_subscription(user):
+    subscription = UserSubscription.objects.create(user=user, plan='starter')
+    assert UserSubscription.get_cached(user.id).documents_used == 0
+
+    assert subscription.reserve_documents(2) == 2
+    assert UserSubscription.get_cached(user.id).documents_used == 2
+
+
+def test_stale_read_inside_transaction_is_invalidated_on_commit(user, django_capture_on_commit_callbacks):
+    subscription = UserSubscription.objects.create(user=user, plan='starter')
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            subscription.reserve_documents(1)
+            # Otra lectura antes del commit vuelve a guardar una copia en caché
+            UserSubscription.get_cached(user.id)
+            UserSubscription.objects.filter(pk=subscription.pk).update(documents_used=3)
+
+    assert UserSubscription.get_cached(user.id).documents_used == 3
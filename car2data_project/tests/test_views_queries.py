@@ -0,0 +1,39 @@
+import pytest
+from django.test import Client
+
+# Sesión, usuario y las consultas propias de cada vista; no debe crecer con los documentos
+VIEW_QUERIES = {
+    # Últimos documentos + contadores por estado en un solo agregado
+    '/dashboard/': 4,
+    # COUNT del paginador + página de documentos
+    '/dashboard/history/': 4,
+    # COUNT del paginador + página de formularios con el documento en el mismo JOIN
+    '/forms/history/': 4,
+}
+
+
+@pytest.fixture
+def seeded_client(user, make_document):
+    from apps.authentication.models import UserSubscription
+    from apps.forms_generation.models import GeneratedForm
+
+    UserSubscription.objects.create(user=user, plan='pro')
+    for index, status in enumerate(['completed'] * 9 + ['pending', 'processing', 'error']):
+        document = make_document(user, name=f'tarjeta_{index}.pdf', status=status)
+        if status == 'completed':
+            GeneratedForm.objects.create(
+                user=user, document=document, form_type='contrato_mandato',
+                generated_file=f'generated_forms/mandato_{index}.pdf', placa=document.placa,
+            )
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(user)
+    return client
+
+
+@pytest.mark.parametrize('url, queries', VIEW_QUERIES.items())
+def test_listing_views_use_fixed_queries(seeded_client, django_assert_num_queries, url, queries):
+    # La primera petición llena la caché de la suscripción
+    assert seeded_client.get(url).status_code == 200
+    with django_assert_num_queries(queries):
+        response = seeded_client.get(url)
+    assert response.status_code == 200